@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from app.services.database import database_url, engine_options, configure_engine
+
 db = SQLAlchemy()
 login_manager = LoginManager()
 
@@ -14,7 +16,9 @@ def create_app():
     
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-change-in-production')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///plankton.db')
+    # SQLite (WAL) for single-node deployments, PostgreSQL for several nodes; see app/services/database.py
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'app/static/uploads')
     app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 16777216))
@@ -25,20 +29,34 @@ def create_app():
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Silakan login terlebih dahulu.'
     
-    # User loader untuk Flask-Login
-    from app.models import User
+    # User loader untuk Flask-Login (cached per worker, see app/services/user_cache.py)
+    from app.models import upgrade_schema
+    from app.services.search_service import setup_search
+    from app.services.user_cache import load_user
     @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    def load_current_user(user_id):
+        return load_user(int(user_id))
     
     # Register blueprints
-    from app.routes import main, chat, plant_analysis, auth
+    from app.routes import main, chat, plant_analysis, auth, admin, search
     app.register_blueprint(main.bp)
     app.register_blueprint(chat.bp)
     app.register_blueprint(plant_analysis.bp)
     app.register_blueprint(auth.bp)
+    app.register_blueprint(admin.bp)
+    app.register_blueprint(search.bp)
     
     with app.app_context():
+        configure_engine(db.engine)
         db.create_all()
+        upgrade_schema()
+        setup_search(db.engine)
+    
+    # Batched background writer for Groq/Plant.id usage accounting
+    from app.services.usage_service import start_usage_recorder
+    start_usage_recorder(app)
+    
+    # Resume async analysis jobs left over from a previous run
+    plant_analysis.start_job_queue(app)
     
     return app
@@ -0,0 +1,451 @@
+import asyncio
+import io
+import os
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, jsonify, request, Response
+from flask_login import current_user
+from werkzeug.exceptions import RequestEntityTooLarge
+from app import db
+from app.models import ChatHistory
+from app.services.plantid_service import AsyncPlantIdService, USAGE_MODEL
+from app.services.groq_service import get_groq_service, get_async_groq_service
+from app.services.conversation_service import build_history
+from app.services.image_service import normalize_image
+from app.services.cache_service import DbCache, hash_stream
+from app.services.async_utils import run_sync
+from app.services.usage_service import record_usage
+from app.routes import chat, plant_analysis
+
+# Threads for blocking work: Flask requests served as WSGI, plus DB/image steps of async requests
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 32))
+SYNC_THREADS = int(os.getenv('ASGI_SYNC_THREADS', 32))
+# Request bodies up to this size stay in memory; larger ones (uploads) spill to a temp file
+BODY_SPOOL_SIZE = int(os.getenv('ASGI_BODY_SPOOL_SIZE', 1024 * 1024))
+
+class AsyncStream:
+    """Streaming response body produced by an async generator of str chunks"""
+    
+    def __init__(self, chunks, mimetype, headers=None):
+        self.chunks = chunks
+        self.mimetype = mimetype
+        self.headers = headers or {}
+
+class AsgiApp:
+    """
+    ASGI entry point for the Flask app.
+    POST /api/chat/send and POST /api/plant/analyze run as coroutines on
+    httpx.AsyncClient, so requests waiting on Groq or Plant.id hold no thread.
+    Every other request runs the Flask WSGI app on a thread pool.
+    Database work, image processing and auth run in worker threads inside a
+    Flask request context built from the ASGI scope.
+    """
+    
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+        self.routes = {
+            ('POST', '/api/chat/send'): send_message,
+            ('POST', '/api/plant/analyze'): analyze_plant,
+        }
+        self._plantid_services = {}
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        
+        if scope['type'] != 'http':
+            return
+        
+        # Same limit as Flask's MAX_CONTENT_LENGTH: a declared length is refused before
+        # reading, and a chunked body is cut off as soon as it grows past the limit
+        max_length = self.flask_app.config.get('MAX_CONTENT_LENGTH')
+        if max_length and content_length(scope) > max_length:
+            return await send_simple(send, 413, b'Request Entity Too Large')
+        try:
+            body = await read_body(receive, max_length)
+        except RequestEntityTooLarge:
+            return await send_simple(send, 413, b'Request Entity Too Large')
+        if body is None:
+            return  # Client went away
+        
+        try:
+            await self.dispatch(scope, body, receive, send)
+        finally:
+            body.close()
+    
+    async def dispatch(self, scope, body, receive, send):
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            return await self.call_wsgi(scope, body, send)
+        
+        ctx = self.flask_app.request_context(build_environ(scope, body))
+        ctx.push()
+        try:
+            authenticated = await run_sync(lambda: current_user.is_authenticated)
+            if not authenticated:
+                response = self.flask_app.login_manager.unauthorized()
+            else:
+                response = await handler(self)
+            
+            # Handlers that leave the native path (e.g. ?async=1 jobs) return None: replay the body to Flask
+            if response is None:
+                ctx.pop()
+                ctx = None
+                body.seek(0)
+                return await self.call_wsgi(scope, body, send)
+            
+            if isinstance(response, AsyncStream):
+                head = await run_sync(
+                    self.flask_app.process_response,
+                    Response(mimetype=response.mimetype, headers=response.headers)
+                )
+                await send_stream(send, receive, head, response.chunks)
+            else:
+                response = await run_sync(self.flask_app.process_response, self.flask_app.make_response(response))
+                await send_response(send, response)
+        finally:
+            if ctx is not None:
+                ctx.pop()
+    
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # asyncio.to_thread (run_sync) uses the loop's default executor
+                asyncio.get_running_loop().set_default_executor(
+                    ThreadPoolExecutor(max_workers=SYNC_THREADS, thread_name_prefix='sync')
+                )
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for service in self._plantid_services.values():
+                    await service.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def call_wsgi(self, scope, body, send):
+        """Run the Flask app for one request on the WSGI thread pool, relaying streamed bodies as they come"""
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, body)
+        
+        def relay(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+        
+        def run():
+            start = {}
+            
+            def start_response(status, headers, exc_info=None):
+                start['message'] = {
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+                }
+            
+            iterable = self.flask_app(environ, start_response)
+            try:
+                started = False
+                for chunk in iterable:
+                    if not started:
+                        relay(start['message'])
+                        started = True
+                    if chunk:
+                        relay({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if not started:
+                    relay(start['message'])
+                relay({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        
+        await loop.run_in_executor(self.wsgi_executor, run)
+    
+    def get_plantid_service(self):
+        """Async Plant.id client for the running event loop, sharing settings with the sync one"""
+        key = id(asyncio.get_running_loop())
+        service = self._plantid_services.get(key)
+        if service is None:
+            sync_service = plant_analysis.get_plantid_service()
+            service = AsyncPlantIdService(os.getenv('PLANTID_API_KEY'), url=sync_service.url)
+            self._plantid_services[key] = service
+        return service
+
+def content_length(scope):
+    """Declared Content-Length of a request, 0 when missing or invalid"""
+    for name, value in scope.get('headers', []):
+        if name.lower() == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return 0
+    return 0
+
+async def read_body(receive, limit=None, spool_size=None):
+    """
+    Read the request body into a file object that becomes wsgi.input
+    
+    Small bodies (chat JSON) stay in memory; anything past `spool_size` bytes
+    is written to a temp file as it arrives, so an upload is never held in
+    memory as a whole.
+    
+    Returns:
+        SpooledTemporaryFile: The body, rewound; None if the client went away
+    
+    Raises:
+        RequestEntityTooLarge: The body grew past `limit` bytes; reading stops there
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=spool_size or BODY_SPOOL_SIZE)
+    size = 0
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit and size > limit:
+                raise RequestEntityTooLarge()
+            if chunk:
+                body.write(chunk)
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+    except BaseException:
+        body.close()
+        raise
+
+def build_environ(scope, body):
+    """Build a WSGI environ for the Flask request context from an ASGI scope and its body file"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The body was read to its end already, so chunked requests without a Content-Length can be read too
+        'wsgi.input_terminated': True,
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def header_list(response):
+    return [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in response.headers.items()]
+
+async def send_simple(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_response(send, response):
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': header_list(response)})
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+async def send_stream(send, receive, response, chunks):
+    """Send chunks as they are produced; stops the generator when the client disconnects"""
+    disconnected = asyncio.Event()
+    
+    async def watch():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+    
+    watcher = asyncio.create_task(watch())
+    headers = [(name, value) for name, value in header_list(response) if name != b'content-length']
+    try:
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        async for chunk in chunks:
+            if disconnected.is_set():
+                break
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        watcher.cancel()
+        await chunks.aclose()
+
+def save_chat(user_id, user_message, ai_response, plant_topic):
+    chat_entry = ChatHistory(
+        user_id=user_id,
+        user_message=user_message,
+        ai_response=ai_response,
+        plant_topic=plant_topic
+    )
+    db.session.add(chat_entry)
+    db.session.commit()
+    return {'id': chat_entry.id, 'created_at': chat_entry.created_at.isoformat()}
+
+def save_partial_chat(app, user_id, user_message, ai_response, plant_topic):
+    """Save a streamed answer that was cut off, in its own app context on a worker thread"""
+    with app.app_context():
+        try:
+            save_chat(user_id, user_message, ai_response, plant_topic)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Could not save partial chat response: {e}")
+        finally:
+            db.session.remove()
+
+async def send_message(asgi):
+    """Async version of chat.send_message"""
+    try:
+        data = request.json
+        user_message = data.get('message', '').strip()
+        plant_topic = data.get('plant_topic', 'tanaman umum')
+        
+        if not user_message:
+            return jsonify({'error': 'Pesan tidak boleh kosong'}), 400
+        
+        use_cache = not data.get('no_cache', False)
+        service = get_async_groq_service()
+        user_id = current_user.id
+        
+        history, context = None, None
+        if data.get('conversation'):
+            # Summary updates are rare and short; they use the shared sync client in a thread
+            history, context = await run_sync(build_history, get_groq_service(), user_id, plant_topic)
+        
+        if data.get('stream'):
+            return AsyncStream(
+                stream_message(service, user_id, user_message, plant_topic, use_cache, history, context),
+                'text/event-stream',
+                {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
+        ai_response = await service.get_plant_response(user_message, plant_topic, use_cache=use_cache, history=history)
+        chat_entry = await run_sync(save_chat, user_id, user_message, ai_response, plant_topic)
+        
+        return jsonify({
+            'id': chat_entry['id'],
+            'user_message': user_message,
+            'ai_response': ai_response,
+            'plant_topic': plant_topic,
+            'context': context,
+            'created_at': chat_entry['created_at']
+        }), 201
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+async def stream_message(service, user_id, user_message, plant_topic, use_cache, history, context):
+    """Async version of chat.stream_message"""
+    app = current_app._get_current_object()
+    parts = []
+    finished = False
+    try:
+        async for text in service.stream_plant_response(user_message, plant_topic, use_cache=use_cache, history=history):
+            parts.append(text)
+            yield chat.sse('token', {'text': text})
+        
+        finished = True
+        chat_entry = await run_sync(save_chat, user_id, user_message, ''.join(parts), plant_topic)
+        yield chat.sse('done', {
+            'id': chat_entry['id'],
+            'plant_topic': plant_topic,
+            'context': context,
+            'created_at': chat_entry['created_at']
+        })
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        print(f"Chat stream error: {e}")
+        yield chat.sse('error', {'error': str(e)})
+    finally:
+        if not finished and parts:
+            # Runs on disconnect too, when the generator may no longer await: hand the
+            # blocking save to the default executor instead of running it on the loop
+            asyncio.get_running_loop().run_in_executor(
+                None, save_partial_chat, app, user_id, user_message,
+                ''.join(parts) + '\n\n_(respons terputus)_', plant_topic
+            )
+
+async def analyze_plant(asgi):
+    """Async version of plant_analysis.analyze_plant"""
+    try:
+        # Parsing the multipart body is CPU work; keep it off the event loop
+        files = await run_sync(lambda: request.files)
+        if request.values.get('async', '').lower() in ('1', 'true', 'yes'):
+            return None  # The job queue path does no upstream I/O in the request
+        
+        if 'image' not in files:
+            return jsonify({'error': 'Tidak ada file gambar'}), 400
+        
+        file = files['image']
+        
+        if file.filename == '':
+            return jsonify({'error': 'File tidak dipilih'}), 400
+        
+        if not plant_analysis.allowed_file(file.filename):
+            return jsonify({'error': 'Format file tidak didukung'}), 400
+        
+        api_key = os.getenv('PLANTID_API_KEY', '').strip()
+        if not api_key or api_key == 'your_plantid_api_key_here':
+            return jsonify({
+                'error': 'Plant.id API key belum dikonfigurasi',
+                'message': 'Silakan set PLANTID_API_KEY di file .env dan restart Flask'
+            }), 503
+        
+        result, cached = await identify_image(asgi, file.stream, file.filename)
+        if not result:
+            return jsonify({'error': 'Gagal menganalisis tanaman'}), 500
+        
+        def store():
+            # Recommendations are filled in by the background queue, as in the WSGI route
+            filename = plant_analysis.save_upload(file)
+            analysis = plant_analysis.store_analysis(current_user.id, filename, result, defer_recommendations=True)
+            return plant_analysis.serialize_analysis(analysis, cached=cached)
+        
+        return jsonify(await run_sync(store)), 201
+    
+    except Exception as e:
+        print(f"PLANT ANALYSIS ERROR: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+async def identify_image(asgi, stream, filename):
+    """Async version of plant_analysis.identify_image"""
+    cache = plant_analysis.get_identification_cache()
+    
+    def lookup():
+        key = DbCache.make_key(hash_stream(stream), plant_analysis.IDENTIFY_PARAMS)
+        return key, cache.get(key)
+    
+    cache_key, result = await run_sync(lookup)
+    if result is not None:
+        record_usage('plantid', USAGE_MODEL, operation='identification', cached=True)
+        return result, True
+    
+    async def identify():
+        image, mime_type, _ = await run_sync(normalize_image, stream, filename)
+        result = await asgi.get_plantid_service().identify_plant(image, mime_type=mime_type, **plant_analysis.IDENTIFY_PARAMS)
+        if result:
+            await run_sync(cache.set, cache_key, result)
+        return result
+    
+    # Shares in-flight calls with the WSGI route's identification_flight in this worker
+    result, shared = await plant_analysis.identification_flight.ado(
+        cache_key, identify, recheck=lambda: run_sync(cache.get, cache_key)
+    )
+    if shared:
+        record_usage('plantid', USAGE_MODEL, operation='identification', cached=True)
+    return result, shared
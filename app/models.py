@@ -1,4 +1,6 @@
 from app import db
+import re
+import uuid
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
@@ -35,12 +37,49 @@ class ChatHistory(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    user_message = db.Column(db.Text, nullable=False)
-    ai_response = db.Column(db.Text, nullable=False)
+    # Full texts are deferred: history lists read the excerpts, detail views and
+    # conversation context load them with undefer_group('full_text')
+    user_message = db.deferred(db.Column(db.Text, nullable=False), group='full_text')
+    ai_response = db.deferred(db.Column(db.Text, nullable=False), group='full_text')
+    # Plain-text excerpts for history lists, refreshed whenever the full text is set
+    user_message_excerpt = db.Column(db.String(300), nullable=True)
+    ai_response_excerpt = db.Column(db.String(300), nullable=True)
     plant_topic = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    EXCERPT_CHARS = 240
+    
+    __table_args__ = (
+        # History pages: newest first per user, keyset on (created_at, id)
+        db.Index('ix_chat_history_user_created_id', user_id, created_at.desc(), id.desc()),
+    )
+    
+    @staticmethod
+    def build_excerpt(text, limit=EXCERPT_CHARS):
+        """Start of a message as plain text: markdown markers dropped, cut at a word boundary"""
+        plain = re.sub(r'[*_`#>|]+|-{3,}', ' ', text or '')
+        plain = ' '.join(plain.split())
+        if len(plain) <= limit:
+            return plain
+        cut = plain[:limit].rsplit(' ', 1)[0] or plain[:limit]
+        return cut.rstrip(' ,.;:') + '…'
+    
+    @db.validates('user_message', 'ai_response')
+    def update_excerpt(self, key, value):
+        setattr(self, f'{key}_excerpt', self.build_excerpt(value))
+        return value
+    
+    def to_summary_dict(self):
+        return {
+            'id': self.id,
+            'user_message_excerpt': self.user_message_excerpt,
+            'ai_response_excerpt': self.ai_response_excerpt,
+            'plant_topic': self.plant_topic,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -51,25 +90,299 @@ class ChatHistory(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+class ChatSummary(db.Model):
+    __tablename__ = 'chat_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    plant_topic = db.Column(db.String(255), nullable=False)
+    summary = db.Column(db.Text, nullable=False)  # Rolling summary of older turns
+    last_chat_id = db.Column(db.Integer, nullable=False)  # Newest ChatHistory id folded into the summary
+    turns_summarized = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'plant_topic', name='uq_chat_summaries_user_topic'),
+    )
+
 class PlantAnalysis(db.Model):
     __tablename__ = 'plant_analysis'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     image_filename = db.Column(db.String(255), nullable=False)
+    thumbnail_filename = db.Column(db.String(255), nullable=True)
     plant_name = db.Column(db.String(255), nullable=True)
     confidence = db.Column(db.Float, nullable=True)
-    analysis_result = db.Column(db.JSON, nullable=True)
-    ai_recommendations = db.Column(db.Text, nullable=True)  # AI advice untuk penanganan
+    summary = db.Column(db.JSON, nullable=True)  # Ringkasan kecil untuk daftar riwayat
+    # Large columns are deferred: list queries never read them, detail views load them on access
+    analysis_result = db.deferred(db.Column(db.JSON, nullable=True))
+    ai_recommendations = db.deferred(db.Column(db.Text, nullable=True))  # AI advice untuk penanganan
+    # pending/generating while the background queue writes ai_recommendations; ready, failed or none after
+    recommendations_status = db.Column(db.String(20), nullable=True, index=True)
+    # Set when the user deletes the analysis; the row and its files are removed later by the DeletionJob
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    deletion_job_id = db.Column(db.String(32), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_plant_analysis_user_created_id', user_id, created_at.desc(), id.desc()),
+    )
+    
+    @staticmethod
+    def build_summary(result):
+        """Compact projection of an analysis result: health status and top issue names"""
+        health = (result or {}).get('health', {}) or {}
+        is_healthy = health.get('is_healthy')
+        
+        def top(section, name_key='name'):
+            return [
+                {'name': item.get(name_key, 'Unknown'), 'probability': item.get('probability', 0)}
+                for item in (health.get(section) or {}).get('suggestions', [])[:3]
+            ]
+        
+        return {
+            'is_healthy': is_healthy.get('status') if isinstance(is_healthy, dict) else None,
+            'diseases': top('diseases'),
+            'pests': top('pests'),
+            'nutrient_deficiency': top('nutrient_deficiency', 'nutrient')
+        }
+    
+    def to_summary_dict(self):
+        return {
+            'id': self.id,
+            'image_filename': self.image_filename,
+            'thumbnail_filename': self.thumbnail_filename,
+            'plant_name': self.plant_name,
+            'confidence': self.confidence,
+            'summary': self.summary,
+            'recommendations_status': self.recommendations_status,
+            'created_at': self.created_at.isoformat()
+        }
+    
     def to_dict(self):
         return {
             'id': self.id,
             'image_filename': self.image_filename,
+            'thumbnail_filename': self.thumbnail_filename,
             'plant_name': self.plant_name,
             'confidence': self.confidence,
+            'summary': self.summary,
             'analysis_result': self.analysis_result,
             'ai_recommendations': self.ai_recommendations,
+            'recommendations_status': self.recommendations_status,
             'created_at': self.created_at.isoformat()
         }
+
+class CacheEntry(db.Model):
+    __tablename__ = 'cache_entries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    namespace = db.Column(db.String(50), nullable=False)
+    cache_key = db.Column(db.String(64), nullable=False)
+    value = db.Column(db.JSON, nullable=True)
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('namespace', 'cache_key', name='uq_cache_entries_namespace_key'),
+        db.Index('ix_cache_entries_namespace_accessed', 'namespace', 'last_accessed_at'),
+    )
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    image_filename = db.Column(db.String(255), nullable=False)
+    original_filename = db.Column(db.String(255), nullable=True)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('plant_analysis.id', ondelete='SET NULL'), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'analysis_id': self.analysis_id,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class DeletionJob(db.Model):
+    """Removal of analyses marked deleted, in chunks, with their image files"""
+    __tablename__ = 'deletion_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    total = db.Column(db.Integer, nullable=False, default=0)  # Analyses marked for this job
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    files_removed = db.Column(db.Integer, nullable=False, default=0)
+    files_failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)  # Last finished chunk; a stale running job is resumed
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'progress': round(self.deleted / self.total, 3) if self.total else 1.0,
+            'files_removed': self.files_removed,
+            'files_failed': self.files_failed,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class TreatmentAdvice(db.Model):
+    __tablename__ = 'treatment_advice'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    advice_key = db.Column(db.String(64), unique=True, nullable=False)
+    variant = db.Column(db.String(20), nullable=False, default='full')  # full (analyze), short (health-advice)
+    plant_name = db.Column(db.String(255), nullable=False)
+    issues = db.Column(db.JSON, nullable=False)  # Sorted canonical issue names
+    advice = db.Column(db.Text, nullable=True)  # None until generated
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    generated_at = db.Column(db.DateTime, nullable=True)
+    last_requested_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_treatment_advice_variant_requests', 'variant', 'request_count'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'variant': self.variant,
+            'plant_name': self.plant_name,
+            'issues': self.issues,
+            'has_advice': self.advice is not None,
+            'request_count': self.request_count,
+            'generated_at': self.generated_at.isoformat() if self.generated_at else None
+        }
+
+class UsageRecord(db.Model):
+    """One upstream call (or cache hit) to Groq or Plant.id, written in batches by the usage recorder"""
+    __tablename__ = 'usage_records'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: accounting rows outlive deleted users
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    service = db.Column(db.String(20), nullable=False)  # groq, plantid
+    model = db.Column(db.String(100), nullable=False)
+    operation = db.Column(db.String(50), nullable=False)  # chat, summary, recommendation, identification, ...
+    prompt_tokens = db.Column(db.Integer, nullable=True)
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    credits = db.Column(db.Float, nullable=True)  # Plant.id credits charged for the call
+    latency_ms = db.Column(db.Integer, nullable=True)
+    cached = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(20), nullable=False, default='ok')  # ok, error
+    error = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_usage_records_service_model_created', 'service', 'model', 'created_at'),
+    )
+
+class UsageDailyAggregate(db.Model):
+    """Daily usage totals per user, service and model, kept up to date as usage records are written"""
+    __tablename__ = 'usage_daily_aggregates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, default=0)  # 0 for calls without a user
+    service = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    cache_hits = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completion_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    credits = db.Column(db.Float, nullable=False, default=0)
+    latency_ms_total = db.Column(db.BigInteger, nullable=False, default=0)  # Upstream calls only, not cache hits
+    latency_ms_max = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('day', 'user_id', 'service', 'model', name='uq_usage_daily_key'),
+        db.Index('ix_usage_daily_service_day', 'service', 'day'),
+    )
+
+def upgrade_schema():
+    """
+    Bring existing tables up to date with the models.
+    db.create_all() only creates missing tables, so columns and indexes added
+    to a model later are created here, and new derived columns are backfilled.
+    """
+    engine = db.engine
+    inspector = db.inspect(engine)
+    added = set()
+    
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    added.add((table.name, column.name))
+                    print(f"Schema upgrade: added {table.name}.{column.name}")
+    
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    
+    if ('chat_history', 'ai_response_excerpt') in added:
+        _backfill(ChatHistory, ChatHistory.ai_response_excerpt.is_(None),
+                  lambda row: {
+                      'user_message_excerpt': ChatHistory.build_excerpt(row.user_message),
+                      'ai_response_excerpt': ChatHistory.build_excerpt(row.ai_response)
+                  },
+                  options=[db.undefer_group('full_text')])
+    
+    if ('plant_analysis', 'summary') in added:
+        _backfill(PlantAnalysis, PlantAnalysis.summary.is_(None),
+                  lambda row: {'summary': PlantAnalysis.build_summary(row.analysis_result)})
+    
+    if ('plant_analysis', 'recommendations_status') in added:
+        PlantAnalysis.query.filter(PlantAnalysis.ai_recommendations.isnot(None)).update(
+            {'recommendations_status': 'ready'}, synchronize_session=False
+        )
+        PlantAnalysis.query.filter(PlantAnalysis.recommendations_status.is_(None)).update(
+            {'recommendations_status': 'none'}, synchronize_session=False
+        )
+        db.session.commit()
+
+def _backfill(model, condition, compute, batch_size=500, options=()):
+    """Fill derived columns for existing rows in batches"""
+    last_id = 0
+    while True:
+        rows = model.query.options(*options).filter(condition, model.id > last_id).order_by(model.id).limit(
+            batch_size
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            for key, value in compute(row).items():
+                setattr(row, key, value)
+        last_id = rows[-1].id
+        db.session.commit()
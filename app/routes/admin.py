@@ -0,0 +1,121 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from functools import wraps
+from datetime import datetime, timedelta
+from app.models import User, UsageDailyAggregate
+from app import db
+from app.services.usage_service import get_usage_recorder
+from app.services.database import describe_engine
+from app.services.user_cache import user_cache
+import os
+
+bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+# Comma-separated usernames allowed to use the admin endpoints
+ADMIN_USERNAMES = {name.strip() for name in os.getenv('ADMIN_USERNAMES', '').split(',') if name.strip()}
+
+def admin_required(view):
+    """Like login_required, and the user must be listed in ADMIN_USERNAMES"""
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if current_user.username not in ADMIN_USERNAMES:
+            return jsonify({'error': 'Akses ditolak'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def usage_totals():
+    """Summed aggregate columns, labelled as in the response"""
+    return [
+        db.func.sum(UsageDailyAggregate.requests).label('requests'),
+        db.func.sum(UsageDailyAggregate.errors).label('errors'),
+        db.func.sum(UsageDailyAggregate.cache_hits).label('cache_hits'),
+        db.func.sum(UsageDailyAggregate.prompt_tokens).label('prompt_tokens'),
+        db.func.sum(UsageDailyAggregate.completion_tokens).label('completion_tokens'),
+        db.func.sum(UsageDailyAggregate.credits).label('credits'),
+        db.func.sum(UsageDailyAggregate.latency_ms_total).label('latency_ms_total'),
+        db.func.max(UsageDailyAggregate.latency_ms_max).label('latency_ms_max')
+    ]
+
+def usage_dict(row):
+    requests = row.requests or 0
+    upstream_calls = requests - (row.cache_hits or 0)
+    return {
+        'requests': requests,
+        'errors': row.errors or 0,
+        'cache_hits': row.cache_hits or 0,
+        'prompt_tokens': row.prompt_tokens or 0,
+        'completion_tokens': row.completion_tokens or 0,
+        'total_tokens': (row.prompt_tokens or 0) + (row.completion_tokens or 0),
+        'credits': row.credits or 0,
+        # Cache hits have no upstream latency
+        'avg_latency_ms': round((row.latency_ms_total or 0) / upstream_calls) if upstream_calls > 0 else None,
+        'max_latency_ms': row.latency_ms_max or 0
+    }
+
+@bp.route('/usage', methods=['GET'])
+@admin_required
+def get_usage():
+    """Groq and Plant.id usage per user, per model and per day from the daily aggregates"""
+    try:
+        days = min(max(request.args.get('days', 7, type=int), 1), 366)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 500)
+        service = request.args.get('service')
+        since = (datetime.utcnow() - timedelta(days=days - 1)).date()
+        
+        filters = [UsageDailyAggregate.day >= since]
+        if service:
+            filters.append(UsageDailyAggregate.service == service)
+        
+        tokens = db.func.sum(UsageDailyAggregate.prompt_tokens + UsageDailyAggregate.completion_tokens)
+        
+        by_user = db.session.query(UsageDailyAggregate.user_id, User.username, *usage_totals()).outerjoin(
+            User, User.id == UsageDailyAggregate.user_id
+        ).filter(*filters).group_by(UsageDailyAggregate.user_id, User.username).order_by(
+            tokens.desc(), db.func.sum(UsageDailyAggregate.credits).desc(), db.func.sum(UsageDailyAggregate.requests).desc()
+        ).limit(limit).all()
+        
+        by_model = db.session.query(UsageDailyAggregate.service, UsageDailyAggregate.model, *usage_totals()).filter(
+            *filters
+        ).group_by(UsageDailyAggregate.service, UsageDailyAggregate.model).order_by(
+            db.func.sum(UsageDailyAggregate.requests).desc()
+        ).all()
+        
+        daily = db.session.query(UsageDailyAggregate.day, UsageDailyAggregate.service, *usage_totals()).filter(
+            *filters
+        ).group_by(UsageDailyAggregate.day, UsageDailyAggregate.service).order_by(
+            UsageDailyAggregate.day.desc(), UsageDailyAggregate.service
+        ).all()
+        
+        totals = db.session.query(*usage_totals()).filter(*filters).one()
+        recorder = get_usage_recorder()
+        
+        return jsonify({
+            'since': since.isoformat(),
+            'days': days,
+            'service': service,
+            'totals': usage_dict(totals),
+            'by_user': [
+                dict(usage_dict(row), user_id=row.user_id or None, username=row.username) for row in by_user
+            ],
+            'by_model': [
+                dict(usage_dict(row), service=row.service, model=row.model) for row in by_model
+            ],
+            'daily': [
+                dict(usage_dict(row), day=row.day.isoformat(), service=row.service) for row in daily
+            ],
+            'recorder': recorder.get_stats() if recorder is not None else {'enabled': False}
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/database', methods=['GET'])
+@admin_required
+def get_database():
+    """Database backend, connection pool and user cache of this worker, and SQLite PRAGMAs in effect"""
+    try:
+        return jsonify(dict(describe_engine(db.engine), user_cache=user_cache.get_stats())), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
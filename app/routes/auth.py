@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models import User
+from app.services.user_cache import user_cache
 import re
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -117,6 +118,7 @@ def login():
 @bp.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
     flash('Anda telah logout.', 'success')
     return redirect(url_for('auth.login'))
@@ -1,21 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models import ChatHistory
+from app.models import ChatHistory, ChatSummary
 from app import db
-from app.services.groq_service import GroqService
-import os
+from app.services.groq_service import get_groq_service
+from app.services.conversation_service import build_history
+from app.services.pagination import keyset_page, count_user_rows, invalidate_user_rows, page_count
+import json
 
 bp = Blueprint('chat', __name__, url_prefix='/api/chat')
 
-# Lazy load groq_service
-groq_service = None
-
-def get_groq_service():
-    global groq_service
-    if groq_service is None:
-        groq_service = GroqService(api_key=os.getenv('GROQ_API_KEY'))
-    return groq_service
-
 @bp.route('/send', methods=['POST'])
 @login_required
 def send_message():
@@ -27,9 +20,20 @@ def send_message():
         if not user_message:
             return jsonify({'error': 'Pesan tidak boleh kosong'}), 400
         
-        # Get AI response from Groq
+        # no_cache: always ask the model instead of serving a cached answer
+        use_cache = not data.get('no_cache', False)
         service = get_groq_service()
-        ai_response = service.get_plant_response(user_message, plant_topic)
+        
+        # conversation: include earlier turns of this topic (never served from the cache)
+        history, context = None, None
+        if data.get('conversation'):
+            history, context = build_history(service, current_user.id, plant_topic)
+        
+        if data.get('stream'):
+            return stream_message(user_message, plant_topic, use_cache, history, context)
+        
+        # Get AI response from Groq
+        ai_response = service.get_plant_response(user_message, plant_topic, use_cache=use_cache, history=history)
         
         # Save to database dengan user_id
         chat_entry = ChatHistory(
@@ -46,38 +50,146 @@ def send_message():
             'user_message': user_message,
             'ai_response': ai_response,
             'plant_topic': plant_topic,
+            'context': context,
             'created_at': chat_entry.created_at.isoformat()
         }), 201
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_message(user_message, plant_topic, use_cache=True, history=None, context=None):
+    """
+    Relay Groq tokens to the browser as Server-Sent Events.
+    The ChatHistory row is written when the stream ends; if the client
+    disconnects or the upstream stream breaks, the partial answer is kept.
+    """
+    service = get_groq_service()
+    user_id = current_user.id
+    
+    def save(ai_response):
+        chat_entry = ChatHistory(
+            user_id=user_id,
+            user_message=user_message,
+            ai_response=ai_response,
+            plant_topic=plant_topic
+        )
+        db.session.add(chat_entry)
+        db.session.commit()
+        return chat_entry
+    
+    def generate():
+        parts = []
+        finished = False
+        try:
+            for text in service.stream_plant_response(user_message, plant_topic, use_cache=use_cache, history=history):
+                parts.append(text)
+                yield sse('token', {'text': text})
+            
+            finished = True
+            chat_entry = save(''.join(parts))
+            yield sse('done', {
+                'id': chat_entry.id,
+                'plant_topic': plant_topic,
+                'context': context,
+                'created_at': chat_entry.created_at.isoformat()
+            })
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse('error', {'error': str(e)})
+        finally:
+            if not finished and parts:
+                try:
+                    save(''.join(parts) + '\n\n_(respons terputus)_')
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Could not save partial chat response: {e}")
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/stats', methods=['GET'])
+@login_required
+def get_service_stats():
+    """Get Groq client statistics for this worker"""
+    try:
+        return jsonify({
+            'groq': get_groq_service().get_stats(),
+            'cache': get_groq_service().get_cache_stats(),
+            'single_flight': get_groq_service().flight.get_stats(),
+            'routing': get_groq_service().router.get_stats()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/history', methods=['GET'])
 @login_required
 def get_history():
+    """Chat history list with excerpts; full texts come from /history/<id>"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        query = ChatHistory.query.filter_by(user_id=current_user.id)
+        # Cached per user; may lag behind rows written by other workers
+        total = count_user_rows(ChatHistory, current_user.id)
+        
+        # Cursor mode (?cursor= for the first page, then next_cursor): constant cost at any depth
+        if 'cursor' in request.args:
+            chats, next_cursor = keyset_page(query, ChatHistory, request.args.get('cursor'), per_page)
+            return jsonify({
+                'total': total,
+                'next_cursor': next_cursor,
+                'data': [chat.to_summary_dict() for chat in chats]
+            }), 200
         
-        pagination = ChatHistory.query.filter_by(user_id=current_user.id).order_by(ChatHistory.created_at.desc()).paginate(
-            page=page, per_page=per_page
+        pagination = query.order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc()).paginate(
+            page=page, per_page=per_page, count=False
         )
         
         return jsonify({
-            'total': pagination.total,
-            'pages': pagination.pages,
+            'total': total,
+            'pages': page_count(total, per_page),
             'current_page': page,
-            'data': [chat.to_dict() for chat in pagination.items]
+            'data': [chat.to_summary_dict() for chat in pagination.items]
         }), 200
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/history/<int:chat_id>', methods=['GET'])
+@login_required
+def get_chat_detail(chat_id):
+    """Full question and answer of one history item; the list only carries excerpts"""
+    try:
+        chat = ChatHistory.query.options(db.undefer_group('full_text')).filter_by(
+            id=chat_id, user_id=current_user.id
+        ).first_or_404()
+        
+        return jsonify(chat.to_dict()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), getattr(e, 'code', 500)
+
 @bp.route('/history/<int:chat_id>', methods=['DELETE'])
 @login_required
 def delete_chat(chat_id):
     try:
         chat = ChatHistory.query.filter_by(id=chat_id, user_id=current_user.id).first_or_404()
+        # Drop the rolling summary if it already contains this turn
+        ChatSummary.query.filter(
+            ChatSummary.user_id == current_user.id,
+            ChatSummary.plant_topic == chat.plant_topic,
+            ChatSummary.last_chat_id >= chat.id
+        ).delete(synchronize_session=False)
         db.session.delete(chat)
         db.session.commit()
         
@@ -91,7 +203,9 @@ def delete_chat(chat_id):
 def clear_history():
     try:
         ChatHistory.query.filter_by(user_id=current_user.id).delete()
+        ChatSummary.query.filter_by(user_id=current_user.id).delete()
         db.session.commit()
+        invalidate_user_rows(ChatHistory, current_user.id)
         
         return jsonify({'message': 'Riwayat chat dihapus'}), 200
     
@@ -1,10 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models import PlantAnalysis
+from app.models import PlantAnalysis, AnalysisJob, DeletionJob
 from app import db
 from app.services.plantid_service import PlantIdService
+from app.services.groq_service import get_groq_service
+from app.services.cache_service import DbCache, hash_stream
+from app.services.image_service import normalize_image, make_thumbnail, get_image_stats
+from app.services.job_queue import JobQueue
+from app.services.recommendation_queue import RecommendationQueue
+from app.services.deletion_queue import DeletionQueue
+from app.services.single_flight import SingleFlight
+from app.services.advice_library import AdviceLibrary, ENABLED as ADVICE_LIBRARY_ENABLED
+from app.services.usage_service import record_usage, usage_context
+from app.services.pagination import keyset_page, count_user_rows, invalidate_user_rows, page_count
+from app.services.plantid_service import USAGE_MODEL as PLANTID_USAGE_MODEL
 from werkzeug.utils import secure_filename
 import os
+import json
+import click
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 bp = Blueprint('plant_analysis', __name__, url_prefix='/api/plant')
@@ -59,21 +75,82 @@ def get_plantid_service():
         plantid_service = PlantIdService(api_key=os.getenv('PLANTID_API_KEY'))
     return plantid_service
 
-def generate_health_recommendations(plant_name, diseases, pests):
-    """Generate AI recommendations untuk health issues"""
-    from app.services.groq_service import GroqService
+# Identification cache keyed by image hash + request parameters
+identification_cache = None
+# Coalesces identical uploads that are being identified at the same time
+identification_flight = SingleFlight('plantid')
+IDENTIFY_PARAMS = {'classification_level': 'all', 'health': 'auto', 'similar_images': True}
+
+def get_identification_cache():
+    global identification_cache
+    if identification_cache is None:
+        identification_cache = DbCache(
+            'plantid',
+            ttl=int(os.getenv('PLANTID_CACHE_TTL', 2592000)),
+            max_entries=int(os.getenv('PLANTID_CACHE_MAX_ENTRIES', 5000))
+        )
+    return identification_cache
+
+def identify_image(stream, filename):
+    """
+    Identify an uploaded image, serving repeated uploads from the identification cache.
+    On a miss the image is normalized (resized, EXIF stripped, re-encoded) before upload.
+    
+    Returns:
+        tuple: (result dict, cached flag)
+    """
+    return identify_images([stream], [filename])
+
+def identify_images(streams, filenames):
+    """
+    Identify one plant from one or more photos in a single Plant.id request
+    
+    Returns:
+        tuple: (result dict, cached flag)
+    """
+    cache = get_identification_cache()
+    hashes = [hash_stream(stream) for stream in streams]
+    cache_key = DbCache.make_key(hashes[0] if len(hashes) == 1 else hashes, IDENTIFY_PARAMS)
+    
+    result = cache.get(cache_key)
+    if result is not None:
+        record_usage('plantid', PLANTID_USAGE_MODEL, operation='identification', cached=True)
+        return result, True
     
+    def identify():
+        images, mime_types = [], []
+        for stream, filename in zip(streams, filenames):
+            image, mime_type, _ = normalize_image(stream, filename)
+            images.append(image)
+            mime_types.append(mime_type)
+        
+        result = get_plantid_service().identify_plant(images, mime_type=mime_types, **IDENTIFY_PARAMS)
+        if result:
+            cache.set(cache_key, result)
+        return result
+    
+    # Identical uploads arriving together share one Plant.id call
+    result, shared = identification_flight.do(cache_key, identify, recheck=lambda: cache.get(cache_key))
+    if shared:
+        record_usage('plantid', PLANTID_USAGE_MODEL, operation='identification', cached=True)
+    return result, shared
+
+def build_health_prompt(plant_name, diseases, pests, detailed=True, with_confidence=True):
+    """Build the Groq prompt asking for treatment advice for the top diseases and pests"""
     health_issues = []
     
-    for disease in diseases[:3]:
-        health_issues.append(f"Penyakit: {disease['name']} (confidence: {disease['probability']*100:.0f}%)")
+    for disease in diseases[:3]:  # Top 3
+        confidence = f" (confidence: {disease['probability']*100:.0f}%)" if with_confidence and 'probability' in disease else ''
+        health_issues.append(f"Penyakit: {disease['name']}{confidence}")
     
-    for pest in pests[:3]:
-        health_issues.append(f"Hama: {pest['name']} (confidence: {pest['probability']*100:.0f}%)")
+    for pest in pests[:3]:  # Top 3
+        confidence = f" (confidence: {pest['probability']*100:.0f}%)" if with_confidence and 'probability' in pest else ''
+        health_issues.append(f"Hama: {pest['name']}{confidence}")
     
     issues_text = '\n'.join(health_issues)
     
-    prompt = f"""Berikan saran penanganan lengkap untuk {plant_name} yang mengalami masalah berikut:
+    if detailed:
+        return f"""Berikan saran penanganan lengkap untuk {plant_name} yang mengalami masalah berikut:
 
 {issues_text}
 
@@ -83,11 +160,55 @@ Berikan dalam format:
 3. Pencegahan di masa depan (8-10 poin)
 
 Gunakan bahasa Indonesia yang sederhana dan praktis untuk petani."""
+
+    return f"""Berikan saran penanganan singkat untuk {plant_name} yang mengalami masalah berikut:
+
+{issues_text}
+
+Berikan:
+1. Diagnosis singkat
+2. 3-4 langkah penanganan praktis
+3. Pencegahan di masa depan
+
+Gunakan bahasa Indonesia yang sederhana dan praktis untuk petani."""
+
+_advice_library = None
+
+def get_advice_library():
+    """Get the treatment advice library shared by the analyze and health-advice paths"""
+    global _advice_library
+    if _advice_library is None:
+        _advice_library = AdviceLibrary()
+    return _advice_library
+
+def lookup_health_advice(plant_name, diseases, pests, detailed=True, record_new=True):
+    """
+    Get treatment advice from the precomputed library, generating it live on a miss.
+    Advice for combinations that have become popular is generated without
+    request-specific confidences and kept in the library for later requests.
+    With record_new=False (diagnoses sent by the client) a combination is only
+    counted if the library already knows it.
+    """
+    variant = 'full' if detailed else 'short'
+    operation = 'recommendation' if detailed else 'health-advice'
+    popular = False
+    if ADVICE_LIBRARY_ENABLED:
+        advice, popular = get_advice_library().lookup(plant_name, diseases, pests, variant, record_new=record_new)
+        if advice:
+            record_usage('groq', 'advice-library', operation=operation, cached=True)
+            return advice
     
+    prompt = build_health_prompt(plant_name, diseases, pests, detailed, with_confidence=not popular)
+    with usage_context(operation=operation):
+        response = get_groq_service().get_plant_response(prompt)
+    if popular:
+        get_advice_library().store(plant_name, diseases, pests, response, variant)
+    return response
+
+def generate_health_recommendations(plant_name, diseases, pests):
+    """Generate AI recommendations untuk health issues"""
     try:
-        groq_service = GroqService(api_key=os.getenv('GROQ_API_KEY'))
-        response = groq_service.get_plant_response(prompt)
-        return response
+        return lookup_health_advice(plant_name, diseases, pests, detailed=True)
     except Exception as e:
         print(f"Error generating recommendations: {e}")
         return None
@@ -97,6 +218,223 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_upload(file):
+    """Save an uploaded file to UPLOAD_FOLDER and return the stored filename"""
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
+    # Short random part keeps batch uploads with identical names from overwriting each other
+    filename = secure_filename(f"{timestamp}{uuid.uuid4().hex[:8]}_{file.filename}")
+    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    file.stream.seek(0)
+    file.save(filepath)
+    return filename
+
+def diagnosis_for_result(result):
+    """Get (Indonesian plant name, diseases, pests) from an identification result"""
+    plant_name = result.get('name', 'Tidak diketahui')
+    
+    # Get plant name translation
+    plant_translation = get_plant_translation(plant_name)
+    plant_id_name = plant_translation.get('id', plant_name)
+    
+    health_data = result.get('health') or {}
+    diseases = (health_data.get('diseases') or {}).get('suggestions', [])
+    pests = (health_data.get('pests') or {}).get('suggestions', [])
+    return plant_id_name, diseases, pests
+
+def recommend_for_result(result):
+    """Generate AI recommendations for the diseases and pests in an identification result"""
+    plant_id_name, diseases, pests = diagnosis_for_result(result)
+    
+    if not diseases and not pests:
+        return None
+    
+    try:
+        return generate_health_recommendations(plant_id_name, diseases, pests)
+    except Exception as e:
+        print(f"Warning: Could not generate recommendations: {e}")
+        return None
+
+def create_thumbnail(image_filename):
+    """Create the history list thumbnail for a stored upload, returns its filename or None"""
+    thumbnail_filename = 'thumb_' + os.path.splitext(image_filename)[0] + '.jpg'
+    if make_thumbnail(os.path.join(UPLOAD_FOLDER, image_filename), os.path.join(UPLOAD_FOLDER, thumbnail_filename)):
+        return thumbnail_filename
+    return None
+
+def remove_upload_files(image_filename, thumbnail_filename):
+    """
+    Delete the stored image and thumbnail of an analysis (missing files are skipped)
+    
+    Returns:
+        tuple: (files removed, files that could not be removed)
+    """
+    removed, failed = 0, 0
+    for filename in (image_filename, thumbnail_filename):
+        if not filename:
+            continue
+        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        try:
+            os.remove(filepath)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            failed += 1
+            print(f"Warning: Could not delete file {filepath}: {e}")
+    return removed, failed
+
+def recommendations_status_for(result, ai_recommendations):
+    """Final recommendations_status of an analysis whose recommendations were generated inline"""
+    if ai_recommendations:
+        return 'ready'
+    _, diseases, pests = diagnosis_for_result(result)
+    return 'failed' if diseases or pests else 'none'
+
+def build_analysis(user_id, image_filename, result, ai_recommendations=None, recommendations_status=None):
+    """Create an unsaved PlantAnalysis row for an identification result"""
+    return PlantAnalysis(
+        user_id=user_id,
+        image_filename=image_filename,
+        thumbnail_filename=create_thumbnail(image_filename),
+        plant_name=result.get('name', 'Tidak diketahui'),
+        confidence=result.get('confidence', 0),
+        summary=PlantAnalysis.build_summary(result),
+        analysis_result=result,
+        ai_recommendations=ai_recommendations,
+        recommendations_status=recommendations_status or recommendations_status_for(result, ai_recommendations)
+    )
+
+def store_analysis(user_id, image_filename, result, defer_recommendations=False):
+    """
+    Save an identification result as a PlantAnalysis row with its AI recommendations
+    
+    With defer_recommendations the row is saved as pending right away and the
+    recommendation queue fills ai_recommendations in the background.
+    """
+    _, diseases, pests = diagnosis_for_result(result)
+    if defer_recommendations and (diseases or pests):
+        analysis = build_analysis(user_id, image_filename, result, recommendations_status='pending')
+        db.session.add(analysis)
+        db.session.commit()
+        get_recommendation_queue().submit(analysis.id)
+        return analysis
+    
+    analysis = build_analysis(user_id, image_filename, result, recommend_for_result(result))
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis
+
+def serialize_analysis(analysis, cached=False):
+    """Build the analyze endpoint response for a stored PlantAnalysis"""
+    result = analysis.analysis_result or {}
+    plant_translation = get_plant_translation(analysis.plant_name or '')
+    
+    return {
+        'id': analysis.id,
+        'plant_name': analysis.plant_name,
+        'plant_name_id': plant_translation.get('id', analysis.plant_name),
+        'plant_name_en': plant_translation.get('en', analysis.plant_name),
+        'confidence': analysis.confidence,
+        'image_url': f'/static/uploads/{analysis.image_filename}',
+        'thumbnail_url': image_urls(analysis)[1],
+        'health': result.get('health', {}),
+        'analysis_result': result,
+        'ai_recommendations': analysis.ai_recommendations,
+        'recommendations_status': analysis.recommendations_status,
+        'recommendations_url': f'/api/plant/history/{analysis.id}/recommendations',
+        'cached': cached,
+        'created_at': analysis.created_at.isoformat()
+    }
+
+def process_analysis_job(job):
+    """Job queue handler: identify a stored upload and save the analysis"""
+    filepath = os.path.join(UPLOAD_FOLDER, job.image_filename)
+    with usage_context(user_id=job.user_id):
+        with open(filepath, 'rb') as image_file:
+            result, _ = identify_image(image_file, job.original_filename or job.image_filename)
+        
+        if not result:
+            raise Exception('Gagal menganalisis tanaman')
+        
+        analysis = store_analysis(job.user_id, job.image_filename, result)
+    return analysis.id
+
+# Background job queue for async analysis
+job_queue = None
+ANALYSIS_QUEUE_MAX = int(os.getenv('ANALYSIS_QUEUE_MAX', 100))
+
+def get_job_queue():
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue(
+            current_app._get_current_object(),
+            handler=process_analysis_job,
+            max_workers=int(os.getenv('ANALYSIS_ASYNC_WORKERS', 2)),
+            stale_after=int(os.getenv('ANALYSIS_JOB_STALE_AFTER', 300))
+        )
+    return job_queue
+
+# Background queue filling recommendations for analyses returned before Groq answered
+recommendation_queue = None
+
+def get_recommendation_queue():
+    global recommendation_queue
+    if recommendation_queue is None:
+        recommendation_queue = RecommendationQueue(
+            current_app._get_current_object(),
+            generate=recommend_for_result,
+            max_workers=int(os.getenv('RECOMMENDATION_WORKERS', 4)),
+            stale_after=int(os.getenv('RECOMMENDATION_STALE_AFTER', 300))
+        )
+    return recommendation_queue
+
+# Background removal of deleted analyses and their files
+deletion_queue = None
+
+def get_deletion_queue():
+    global deletion_queue
+    if deletion_queue is None:
+        deletion_queue = DeletionQueue(
+            current_app._get_current_object(),
+            remove_files=remove_upload_files,
+            file_workers=int(os.getenv('DELETION_FILE_WORKERS', 8)),
+            chunk_size=int(os.getenv('DELETION_CHUNK_SIZE', 200)),
+            stale_after=int(os.getenv('DELETION_STALE_AFTER', 300))
+        )
+    return deletion_queue
+
+def start_job_queue(app):
+    """Create the background queues for this app and resume work left over from a previous run"""
+    with app.app_context():
+        get_job_queue().recover()
+        get_recommendation_queue().recover()
+        get_deletion_queue().recover()
+
+@bp.cli.command('build-advice')
+@click.option('--top', default=50, show_default=True, help='Number of most frequent combinations to cover')
+@click.option('--variant', type=click.Choice(['full', 'short']), default='full', show_default=True,
+              help='full for analysis results, short for /health-advice')
+def build_advice_library(top, variant):
+    """Precompute treatment advice for the most frequent plant/disease/pest combinations"""
+    def combinations():
+        rows = db.session.query(PlantAnalysis.analysis_result).filter(
+            PlantAnalysis.analysis_result.isnot(None),
+            PlantAnalysis.deleted_at.is_(None)
+        ).yield_per(500)
+        for (result,) in rows:
+            if result:
+                yield diagnosis_for_result(result)
+    
+    def generate(plant_name, diseases, pests):
+        prompt = build_health_prompt(plant_name, diseases, pests, detailed=(variant == 'full'), with_confidence=False)
+        with usage_context(operation='advice-library'):
+            return get_groq_service().get_plant_response(prompt)
+    
+    report = get_advice_library().build(combinations(), generate, top_n=top, variant=variant)
+    click.echo(f"Kombinasi ditemukan: {report['seen']}, diproses: {report['considered']}, "
+               f"dibuat: {report['generated']}, masih baru: {report['fresh']}, gagal: {report['failed']}")
+
 @bp.route('/analyze', methods=['POST'])
 @login_required
 def analyze_plant():
@@ -120,74 +458,235 @@ def analyze_plant():
                 'message': 'Silakan set PLANTID_API_KEY di file .env dan restart Flask'
             }), 503
         
-        # Save file
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-        filename = secure_filename(timestamp + file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # Async mode: store the upload and let the worker pool do the upstream calls
+        if request.values.get('async', '').lower() in ('1', 'true', 'yes'):
+            queue = get_job_queue()
+            if queue.pending_count() >= ANALYSIS_QUEUE_MAX:
+                return jsonify({'error': 'Antrian analisis penuh, coba lagi nanti'}), 503
+            
+            filename = save_upload(file)
+            job = queue.enqueue(current_user.id, filename, file.filename)
+            return jsonify({
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': f'/api/plant/jobs/{job.id}',
+                'events_url': f'/api/plant/jobs/{job.id}/events'
+            }), 202
         
-        # Analyze with Plant.id API
-        service = get_plantid_service()
-        result = service.identify_plant(filepath)
+        # Analyze with Plant.id API, streaming straight from the upload
+        result, cached = identify_image(file.stream, file.filename)
         
         print(f"DEBUG: Plant analysis result: {result}")
         
         if not result:
             return jsonify({'error': 'Gagal menganalisis tanaman'}), 500
         
-        # Save to database dengan user_id
-        plant_name = result.get('name', 'Tidak diketahui')
-        confidence = result.get('confidence', 0)
+        # Save file after the upstream call so the image is not read back from disk;
+        # recommendations are generated in the background and fetched from recommendations_url
+        filename = save_upload(file)
+        analysis = store_analysis(current_user.id, filename, result, defer_recommendations=True)
+        
+        return jsonify(serialize_analysis(analysis, cached=cached)), 201
+    
+    except Exception as e:
+        print(f"PLANT ANALYSIS ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+BATCH_MAX_IMAGES = int(os.getenv('PLANTID_BATCH_MAX_IMAGES', 50))
+BATCH_CONCURRENCY = int(os.getenv('PLANTID_BATCH_CONCURRENCY', 5))
+
+def _analyze_batch_item(app, user_id, file):
+    """Worker for the batch endpoint: identify one image and generate its recommendations"""
+    with app.app_context(), usage_context(user_id=user_id):
+        try:
+            result, cached = identify_image(file.stream, file.filename)
+            if not result:
+                raise Exception('Gagal menganalisis tanaman')
+            return result, cached, recommend_for_result(result)
+        finally:
+            db.session.remove()
+
+@bp.route('/analyze/batch', methods=['POST'])
+@login_required
+def analyze_batch():
+    """
+    Analyze many images in one multipart request (field name: images).
+    Images are identified concurrently (PLANTID_BATCH_CONCURRENCY at a time) and all
+    rows are saved in one transaction. With same_plant=1 the photos are sent to
+    Plant.id together as one plant and only the first photo is stored. With stream=1 the response is NDJSON: one line
+    per image as soon as it finishes, then a summary line after the commit.
+    """
+    try:
+        files = [file for file in request.files.getlist('images') if file.filename]
+        
+        if not files:
+            return jsonify({'error': 'Tidak ada file gambar'}), 400
         
-        # Get plant name translation
-        plant_translation = get_plant_translation(plant_name)
-        plant_id_name = plant_translation.get('id', plant_name)
-        plant_en_name = plant_translation.get('en', plant_name)
+        if len(files) > BATCH_MAX_IMAGES:
+            return jsonify({'error': f'Maksimal {BATCH_MAX_IMAGES} gambar per batch'}), 400
         
-        # Generate AI recommendations
-        ai_recommendations = None
-        health_data = result.get('health', {})
-        diseases = health_data.get('diseases', {}).get('suggestions', [])
-        pests = health_data.get('pests', {}).get('suggestions', [])
+        invalid = [file.filename for file in files if not allowed_file(file.filename)]
+        if invalid:
+            return jsonify({'error': 'Format file tidak didukung', 'files': invalid}), 400
         
-        if diseases or pests:
+        api_key = os.getenv('PLANTID_API_KEY', '').strip()
+        if not api_key or api_key == 'your_plantid_api_key_here':
+            return jsonify({
+                'error': 'Plant.id API key belum dikonfigurasi',
+                'message': 'Silakan set PLANTID_API_KEY di file .env dan restart Flask'
+            }), 503
+        
+        user_id = current_user.id
+        
+        # Several photos of one plant: a single request using the images array
+        if request.values.get('same_plant', '').lower() in ('1', 'true', 'yes'):
+            result, cached = identify_images([file.stream for file in files], [file.filename for file in files])
+            if not result:
+                return jsonify({'error': 'Gagal menganalisis tanaman'}), 500
+            # The row references one image, so only that one is kept; the delete
+            # paths and the deletion queue would never find the others
+            filename = save_upload(files[0])
+            analysis = store_analysis(user_id, filename, result)
+            return jsonify({
+                'total': len(files),
+                'succeeded': 1,
+                'failed': 0,
+                'results': [dict(serialize_analysis(analysis, cached=cached), status='ok', images=[filename])]
+            }), 201
+        
+        app = current_app._get_current_object()
+        executor = ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(files)))
+        futures = {executor.submit(_analyze_batch_item, app, user_id, file): index for index, file in enumerate(files)}
+        
+        def collect():
+            """Yield (index, outcome) as images finish, then save every success in one transaction"""
+            outcomes = {}
             try:
-                ai_recommendations = generate_health_recommendations(plant_id_name, diseases, pests)
-            except Exception as e:
-                print(f"Warning: Could not generate recommendations: {e}")
-                ai_recommendations = None
-        
-        analysis = PlantAnalysis(
-            user_id=current_user.id,
-            image_filename=filename,
-            plant_name=plant_name,
-            confidence=confidence,
-            analysis_result=result,
-            ai_recommendations=ai_recommendations
-        )
-        db.session.add(analysis)
-        db.session.commit()
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        result, cached, ai_recommendations = future.result()
+                        outcomes[index] = {'status': 'ok', 'result': result, 'cached': cached,
+                                           'ai_recommendations': ai_recommendations}
+                    except Exception as e:
+                        print(f"Batch item {files[index].filename} failed: {e}")
+                        outcomes[index] = {'status': 'error', 'error': str(e)}
+                    yield index, outcomes[index]
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+            
+            analyses = {}
+            for index, outcome in outcomes.items():
+                if outcome['status'] == 'ok':
+                    filename = save_upload(files[index])
+                    analyses[index] = build_analysis(user_id, filename, outcome['result'], outcome['ai_recommendations'])
+            db.session.add_all([analyses[index] for index in sorted(analyses)])
+            db.session.commit()
+            
+            results = []
+            for index in range(len(files)):
+                if index in analyses:
+                    item = serialize_analysis(analyses[index], cached=outcomes[index]['cached'])
+                    item.update({'index': index, 'filename': files[index].filename, 'status': 'ok'})
+                else:
+                    item = {'index': index, 'filename': files[index].filename, 'status': 'error',
+                            'error': outcomes.get(index, {}).get('error', 'Tidak diproses')}
+                results.append(item)
+            yield None, {
+                'total': len(files),
+                'succeeded': len(analyses),
+                'failed': len(files) - len(analyses),
+                'results': results
+            }
         
-        return jsonify({
-            'id': analysis.id,
-            'plant_name': plant_name,
-            'plant_name_id': plant_id_name,
-            'plant_name_en': plant_en_name,
-            'confidence': confidence,
-            'image_url': f'/static/uploads/{filename}',
-            'health': result.get('health', {}),
-            'analysis_result': result,
-            'ai_recommendations': ai_recommendations,
-            'created_at': analysis.created_at.isoformat()
-        }), 201
+        if request.values.get('stream', '').lower() in ('1', 'true', 'yes'):
+            def generate():
+                for index, outcome in collect():
+                    if index is None:
+                        yield json.dumps(dict(outcome, event='summary')) + '\n'
+                    else:
+                        line = {'event': 'item', 'index': index, 'filename': files[index].filename, 'status': outcome['status']}
+                        if outcome['status'] == 'ok':
+                            line.update({'plant_name': outcome['result'].get('name'),
+                                         'confidence': outcome['result'].get('confidence', 0),
+                                         'health': outcome['result'].get('health', {}),
+                                         'cached': outcome['cached']})
+                        else:
+                            line['error'] = outcome['error']
+                        yield json.dumps(line) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        summary = None
+        for index, outcome in collect():
+            if index is None:
+                summary = outcome
+        return jsonify(summary), 201 if summary['succeeded'] else 500
     
     except Exception as e:
-        print(f"PLANT ANALYSIS ERROR: {e}")
+        print(f"BATCH ANALYSIS ERROR: {e}")
         import traceback
         traceback.print_exc()
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job_status(job_id):
+    """Get the status of an async analysis job"""
+    try:
+        job = AnalysisJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+        data = job.to_dict()
+        if job.status == 'done' and job.analysis_id:
+            analysis = db.session.get(PlantAnalysis, job.analysis_id)
+            if analysis and analysis.deleted_at is None:
+                data['result'] = serialize_analysis(analysis)
+        return jsonify(data), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), getattr(e, 'code', 500)
+
+@bp.route('/jobs/<job_id>/events', methods=['GET'])
+@login_required
+def job_events(job_id):
+    """Server-Sent Events stream of an async analysis job until it finishes"""
+    job = AnalysisJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    user_id = current_user.id
+    poll_interval = float(os.getenv('ANALYSIS_SSE_POLL_INTERVAL', 1))
+    max_wait = float(os.getenv('ANALYSIS_SSE_MAX_WAIT', 300))
+    
+    def generate():
+        last_status = None
+        deadline = time.monotonic() + max_wait
+        while time.monotonic() < deadline:
+            # End the read transaction so every poll sees the worker's commits
+            db.session.rollback()
+            current = AnalysisJob.query.filter_by(id=job.id, user_id=user_id).first()
+            if current is None:
+                break
+            
+            if current.status != last_status:
+                last_status = current.status
+                data = current.to_dict()
+                if current.status == 'done' and current.analysis_id:
+                    analysis = db.session.get(PlantAnalysis, current.analysis_id)
+                    if analysis and analysis.deleted_at is None:
+                        data['result'] = serialize_analysis(analysis)
+                yield f"event: {current.status}\ndata: {json.dumps(data)}\n\n"
+                if current.status in ('done', 'failed'):
+                    return
+            else:
+                yield ": keep-alive\n\n"
+            time.sleep(poll_interval)
+        yield "event: timeout\ndata: {}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @bp.route('/health-advice', methods=['POST'])
 @login_required
 def get_health_advice():
@@ -201,58 +700,68 @@ def get_health_advice():
         if not plant_name or (not diseases and not pests):
             return jsonify({'error': 'Invalid request'}), 400
         
-        # Build prompt for Groq
-        health_issues = []
-        
-        for disease in diseases[:3]:  # Top 3
-            health_issues.append(f"Penyakit: {disease['name']} (confidence: {disease['probability']*100:.0f}%)")
-        
-        for pest in pests[:3]:  # Top 3
-            health_issues.append(f"Hama: {pest['name']} (confidence: {pest['probability']*100:.0f}%)")
-        
-        issues_text = '\n'.join(health_issues)
-        
-        prompt = f"""Berikan saran penanganan singkat untuk {plant_name} yang mengalami masalah berikut:
-
-{issues_text}
-
-Berikan:
-1. Diagnosis singkat
-2. 3-4 langkah penanganan praktis
-3. Pencegahan di masa depan
-
-Gunakan bahasa Indonesia yang sederhana dan praktis untuk petani."""
-        
-        # Get Groq service
-        from app.services.groq_service import GroqService
-        groq_service = GroqService(api_key=os.getenv('GROQ_API_KEY'))
-        response = groq_service.get_plant_response(prompt)
+        response = lookup_health_advice(plant_name, diseases, pests, detailed=False, record_new=False)
         
         return jsonify({
             'advice': response,
             'plant': plant_name,
-            'issues_count': len(health_issues)
+            'issues_count': len(diseases[:3]) + len(pests[:3])
         }), 200
     
     except Exception as e:
         print(f"HEALTH ADVICE ERROR: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/stats', methods=['GET'])
+@login_required
+def get_service_stats():
+    """Get Plant.id client statistics for this worker"""
+    try:
+        service = get_plantid_service()
+        return jsonify({
+            'pool': service.get_pool_stats(),
+            'streaming': service.get_stream_stats(),
+            'limits': service.get_limit_stats(),
+            'cache': get_identification_cache().get_stats(),
+            'single_flight': identification_flight.get_stats(),
+            'images': get_image_stats(),
+            'jobs': get_job_queue().get_stats(),
+            'recommendations': get_recommendation_queue().get_stats(),
+            'deletions': get_deletion_queue().get_stats(),
+            'advice_library': get_advice_library().get_stats()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def image_urls(analysis):
+    image_url = f'/static/uploads/{analysis.image_filename}'
+    thumbnail_url = f'/static/uploads/{analysis.thumbnail_filename}' if analysis.thumbnail_filename else image_url
+    return image_url, thumbnail_url
+
 @bp.route('/history', methods=['GET'])
 @login_required
 def get_analysis_history():
+    """Compact history list; full results come from /history/<id>"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
+        query = PlantAnalysis.query.filter_by(user_id=current_user.id, deleted_at=None)
+        total = count_user_rows(PlantAnalysis, current_user.id)
         
-        pagination = PlantAnalysis.query.filter_by(user_id=current_user.id).order_by(PlantAnalysis.created_at.desc()).paginate(
-            page=page, per_page=per_page
-        )
+        # Cursor mode as in /api/chat/history
+        next_cursor = None
+        if 'cursor' in request.args:
+            analyses, next_cursor = keyset_page(query, PlantAnalysis, request.args.get('cursor'), per_page)
+        else:
+            analyses = query.order_by(PlantAnalysis.created_at.desc(), PlantAnalysis.id.desc()).paginate(
+                page=page, per_page=per_page, count=False
+            ).items
         
         data = []
-        for analysis in pagination.items:
-            analysis_dict = analysis.to_dict()
-            analysis_dict['image_url'] = f'/static/uploads/{analysis.image_filename}'
+        for analysis in analyses:
+            analysis_dict = analysis.to_summary_dict()
+            analysis_dict['image_url'], analysis_dict['thumbnail_url'] = image_urls(analysis)
             
             # Get plant name translations
             plant_translation = get_plant_translation(analysis.plant_name or '')
@@ -261,57 +770,104 @@ def get_analysis_history():
             
             data.append(analysis_dict)
         
+        if 'cursor' in request.args:
+            return jsonify({'total': total, 'next_cursor': next_cursor, 'data': data}), 200
+        
         return jsonify({
-            'total': pagination.total,
-            'pages': pagination.pages,
+            'total': total,
+            'pages': page_count(total, per_page),
             'current_page': page,
             'data': data
         }), 200
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@bp.route('/history/<int:analysis_id>', methods=['DELETE'])
+@bp.route('/history/<int:analysis_id>', methods=['GET'])
 @login_required
-def delete_analysis(analysis_id):
+def get_analysis_detail(analysis_id):
+    """Full analysis result and AI recommendations for one history item"""
     try:
-        analysis = PlantAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id).first_or_404()
+        analysis = PlantAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id, deleted_at=None).first_or_404()
         
-        # Delete image file
-        filepath = os.path.join(UPLOAD_FOLDER, analysis.image_filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        analysis_dict = analysis.to_dict()
+        analysis_dict['image_url'], analysis_dict['thumbnail_url'] = image_urls(analysis)
         
-        db.session.delete(analysis)
-        db.session.commit()
+        plant_translation = get_plant_translation(analysis.plant_name or '')
+        analysis_dict['plant_name_id'] = plant_translation.get('id', analysis.plant_name)
+        analysis_dict['plant_name_en'] = plant_translation.get('en', analysis.plant_name)
+        
+        return jsonify(analysis_dict), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), getattr(e, 'code', 500)
+
+@bp.route('/history/<int:analysis_id>/recommendations', methods=['GET'])
+@login_required
+def get_analysis_recommendations(analysis_id):
+    """Poll the background AI recommendations of an analysis"""
+    try:
+        analysis = PlantAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id, deleted_at=None).first_or_404()
+        
+        return jsonify({
+            'id': analysis.id,
+            'recommendations_status': analysis.recommendations_status,
+            'ai_recommendations': analysis.ai_recommendations
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), getattr(e, 'code', 500)
+
+@bp.route('/history/<int:analysis_id>', methods=['DELETE'])
+@login_required
+def delete_analysis(analysis_id):
+    """Hide an analysis at once; the row and its files are removed in the background"""
+    try:
+        job = get_deletion_queue().enqueue(current_user.id, analysis_id=analysis_id)
+        if job is None:
+            return jsonify({'error': 'Analisis tidak ditemukan'}), 404
+        invalidate_user_rows(PlantAnalysis, current_user.id)
         
-        return jsonify({'message': 'Analisis dihapus'}), 200
+        return jsonify({
+            'message': 'Analisis dihapus',
+            'job_id': job.id,
+            'status_url': f'/api/plant/deletions/{job.id}'
+        }), 202
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/history/clear', methods=['POST'])
 @login_required
 def clear_analysis_history():
-    """Clear all plant analysis history for current user"""
+    """Clear all plant analysis history for current user; rows and files are removed in the background"""
     try:
-        # Get all analyses for current user
-        analyses = PlantAnalysis.query.filter_by(user_id=current_user.id).all()
-        
-        # Delete all image files
-        for analysis in analyses:
-            filepath = os.path.join(UPLOAD_FOLDER, analysis.image_filename)
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                except Exception as e:
-                    print(f"Warning: Could not delete file {filepath}: {e}")
-        
-        # Delete all records
-        PlantAnalysis.query.filter_by(user_id=current_user.id).delete()
-        db.session.commit()
+        job = get_deletion_queue().enqueue(current_user.id)
+        invalidate_user_rows(PlantAnalysis, current_user.id)
+        if job is None:
+            return jsonify({'message': 'Semua riwayat analisis dihapus', 'total': 0}), 200
         
-        return jsonify({'message': 'Semua riwayat analisis dihapus'}), 200
+        return jsonify({
+            'message': 'Semua riwayat analisis dihapus',
+            'job_id': job.id,
+            'total': job.total,
+            'status_url': f'/api/plant/deletions/{job.id}'
+        }), 202
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+@bp.route('/deletions/<job_id>', methods=['GET'])
+@login_required
+def get_deletion_status(job_id):
+    """Progress of a background deletion"""
+    try:
+        job = DeletionJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+        return jsonify(job.to_dict()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), getattr(e, 'code', 500)
@@ -0,0 +1,37 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from app.services.search_service import search, search_backend, clamp_page
+import time
+
+bp = Blueprint('search', __name__, url_prefix='/api/search')
+
+@bp.route('', methods=['GET'])
+@login_required
+def search_history():
+    """Ranked full-text search over the user's chat history and plant analyses"""
+    try:
+        query = request.args.get('q', '').strip()
+        kind = request.args.get('type', 'all')
+        page, per_page = clamp_page(request.args.get('page', 1, type=int), request.args.get('per_page', 10, type=int))
+        
+        if not query:
+            return jsonify({'error': 'Kata kunci tidak boleh kosong'}), 400
+        
+        started = time.perf_counter()
+        results, has_more = search(current_user.id, query, kind=kind, page=page, per_page=per_page)
+        
+        return jsonify({
+            'query': query,
+            'type': kind,
+            'page': page,
+            'per_page': per_page,
+            'has_more': has_more,
+            'backend': search_backend(),
+            'took_ms': round((time.perf_counter() - started) * 1000, 1),
+            'data': results
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,370 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import TreatmentAdvice
+
+# Top diseases/pests that make up a combination (same as the advice prompts)
+TOP_ISSUES = 3
+# Requests for a combination before live-generated advice is kept in the library
+MIN_REQUESTS = int(os.getenv('ADVICE_LIBRARY_MIN_REQUESTS', 2))
+# Stored advice older than this is regenerated
+MAX_AGE_DAYS = int(os.getenv('ADVICE_LIBRARY_MAX_AGE_DAYS', 90))
+# Combinations kept; the least requested ones are pruned beyond this
+MAX_ENTRIES = int(os.getenv('ADVICE_LIBRARY_MAX_ENTRIES', 5000))
+# Request counts are buffered in memory and written every FLUSH_INTERVAL seconds
+FLUSH_INTERVAL = float(os.getenv('ADVICE_LIBRARY_FLUSH_INTERVAL', 10))
+ENABLED = os.getenv('ADVICE_LIBRARY_ENABLED', 'true').lower() == 'true'
+
+def _normalize(text):
+    return ' '.join(str(text or '').lower().split())
+
+def canonical_issues(diseases, pests):
+    """
+    Build the order-independent issue set of a diagnosis
+    
+    Args:
+        diseases (list): Disease suggestions with a 'name' key, most likely first
+        pests (list): Pest suggestions with a 'name' key, most likely first
+    
+    Returns:
+        list: Sorted, de-duplicated names prefixed with their kind
+    """
+    issues = {f"penyakit:{_normalize(disease['name'])}" for disease in diseases[:TOP_ISSUES]}
+    issues.update(f"hama:{_normalize(pest['name'])}" for pest in pests[:TOP_ISSUES])
+    return sorted(issues)
+
+def advice_key(plant_name, diseases, pests, variant):
+    """Library key of a canonicalized (plant, issue set, variant) combination"""
+    raw = json.dumps([variant, _normalize(plant_name), canonical_issues(diseases, pests)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class AdviceLibrary:
+    """
+    Precomputed treatment advice for common plant/disease/pest combinations.
+    Every lookup counts towards the popularity of its combination; once a
+    combination has been requested `min_requests` times its advice is kept
+    so later requests are served without calling Groq.
+    Request counts are buffered and written in batches by a background
+    thread, and only diagnoses from stored analyses add new combinations;
+    beyond `max_entries` the least requested combinations are pruned.
+    """
+    
+    def __init__(self, min_requests=MIN_REQUESTS, max_age_days=MAX_AGE_DAYS, max_entries=MAX_ENTRIES,
+                 flush_interval=FLUSH_INTERVAL):
+        """
+        Args:
+            min_requests (int): Requests before live-generated advice is stored
+            max_age_days (int): Age after which stored advice counts as stale
+            max_entries (int): Combinations kept in the library (0 for no limit)
+            flush_interval (float): Seconds between request count writes
+        """
+        self.min_requests = min_requests
+        self.max_age = timedelta(days=max_age_days)
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+        self._thread_pid = None
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0, 'generated': 0, 'flushes': 0, 'pruned': 0}
+    
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+    
+    def is_fresh(self, entry):
+        return entry.advice is not None and entry.generated_at is not None and \
+            entry.generated_at >= datetime.utcnow() - self.max_age
+    
+    def _touch(self, key, plant_name, diseases, pests, variant, amount=1):
+        """Add to the request count of a combination, creating its row on first sight"""
+        now = datetime.utcnow()
+        updated = TreatmentAdvice.query.filter_by(advice_key=key).update({
+            'request_count': TreatmentAdvice.request_count + amount,
+            'last_requested_at': now
+        }, synchronize_session=False)
+        if not updated:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(TreatmentAdvice(
+                        advice_key=key,
+                        variant=variant,
+                        plant_name=_normalize(plant_name),
+                        issues=canonical_issues(diseases, pests),
+                        request_count=amount,
+                        last_requested_at=now
+                    ))
+            except IntegrityError:
+                # Another worker created the row first
+                TreatmentAdvice.query.filter_by(advice_key=key).update({
+                    'request_count': TreatmentAdvice.request_count + amount,
+                    'last_requested_at': now
+                }, synchronize_session=False)
+        db.session.commit()
+        return TreatmentAdvice.query.filter_by(advice_key=key).first()
+    
+    def _record(self, key, plant_name, diseases, pests, variant, create):
+        """Buffer one request for a combination; returns the requests not yet written for it"""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                if not create:
+                    return 0
+                pending = self._pending[key] = {
+                    'amount': 0,
+                    'variant': variant,
+                    'plant_name': _normalize(plant_name),
+                    'issues': canonical_issues(diseases, pests)
+                }
+            pending['amount'] += 1
+            pending['last_requested_at'] = datetime.utcnow()
+            if self.app is None:
+                self.app = current_app._get_current_object()
+                atexit.register(self.flush)
+        self._ensure_thread()
+        return pending['amount']
+    
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own writer
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='advice-library-writer', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self):
+        """Write buffered request counts in one transaction and prune the library; called by the writer thread and at exit"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            with self.app.app_context():
+                try:
+                    for key, pending in batch.items():
+                        self._add_requests(key, pending)
+                    db.session.commit()
+                    self._prune()
+                    self._count('flushes')
+                except Exception as e:
+                    # Popularity is best effort; a failed batch is dropped rather than retried forever
+                    db.session.rollback()
+                    print(f"Advice library write error: {e}")
+                    traceback.print_exc()
+                finally:
+                    db.session.remove()
+    
+    def _add_requests(self, key, pending):
+        values = {
+            'request_count': TreatmentAdvice.request_count + pending['amount'],
+            'last_requested_at': pending['last_requested_at']
+        }
+        if TreatmentAdvice.query.filter_by(advice_key=key).update(values, synchronize_session=False):
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(TreatmentAdvice(
+                    advice_key=key,
+                    variant=pending['variant'],
+                    plant_name=pending['plant_name'],
+                    issues=pending['issues'],
+                    request_count=pending['amount'],
+                    last_requested_at=pending['last_requested_at']
+                ))
+        except IntegrityError:
+            # Another worker created the row first
+            TreatmentAdvice.query.filter_by(advice_key=key).update(values, synchronize_session=False)
+    
+    def _prune(self):
+        """Delete the least requested combinations beyond max_entries"""
+        if not self.max_entries:
+            return
+        excess = TreatmentAdvice.query.count() - self.max_entries
+        if excess <= 0:
+            return
+        doomed = db.session.query(TreatmentAdvice.id).order_by(
+            TreatmentAdvice.request_count.asc(), TreatmentAdvice.last_requested_at.asc()
+        ).limit(excess).scalar_subquery()
+        pruned = TreatmentAdvice.query.filter(TreatmentAdvice.id.in_(doomed)).delete(synchronize_session=False)
+        db.session.commit()
+        self._count('pruned', pruned)
+    
+    def lookup(self, plant_name, diseases, pests, variant='full', record_new=True):
+        """
+        Look up advice for a diagnosis and count the request
+        
+        The lookup only reads; the request is counted in memory and written
+        later by the writer thread.
+        
+        Args:
+            plant_name (str): Plant name used in the advice
+            diseases (list): Disease suggestions
+            pests (list): Pest suggestions
+            variant (str): 'full' for analysis results, 'short' for quick advice
+            record_new (bool): Add the combination if it is not in the library yet;
+                False for diagnoses sent by the client rather than from an analysis
+        
+        Returns:
+            tuple: (advice or None, popular) where popular means live advice
+                for this combination should be stored
+        """
+        try:
+            key = advice_key(plant_name, diseases, pests, variant)
+            entry = TreatmentAdvice.query.filter_by(advice_key=key).first()
+            unwritten = self._record(key, plant_name, diseases, pests, variant, create=record_new or entry is not None)
+            if entry is not None and self.is_fresh(entry):
+                self._count('hits')
+                return entry.advice, True
+            self._count('misses')
+            if entry is None and not unwritten:
+                return None, False  # Unknown combination sent by the client
+            return None, (entry.request_count if entry is not None else 0) + unwritten >= self.min_requests
+        except Exception as e:
+            db.session.rollback()
+            print(f"Advice library lookup error: {e}")
+            self._count('misses')
+            return None, False
+    
+    def store(self, plant_name, diseases, pests, advice, variant='full'):
+        """
+        Save generated advice for a combination
+        
+        Args:
+            plant_name (str): Plant name used in the advice
+            diseases (list): Disease suggestions
+            pests (list): Pest suggestions
+            advice (str): Generated advice text
+            variant (str): Advice variant
+        """
+        if not advice:
+            return
+        try:
+            key = advice_key(plant_name, diseases, pests, variant)
+            entry = TreatmentAdvice.query.filter_by(advice_key=key).first()
+            if entry is None:
+                entry = self._touch(key, plant_name, diseases, pests, variant, amount=0)
+            entry.advice = advice
+            entry.generated_at = datetime.utcnow()
+            db.session.commit()
+            self._count('stored')
+        except Exception as e:
+            db.session.rollback()
+            print(f"Advice library store error: {e}")
+    
+    def build(self, combinations, generate, top_n=50, variant='full'):
+        """
+        Precompute advice for the most frequent combinations
+        
+        Combinations seen in `combinations` are ranked together with the ones
+        counted by live lookups; the top `top_n` without fresh advice are
+        generated and stored.
+        
+        Args:
+            combinations: Iterable of (plant_name, diseases, pests) diagnoses
+            generate: Callable (plant_name, diseases, pests) -> advice text
+            top_n (int): Number of most frequent combinations to cover
+            variant (str): Advice variant to build
+        
+        Returns:
+            dict: Combinations seen, considered, generated, already fresh and failed
+        """
+        counts = Counter()
+        samples = {}
+        for plant_name, diseases, pests in combinations:
+            if not diseases and not pests:
+                continue
+            key = advice_key(plant_name, diseases, pests, variant)
+            counts[key] += 1
+            samples.setdefault(key, (plant_name, diseases, pests))
+        
+        # Popularity is the larger of the scanned count and the live request count
+        stored = {}
+        if counts:
+            keys = list(counts)
+            for start in range(0, len(keys), 500):
+                for entry in TreatmentAdvice.query.filter(
+                    TreatmentAdvice.advice_key.in_(keys[start:start + 500])
+                ).all():
+                    stored[entry.advice_key] = entry
+        ranking = {key: max(count, stored[key].request_count if key in stored else 0)
+                   for key, count in counts.items()}
+        for entry in TreatmentAdvice.query.filter_by(variant=variant).order_by(
+            TreatmentAdvice.request_count.desc()
+        ).limit(top_n).all():
+            if entry.advice_key not in ranking:
+                ranking[entry.advice_key] = entry.request_count
+                stored[entry.advice_key] = entry
+        
+        report = {'seen': len(counts), 'considered': 0, 'generated': 0, 'fresh': 0, 'failed': 0}
+        for key in sorted(ranking, key=ranking.get, reverse=True)[:top_n]:
+            report['considered'] += 1
+            entry = stored.get(key)
+            if entry is not None and self.is_fresh(entry):
+                report['fresh'] += 1
+                continue
+            
+            if key in samples:
+                plant_name, diseases, pests = samples[key]
+            else:
+                # Only known from live lookups: rebuild the diagnosis from the stored issue names
+                plant_name = entry.plant_name
+                diseases = [{'name': issue.split(':', 1)[1]} for issue in entry.issues if issue.startswith('penyakit:')]
+                pests = [{'name': issue.split(':', 1)[1]} for issue in entry.issues if issue.startswith('hama:')]
+            
+            try:
+                advice = generate(plant_name, diseases, pests)
+            except Exception as e:
+                print(f"Advice library build error for {plant_name}: {e}")
+                advice = None
+            if not advice:
+                report['failed'] += 1
+                continue
+            
+            if entry is None:
+                entry = self._touch(key, plant_name, diseases, pests, variant, amount=0)
+            entry.request_count = max(entry.request_count, ranking[key])
+            entry.advice = advice
+            entry.generated_at = datetime.utcnow()
+            db.session.commit()
+            report['generated'] += 1
+            self._count('generated')
+        return report
+    
+    def get_stats(self):
+        """
+        Get library counters for this worker plus the shared library size
+        
+        Returns:
+            dict: Hits, misses, hit rate, stored and generated advice, writes, library entries
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        try:
+            stats['entries'] = TreatmentAdvice.query.filter(TreatmentAdvice.advice.isnot(None)).count()
+            stats['combinations'] = TreatmentAdvice.query.count()
+        except Exception:
+            db.session.rollback()
+            stats['entries'] = None
+            stats['combinations'] = None
+        stats['min_requests'] = self.min_requests
+        stats['max_entries'] = self.max_entries
+        return stats
@@ -0,0 +1,22 @@
+import asyncio
+from app import db
+
+async def run_sync(fn, *args, **kwargs):
+    """
+    Run blocking database or CPU work in a worker thread from a coroutine.
+    The request's database session is closed afterwards, so its connection goes
+    back to the pool instead of being held while the coroutine awaits an
+    upstream call. Loaded objects stay readable but are detached.
+    
+    Args:
+        fn: Callable to run
+        
+    Returns:
+        The callable's return value
+    """
+    def call():
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            db.session.close()
+    return await asyncio.to_thread(call)
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import CacheEntry
+
+# Seconds between writes of an entry's last access; hits in between are counted
+# in memory and written with the next one, so a hot entry is not updated on every read
+TOUCH_INTERVAL = int(os.getenv('CACHE_TOUCH_INTERVAL', 60))
+
+def hash_stream(stream, chunk_size=65536):
+    """
+    Compute SHA-256 of a seekable binary stream without reading it into memory at once
+    
+    Args:
+        stream: Seekable binary file-like object
+        chunk_size (int): Bytes read per chunk
+        
+    Returns:
+        str: Hex digest; the stream position is restored afterwards
+    """
+    start = stream.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.hexdigest()
+
+class DbCache:
+    """
+    Key/value cache stored in the database so every gunicorn worker shares it.
+    Entries expire after `ttl` seconds and the least recently used entries are
+    evicted once a namespace holds more than `max_entries` rows. Recency is
+    tracked to within `touch_interval` seconds.
+    """
+    
+    def __init__(self, namespace, ttl, max_entries, touch_interval=TOUCH_INTERVAL):
+        """
+        Args:
+            namespace (str): Name separating this cache from others in the same table
+            ttl (int): Entry lifetime in seconds
+            max_entries (int): Maximum rows kept for this namespace
+            touch_interval (int): Seconds between last-access writes of one entry
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._unwritten_hits = {}  # Entry id -> hits not yet added to hit_count
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'touches': 0}
+    
+    @staticmethod
+    def make_key(*parts):
+        """Build a cache key from JSON-serializable parts"""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+    
+    def get(self, key):
+        """
+        Look up a cached value
+        
+        Args:
+            key (str): Cache key
+            
+        Returns:
+            The stored value, or None on a miss or expired entry
+        """
+        try:
+            entry = CacheEntry.query.filter_by(namespace=self.namespace, cache_key=key).first()
+            now = datetime.utcnow()
+            
+            if entry is None:
+                self._count('misses')
+                return None
+            
+            if entry.created_at < now - timedelta(seconds=self.ttl):
+                db.session.delete(entry)
+                db.session.commit()
+                self._count('misses')
+                return None
+            
+            value = entry.value
+            self._touch(entry, now)
+            self._count('hits')
+            return value
+        
+        except Exception as e:
+            db.session.rollback()
+            print(f"Cache lookup error ({self.namespace}): {e}")
+            self._count('misses')
+            return None
+    
+    def _touch(self, entry, now):
+        """Record a hit; the row is only written once its last access is touch_interval old"""
+        with self._lock:
+            hits = self._unwritten_hits.pop(entry.id, 0) + 1
+            if entry.last_accessed_at is not None and \
+                    entry.last_accessed_at > now - timedelta(seconds=self.touch_interval):
+                if len(self._unwritten_hits) >= self.max_entries:
+                    self._unwritten_hits.clear()  # Counts of evicted entries would pile up otherwise
+                self._unwritten_hits[entry.id] = hits
+                return
+        
+        CacheEntry.query.filter_by(id=entry.id).update({
+            'hit_count': CacheEntry.hit_count + hits,
+            'last_accessed_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        self._count('touches')
+    
+    def set(self, key, value):
+        """
+        Store a value and evict least recently used entries beyond the size limit
+        
+        Args:
+            key (str): Cache key
+            value: JSON-serializable value
+        """
+        now = datetime.utcnow()
+        try:
+            entry = CacheEntry.query.filter_by(namespace=self.namespace, cache_key=key).first()
+            if entry is None:
+                db.session.add(CacheEntry(
+                    namespace=self.namespace,
+                    cache_key=key,
+                    value=value,
+                    created_at=now,
+                    last_accessed_at=now
+                ))
+            else:
+                entry.value = value
+                entry.created_at = now
+                entry.last_accessed_at = now
+            db.session.commit()
+            self._count('sets')
+        except IntegrityError:
+            # Another worker stored the same key first
+            db.session.rollback()
+            return
+        except Exception as e:
+            db.session.rollback()
+            print(f"Cache store error ({self.namespace}): {e}")
+            return
+        
+        self.evict()
+    
+    def evict(self):
+        """Delete expired entries and the least recently used ones beyond max_entries"""
+        try:
+            expired_before = datetime.utcnow() - timedelta(seconds=self.ttl)
+            removed = CacheEntry.query.filter(
+                CacheEntry.namespace == self.namespace,
+                CacheEntry.created_at < expired_before
+            ).delete(synchronize_session=False)
+            
+            overflow = CacheEntry.query.filter_by(namespace=self.namespace).count() - self.max_entries
+            if overflow > 0:
+                oldest = db.session.query(CacheEntry.id).filter_by(namespace=self.namespace).order_by(
+                    CacheEntry.last_accessed_at.asc()
+                ).limit(overflow).subquery()
+                removed += CacheEntry.query.filter(CacheEntry.id.in_(db.select(oldest.c.id))).delete(
+                    synchronize_session=False
+                )
+            db.session.commit()
+            if removed:
+                self._count('evictions', removed)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Cache eviction error ({self.namespace}): {e}")
+    
+    def get_stats(self):
+        """
+        Get cache counters for this worker plus the shared entry count
+        
+        Returns:
+            dict: Hits, misses, hit rate, stores, evictions and stored entries
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        try:
+            stats['entries'] = CacheEntry.query.filter_by(namespace=self.namespace).count()
+        except Exception:
+            db.session.rollback()
+            stats['entries'] = None
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        return stats
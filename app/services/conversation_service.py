@@ -0,0 +1,216 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import ChatHistory, ChatSummary
+from app.services.usage_service import usage_context
+
+# Estimated prompt tokens spent on earlier turns (rolling summary included)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', 1500))
+# Newest turns not yet in the summary that are considered for the window
+CONTEXT_MAX_TURNS = int(os.getenv('CHAT_CONTEXT_MAX_TURNS', 20))
+# Estimated tokens of one earlier message in the window; answers run up to 2000
+# completion tokens, so longer ones are cut instead of filling the budget alone
+CONTEXT_TURN_TOKENS = int(os.getenv('CHAT_CONTEXT_TURN_TOKENS', 300))
+# Turns left out of the window before the summary is updated in the background
+SUMMARY_MIN_TURNS = int(os.getenv('CHAT_SUMMARY_MIN_TURNS', 4))
+# Completion limit for the rolling summary, which bounds its size in later prompts
+SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', 300))
+# Characters of each turn fed into a summary update
+SUMMARY_TURN_CHARS = 2000
+# Turns folded per summary call
+SUMMARY_CHUNK_TURNS = 10
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_pending = set()
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token) used for budgeting"""
+    return len(text or '') // 4 + 1
+
+def context_text(text):
+    """Message text as sent in the window, cut to CONTEXT_TURN_TOKENS"""
+    limit = CONTEXT_TURN_TOKENS * 4
+    text = text or ''
+    return text if len(text) <= limit else text[:limit].rstrip() + ' …'
+
+def turn_tokens(chat):
+    # A few extra tokens for the role markers of both messages
+    return estimate_tokens(context_text(chat.user_message)) + estimate_tokens(context_text(chat.ai_response)) + 8
+
+def build_history(service, user_id, plant_topic):
+    """
+    Build the earlier-conversation messages for a chat question
+    
+    The newest turns for the user and topic are packed into the token budget.
+    Once SUMMARY_MIN_TURNS turns no longer fit, everything older than the
+    window is folded into the stored rolling summary in the background,
+    together with enough older window turns to free half of the budget, so
+    the request never waits for a summary call.
+    
+    Args:
+        service (GroqService): Service used to update the summary
+        user_id (int): Owner of the conversation
+        plant_topic (str): Conversation topic
+    
+    Returns:
+        tuple: (list of chat messages, dict with window turns and estimated tokens)
+    """
+    summary = ChatSummary.query.filter_by(user_id=user_id, plant_topic=plant_topic).first()
+    turns = ChatHistory.query.filter(
+        ChatHistory.user_id == user_id,
+        ChatHistory.plant_topic == plant_topic,
+        ChatHistory.id > (summary.last_chat_id if summary else 0)
+    ).options(db.undefer_group('full_text')).order_by(ChatHistory.id.desc()).limit(
+        CONTEXT_MAX_TURNS + SUMMARY_MIN_TURNS
+    ).all()
+    
+    budget = CONTEXT_TOKEN_BUDGET - (estimate_tokens(summary.summary) if summary else 0)
+    window, used = [], 0
+    for chat in turns[:CONTEXT_MAX_TURNS]:  # Newest first
+        cost = turn_tokens(chat)
+        if used + cost > budget:
+            break
+        window.append(chat)
+        used += cost
+    
+    # Left-out turns wait in the table until enough have built up
+    overflow = turns[len(window):]
+    pending = bool(overflow) and len(overflow) >= SUMMARY_MIN_TURNS
+    if pending:
+        folded = overflow[0]
+        remaining = used
+        for chat in reversed(window):  # Oldest first
+            if remaining <= budget // 2:
+                break
+            remaining -= turn_tokens(chat)
+            folded = chat
+        schedule_summary(service, user_id, plant_topic, folded.id)
+    
+    messages = []
+    if summary:
+        messages.append({
+            "role": "system",
+            "content": f"Ringkasan percakapan sebelumnya dengan pengguna:\n{summary.summary}"
+        })
+    for chat in reversed(window):
+        messages.append({"role": "user", "content": context_text(chat.user_message)})
+        messages.append({"role": "assistant", "content": context_text(chat.ai_response)})
+    
+    return messages, {
+        'turns': len(window),
+        'summarized_turns': summary.turns_summarized if summary else 0,
+        'summary_pending': pending,
+        'history_tokens': used + (estimate_tokens(summary.summary) if summary else 0)
+    }
+
+def schedule_summary(service, user_id, plant_topic, upto_id):
+    """Fold every unsummarized turn up to upto_id in a background thread, once per conversation at a time"""
+    global _executor, _executor_pid
+    key = (user_id, plant_topic)
+    with _lock:
+        # Threads do not survive a fork, so each gunicorn worker builds its own pool
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-summary')
+            _executor_pid = os.getpid()
+            _pending.clear()
+        if key in _pending:
+            return False
+        _pending.add(key)
+        executor = _executor
+    executor.submit(_run_summary, current_app._get_current_object(), service, user_id, plant_topic, upto_id)
+    return True
+
+def _run_summary(app, service, user_id, plant_topic, upto_id):
+    with app.app_context():
+        try:
+            fold_turns(service, user_id, plant_topic, upto_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Could not update chat summary: {e}")
+            traceback.print_exc()
+        finally:
+            db.session.remove()
+            with _lock:
+                _pending.discard((user_id, plant_topic))
+
+def fold_turns(service, user_id, plant_topic, upto_id):
+    """
+    Fold all turns after the summary's last_chat_id up to upto_id, SUMMARY_CHUNK_TURNS per call
+    
+    Returns:
+        ChatSummary: Summary after the last successful update, or None if there is none
+    """
+    while True:
+        summary = ChatSummary.query.filter_by(user_id=user_id, plant_topic=plant_topic).first()
+        turns = ChatHistory.query.filter(
+            ChatHistory.user_id == user_id,
+            ChatHistory.plant_topic == plant_topic,
+            ChatHistory.id > (summary.last_chat_id if summary else 0),
+            ChatHistory.id <= upto_id
+        ).options(db.undefer_group('full_text')).order_by(ChatHistory.id.asc()).limit(SUMMARY_CHUNK_TURNS).all()
+        if not turns:
+            return summary
+        
+        updated = update_summary(service, user_id, plant_topic, summary, turns)
+        if updated is None or updated.last_chat_id < turns[-1].id:
+            return updated  # The call failed; the turns are folded on a later attempt
+
+def update_summary(service, user_id, plant_topic, summary, turns):
+    """
+    Fold turns (oldest first) into the rolling summary of a conversation
+    
+    Returns:
+        ChatSummary: Updated summary, or the stored one if the update failed or lost a race
+    """
+    transcript = '\n'.join(
+        f"Pengguna: {chat.user_message[:SUMMARY_TURN_CHARS]}\nAsisten: {chat.ai_response[:SUMMARY_TURN_CHARS]}"
+        for chat in turns
+    )
+    previous = summary.summary if summary else '(belum ada)'
+    messages = [
+        {
+            "role": "system",
+            "content": "Anda merangkum percakapan antara petani dan asisten pertanian dalam Bahasa Indonesia."
+        },
+        {
+            "role": "user",
+            "content": f"""Ringkasan sebelumnya:
+{previous}
+
+Percakapan lanjutan:
+{transcript}
+
+Tulis ringkasan baru (maksimal 150 kata) yang menggabungkan ringkasan sebelumnya dan percakapan lanjutan.
+Simpan fakta penting: jenis tanaman, gejala, kondisi lahan, dan saran yang sudah diberikan."""
+        }
+    ]
+    
+    try:
+        with usage_context(user_id=user_id, operation='summary'):
+            text = service.complete(messages, max_tokens=SUMMARY_MAX_TOKENS)
+        if summary is None:
+            summary = ChatSummary(user_id=user_id, plant_topic=plant_topic, summary=text,
+                                  last_chat_id=turns[-1].id, turns_summarized=len(turns))
+            db.session.add(summary)
+        else:
+            # Only if no other worker moved the summary on since it was read
+            ChatSummary.query.filter_by(id=summary.id, last_chat_id=summary.last_chat_id).update({
+                'summary': text,
+                'last_chat_id': turns[-1].id,
+                'turns_summarized': ChatSummary.turns_summarized + len(turns)
+            }, synchronize_session=False)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker created the summary first
+        db.session.rollback()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Could not update chat summary: {e}")
+    db.session.expire_all()
+    return ChatSummary.query.filter_by(user_id=user_id, plant_topic=plant_topic).first()
@@ -0,0 +1,116 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_DATABASE_URL = 'sqlite:///plankton.db'
+
+# Connections kept open per worker process, and extra connections opened under bursts
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+# Seconds a request waits for a free connection before failing
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+# Seconds before a server connection is replaced (PostgreSQL; below any proxy idle timeout)
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+# SQLite: WAL lets readers run alongside the single writer, and synchronous=NORMAL
+# only syncs at checkpoints, which is safe in WAL mode (a power loss can drop the
+# last commits but never corrupts the file)
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+# Milliseconds a writer waits for the lock instead of failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 15000))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))
+# Page cache per connection in KiB
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 20000))
+
+def database_url(url=None):
+    """
+    DATABASE_URL normalized for SQLAlchemy
+    
+    postgres:// URLs (as given by Heroku, Render and friends) are rewritten to
+    postgresql://, since SQLAlchemy 1.4+ no longer accepts the short scheme.
+    """
+    url = url or os.getenv('DATABASE_URL') or DEFAULT_DATABASE_URL
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+def engine_options(url):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for a database URL
+    
+    Args:
+        url (str): Normalized database URL
+    
+    Returns:
+        dict: Pool sizing per worker process and driver connect arguments
+    """
+    if is_sqlite(url):
+        database = make_url(url).database
+        if not database or database == ':memory:':
+            # Flask-SQLAlchemy uses a single static connection for in-memory databases
+            return {}
+        return {
+            'pool_size': POOL_SIZE,
+            'max_overflow': MAX_OVERFLOW,
+            'pool_timeout': POOL_TIMEOUT,
+            # sqlite3's own busy handler, in seconds; PRAGMA busy_timeout below sets the same
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}
+        }
+    
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        # Drop connections the server closed (restart, failover) instead of failing a request
+        'pool_pre_ping': True
+    }
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+    finally:
+        cursor.close()
+
+def configure_engine(engine):
+    """
+    Apply the profile to a created engine: SQLite PRAGMAs on every new
+    connection, and a fresh pool in each forked worker (gunicorn --preload)
+    so processes never share a connection opened by the parent.
+    """
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _sqlite_pragmas)
+    
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+    return engine
+
+def describe_engine(engine):
+    """
+    Get the active database settings, for /stats pages and benchmarks
+    
+    Returns:
+        dict: Backend, pool status and, on SQLite, the PRAGMAs in effect
+    """
+    info = {
+        'backend': engine.dialect.name,
+        'driver': engine.driver,
+        'pool': engine.pool.status()
+    }
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            info['pragmas'] = {
+                name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+            }
+    return info
@@ -0,0 +1,239 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import db
+from app.models import DeletionJob, PlantAnalysis
+
+class DeletionQueue:
+    """
+    Background removal of deleted analyses.
+    A delete request only marks rows (deleted_at, deletion_job_id) and
+    records a DeletionJob; a worker then removes the files of a chunk of rows
+    through a thread pool, deletes those rows and commits its progress before
+    taking the next chunk. Files go before rows, so a crash never leaves a
+    file without a row pointing at it; a row whose file could not be removed
+    is kept and its job ends as failed, so recover() retries it together
+    with jobs whose worker stopped reporting progress.
+    """
+    
+    def __init__(self, app, remove_files, max_workers=1, file_workers=8, chunk_size=200, stale_after=300):
+        """
+        Args:
+            app: Flask application used to push an app context in worker threads
+            remove_files (callable): Called with (image_filename, thumbnail_filename), returns (removed, failed)
+            max_workers (int): Jobs processed at once per process
+            file_workers (int): Threads removing files per process
+            chunk_size (int): Rows deleted per transaction
+            stale_after (int): Seconds without progress after which a running job is considered abandoned
+        """
+        self.app = app
+        self.remove_files = remove_files
+        self.max_workers = max_workers
+        self.file_workers = file_workers
+        self.chunk_size = chunk_size
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._executor = None
+        self._file_executor = None
+        self._executor_pid = None
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rows_deleted': 0, 'rows_kept': 0,
+                       'files_removed': 0, 'files_failed': 0}
+    
+    def _get_executors(self):
+        # Threads do not survive a fork, so each gunicorn worker builds its own pools
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='deletion-job')
+                self._file_executor = ThreadPoolExecutor(max_workers=self.file_workers,
+                                                         thread_name_prefix='deletion-files')
+                self._executor_pid = os.getpid()
+            return self._executor, self._file_executor
+    
+    def enqueue(self, user_id, analysis_id=None):
+        """
+        Mark one analysis, or every analysis of the user, as deleted and schedule its removal
+        
+        Returns:
+            DeletionJob: The queued job, or None when nothing was left to delete
+        """
+        job = DeletionJob(user_id=user_id)
+        db.session.add(job)
+        db.session.flush()
+        
+        query = PlantAnalysis.query.filter_by(user_id=user_id, deleted_at=None)
+        if analysis_id is not None:
+            query = query.filter_by(id=analysis_id)
+        marked = query.update({'deleted_at': datetime.utcnow(), 'deletion_job_id': job.id}, synchronize_session=False)
+        if not marked:
+            db.session.rollback()
+            return None
+        
+        job.total = marked
+        db.session.commit()
+        self.submit(job.id)
+        return job
+    
+    def submit(self, job_id):
+        """Schedule a queued job on this process's worker pool"""
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._get_executors()[0].submit(self._run, job_id)
+    
+    def _claim(self, job_id):
+        now = datetime.utcnow()
+        claimed = DeletionJob.query.filter_by(id=job_id, status='queued').update({
+            'status': 'running',
+            'started_at': now,
+            'updated_at': now,
+            'attempts': DeletionJob.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+    
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return  # Already taken by another worker
+                
+                after_id, kept = 0, 0
+                while True:
+                    chunk = self._delete_chunk(job_id, after_id)
+                    if chunk is None:
+                        break
+                    after_id, chunk_kept = chunk
+                    kept += chunk_kept
+                
+                if kept:
+                    # The rows stay marked for this job, so recover() picks the job up again
+                    DeletionJob.query.filter_by(id=job_id).update({
+                        'status': 'failed',
+                        'error': f"{kept} analisis belum dihapus karena file-nya gagal dihapus",
+                        'finished_at': datetime.utcnow()
+                    }, synchronize_session=False)
+                    db.session.commit()
+                    with self._lock:
+                        self._stats['failed'] += 1
+                    return
+                
+                DeletionJob.query.filter_by(id=job_id).update({
+                    'status': 'done',
+                    'error': None,
+                    'finished_at': datetime.utcnow()
+                }, synchronize_session=False)
+                db.session.commit()
+                with self._lock:
+                    self._stats['completed'] += 1
+            
+            except Exception as e:
+                print(f"Deletion job {job_id} failed: {e}")
+                traceback.print_exc()
+                db.session.rollback()
+                try:
+                    # Marked rows stay hidden; recover() or a new delete request retries them
+                    DeletionJob.query.filter_by(id=job_id).update({
+                        'status': 'failed',
+                        'error': str(e),
+                        'finished_at': datetime.utcnow()
+                    }, synchronize_session=False)
+                    db.session.commit()
+                except Exception as update_error:
+                    db.session.rollback()
+                    print(f"Could not mark deletion job {job_id} as failed: {update_error}")
+                with self._lock:
+                    self._stats['failed'] += 1
+            finally:
+                db.session.remove()
+    
+    def _delete_chunk(self, job_id, after_id=0):
+        """
+        Remove the files and rows of the next chunk after `after_id`
+        
+        Rows whose files could not all be removed are kept, so the files are
+        tried again on the job's next attempt instead of being orphaned.
+        
+        Returns:
+            tuple: (last row id of the chunk, rows kept), or None when the job has no rows left
+        """
+        rows = db.session.query(
+            PlantAnalysis.id, PlantAnalysis.image_filename, PlantAnalysis.thumbnail_filename
+        ).filter(
+            PlantAnalysis.deletion_job_id == job_id, PlantAnalysis.id > after_id
+        ).order_by(PlantAnalysis.id).limit(self.chunk_size).all()
+        db.session.commit()  # End the read before the slow file removals
+        if not rows:
+            return None
+        
+        file_executor = self._get_executors()[1]
+        results = list(file_executor.map(lambda row: self.remove_files(row.image_filename, row.thumbnail_filename), rows))
+        removed = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        done_ids = [row.id for row, result in zip(rows, results) if not result[1]]
+        
+        deleted = PlantAnalysis.query.filter(
+            PlantAnalysis.id.in_(done_ids), PlantAnalysis.deletion_job_id == job_id
+        ).delete(synchronize_session=False) if done_ids else 0
+        DeletionJob.query.filter_by(id=job_id).update({
+            'deleted': DeletionJob.deleted + deleted,
+            'files_removed': DeletionJob.files_removed + removed,
+            'files_failed': DeletionJob.files_failed + failed,
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        
+        with self._lock:
+            self._stats['rows_deleted'] += deleted
+            self._stats['files_removed'] += removed
+            self._stats['files_failed'] += failed
+            self._stats['rows_kept'] += len(rows) - len(done_ids)
+        return rows[-1].id, len(rows) - len(done_ids)
+    
+    def recover(self):
+        """Requeue running jobs that stopped making progress, and failed jobs with rows left; submit every queued job"""
+        try:
+            stale_before = datetime.utcnow() - timedelta(seconds=self.stale_after)
+            requeued = DeletionJob.query.filter(
+                DeletionJob.status == 'running',
+                DeletionJob.updated_at < stale_before
+            ).update({'status': 'queued'}, synchronize_session=False)
+            retried = DeletionJob.query.filter(
+                DeletionJob.status == 'failed',
+                DeletionJob.id.in_(db.session.query(PlantAnalysis.deletion_job_id).filter(
+                    PlantAnalysis.deletion_job_id.isnot(None)
+                ))
+            ).update({'status': 'queued'}, synchronize_session=False)
+            db.session.commit()
+            
+            job_ids = [job_id for (job_id,) in db.session.query(DeletionJob.id).filter_by(status='queued').order_by(
+                DeletionJob.created_at.asc()
+            ).all()]
+            for job_id in job_ids:
+                self.submit(job_id)
+            
+            if requeued or retried or job_ids:
+                print(f"Deletion queue recovered: {requeued} stale, {retried} failed, {len(job_ids)} queued")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Deletion queue recovery error: {e}")
+    
+    def get_stats(self):
+        """
+        Get worker pool counters for this process plus shared queue depth
+        
+        Returns:
+            dict: Pool sizes, local counters, queued/running jobs and rows waiting for removal
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_workers'] = self.max_workers
+        stats['file_workers'] = self.file_workers
+        stats['chunk_size'] = self.chunk_size
+        try:
+            stats['queued'] = DeletionJob.query.filter_by(status='queued').count()
+            stats['running'] = DeletionJob.query.filter_by(status='running').count()
+            stats['rows_pending'] = PlantAnalysis.query.filter(PlantAnalysis.deletion_job_id.isnot(None)).count()
+        except Exception:
+            db.session.rollback()
+        return stats
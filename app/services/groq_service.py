@@ -1,22 +1,149 @@
-from groq import Groq
+import asyncio
+import contextvars
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import httpx
+from groq import Groq, AsyncGroq, APIConnectionError
+from app.services.cache_service import DbCache
+from app.services.single_flight import SingleFlight
+from app.services.model_router import ModelRouter
+from app.services.async_utils import run_sync
+from app.services.usage_service import record_usage
+
+# Pooled HTTP transport shared by every request in a worker process
+MAX_CONNECTIONS = int(os.getenv('GROQ_MAX_CONNECTIONS', 20))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('GROQ_MAX_KEEPALIVE_CONNECTIONS', 10))
+KEEPALIVE_EXPIRY = float(os.getenv('GROQ_KEEPALIVE_EXPIRY', 60))
+CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.getenv('GROQ_READ_TIMEOUT', 120))
+# Connections per worker for the async client used by the ASGI app
+ASYNC_MAX_CONNECTIONS = int(os.getenv('GROQ_ASYNC_MAX_CONNECTIONS', 200))
+
+# Shared response cache for repeated questions
+CACHE_ENABLED = os.getenv('GROQ_CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_TTL = int(os.getenv('GROQ_CACHE_TTL', 604800))
+CACHE_MAX_ENTRIES = int(os.getenv('GROQ_CACHE_MAX_ENTRIES', 10000))
+
+def normalize_prompt(text):
+    """Normalize a question for cache lookup: case, unicode form, whitespace and trailing punctuation"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(' ?!.,;:')
+
+def is_unavailable(error):
+    """Model removed or unknown to the API"""
+    error_msg = str(error)
+    return "decommissioned" in error_msg or "not found" in error_msg
+
+def is_model_failure(error):
+    """Errors caused by the model or the upstream rather than the request, worth retrying on another model"""
+    if is_unavailable(error) or isinstance(error, APIConnectionError):  # Includes timeouts
+        return True
+    status_code = getattr(error, 'status_code', None)
+    return status_code is not None and (status_code >= 500 or status_code in (408, 429))
 
 class GroqService:
-    def __init__(self, api_key):
-        self.client = Groq(api_key=api_key)
+    def __init__(self, api_key, http_client=None, cache=None):
+        self.client = self.create_client(api_key, http_client)
+        self.http_client = http_client
+        self.cache = cache  # DbCache atau None
+        self.flight = SingleFlight('groq')
+        self.temperature = 0.7
+        self.max_tokens = 2000
+        self._lock = threading.Lock()
+        self._cache_stats = {'saved_prompt_tokens': 0, 'saved_completion_tokens': 0}
         # List model yang tersedia (diurut dari yang paling recommended)
         self.models = [
             "openai/gpt-oss-120b",
             
         ]
+        if os.getenv('GROQ_MODELS'):
+            self.models = [model.strip() for model in os.getenv('GROQ_MODELS').split(',') if model.strip()]
         self.model = self.models[0]  # Default ke model pertama
+        # Model paling cepat yang sehat dipakai lebih dulu
+        self.router = ModelRouter(self.models)
+        self._hedge_executor = None
+    
+    def create_client(self, api_key, http_client):
+        return Groq(api_key=api_key, http_client=http_client)
     
-    def get_plant_response(self, user_message, plant_topic="tanaman umum"):
+    def get_stats(self):
         """
-        Get response from Groq AI focused on plant-related topics
+        Get the active model and connection pool state of this client
+        
+        Returns:
+            dict: Last working model and open/idle connections of the shared transport
         """
-        for model in self.models:
-            try:
-                system_prompt = f"""Anda adalah asisten ahli pertanian dan botani yang berfokus pada {plant_topic}.
+        stats = {'model': self.model, 'models': self.router.order()}
+        try:
+            # httpx keeps its connection pool on the transport; no public API for it
+            connections = self.client._client._transport._pool.connections
+            stats['connections'] = len(connections)
+            stats['idle_connections'] = sum(1 for conn in connections if conn.is_idle())
+        except Exception:
+            pass
+        return stats
+    
+    def get_cache_stats(self):
+        """
+        Get response cache hit rate and tokens saved by cache hits in this worker
+        
+        Returns:
+            dict: DbCache counters plus saved prompt/completion tokens
+        """
+        if self.cache is None:
+            return {'enabled': False}
+        stats = self.cache.get_stats()
+        with self._lock:
+            stats.update(self._cache_stats)
+        stats['saved_tokens'] = stats['saved_prompt_tokens'] + stats['saved_completion_tokens']
+        stats['enabled'] = True
+        return stats
+    
+    def cache_key(self, user_message, plant_topic):
+        # Keyed on the configured model so answers stay shared while routing moves between models
+        return DbCache.make_key(
+            self.build_system_prompt(plant_topic),
+            normalize_prompt(user_message),
+            self.models[0],
+            self.temperature
+        )
+    
+    def _cache_lookup(self, cache_key):
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        record_usage('groq', cached.get('model'), cached=True)
+        with self._lock:
+            self._cache_stats['saved_prompt_tokens'] += cached.get('prompt_tokens') or 0
+            self._cache_stats['saved_completion_tokens'] += cached.get('completion_tokens') or 0
+        return cached['response']
+    
+    def _record_usage(self, model, usage, started, error=None):
+        """Account one upstream call with the token counts Groq reported for it"""
+        record_usage(
+            'groq', model,
+            prompt_tokens=getattr(usage, 'prompt_tokens', None),
+            completion_tokens=getattr(usage, 'completion_tokens', None),
+            latency=time.monotonic() - started,
+            error=error
+        )
+    
+    def _cache_store(self, cache_key, response, model, usage):
+        self.cache.set(cache_key, {
+            'response': response,
+            'model': model,
+            'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+            'completion_tokens': getattr(usage, 'completion_tokens', None)
+        })
+    
+    def build_system_prompt(self, plant_topic="tanaman umum"):
+        """System prompt for plant-related conversations"""
+        return f"""Anda adalah asisten ahli pertanian dan botani yang berfokus pada {plant_topic}.
 Anda memiliki pengetahuan mendalam tentang:
 - Identifikasi jenis tanaman
 - Perawatan tanaman
@@ -28,34 +155,430 @@ Anda memiliki pengetahuan mendalam tentang:
 
 Berikan jawaban yang terperinci, praktis, dan mudah dimengerti dalam Bahasa Indonesia.
 Jika ada pertanyaan di luar topik tanaman, tetap coba bantu tetapi ingatkan fokus pada tanaman."""
-                
-                message = self.client.chat.completions.create(
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": system_prompt
-                        },
-                        {
-                            "role": "user",
-                            "content": user_message
-                        }
-                    ],
+    
+    def build_messages(self, user_message, plant_topic="tanaman umum", history=None):
+        """
+        Build the chat messages for a question
+        
+        Args:
+            user_message (str): User question
+            plant_topic (str): Topic used in the system prompt
+            history (list): Earlier conversation messages placed before the question
+        """
+        return [
+            {
+                "role": "system",
+                "content": self.build_system_prompt(plant_topic)
+            },
+            *(history or []),
+            {
+                "role": "user",
+                "content": user_message
+            }
+        ]
+    
+    def get_plant_response(self, user_message, plant_topic="tanaman umum", use_cache=True, history=None):
+        """
+        Get response from Groq AI focused on plant-related topics
+        
+        Args:
+            user_message (str): User question
+            plant_topic (str): Topic used in the system prompt
+            use_cache (bool): Serve from the shared response cache; False always calls the API
+                (the fresh answer still replaces the cached one)
+            history (list): Earlier conversation messages; answers with history are never cached
+        """
+        if history:
+            return self.complete(self.build_messages(user_message, plant_topic, history))
+        
+        cache_key = self.cache_key(user_message, plant_topic) if self.cache is not None else None
+        if cache_key and use_cache:
+            cached = self._cache_lookup(cache_key)
+            if cached is not None:
+                return cached
+        
+        messages = self.build_messages(user_message, plant_topic)
+        if not use_cache:
+            return self.complete(messages, cache_key)
+        
+        # Pertanyaan identik yang datang bersamaan hanya memanggil API sekali
+        response, _ = self.flight.do(
+            cache_key or self.cache_key(user_message, plant_topic),
+            lambda: self.complete(messages, cache_key),
+            recheck=(lambda: self._cache_lookup(cache_key)) if cache_key else None
+        )
+        return response
+    
+    def complete(self, messages, cache_key=None, max_tokens=None):
+        """
+        Call the chat completion API on the fastest healthy model
+        
+        Failing models are skipped for the next one. Once the first model has
+        taken longer than its usual latency (see ModelRouter.hedge_after), the
+        same request is also sent to the next model and the first answer wins.
+        
+        Args:
+            messages (list): Chat messages
+            cache_key (str): Store the answer in the response cache under this key
+            max_tokens (int): Completion limit (defaults to self.max_tokens)
+        """
+        models = self.router.order()
+        delay = self.router.hedge_after(models[0])
+        if delay is None:
+            model, message = self._fallback(models, messages, max_tokens or self.max_tokens)
+        else:
+            model, message = self._hedged(models, messages, max_tokens or self.max_tokens, delay)
+        
+        self.model = model  # Update model yang berhasil
+        response = message.choices[0].message.content
+        if cache_key:
+            self._cache_store(cache_key, response, model, message.usage)
+        return response
+    
+    def _attempt(self, model, messages, max_tokens):
+        """One completion call on one model; its latency or failure feeds the router"""
+        started = time.monotonic()
+        try:
+            message = self.client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=0.7,
+                max_tokens=max_tokens,
+            )
+        except Exception as e:
+            self._record_usage(model, None, started, error=e)
+            if is_model_failure(e):
+                self.router.failed(model, unavailable=is_unavailable(e))
+            raise
+        self._record_usage(model, message.usage, started)
+        self.router.succeeded(model, time.monotonic() - started)
+        return model, message
+    
+    def _check_failover(self, model, error):
+        """Raise for errors another model would not fix"""
+        if not is_model_failure(error):
+            print(f"Error from Groq API: {error}")
+            raise Exception(f"Gagal mendapatkan respons dari AI: {str(error)}")
+        print(f"Model {model} tidak tersedia ({error}), mencoba model lain...")
+    
+    def _fallback(self, models, messages, max_tokens):
+        for model in models:
+            try:
+                return self._attempt(model, messages, max_tokens)
+            except Exception as e:
+                self._check_failover(model, e)
+        
+        # Jika semua model gagal
+        raise Exception("Semua model Groq tidak tersedia. Cek API key dan status layanan.")
+    
+    def _get_hedge_executor(self):
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS, thread_name_prefix='groq-hedge')
+            return self._hedge_executor
+    
+    def _hedged(self, models, messages, max_tokens, delay):
+        executor = self._get_hedge_executor()
+        # Pool threads run in a copy of the caller's context so usage stays attributed to the user
+        futures = {executor.submit(contextvars.copy_context().run, self._attempt, models[0], messages, max_tokens): 0}
+        done, _ = wait(futures, timeout=delay)
+        if not done and self.router.take_hedge():
+            futures[executor.submit(contextvars.copy_context().run, self._attempt, models[1], messages, max_tokens)] = 1
+        
+        # The slower call keeps running in the pool; its latency still reaches the router
+        remaining = set(futures)
+        while remaining:
+            done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self._check_failover(models[futures[future]], e)
+                    continue
+                if futures[future] == 1:
+                    self.router.hedge_won()
+                return result
+        
+        return self._fallback(models[len(futures):], messages, max_tokens)
+    
+    def stream_plant_response(self, user_message, plant_topic="tanaman umum", use_cache=True, history=None):
+        """
+        Stream a response from Groq AI token by token
+        
+        Yields:
+            str: Text fragments as the model generates them (a cached answer arrives as one fragment)
+        """
+        cache_key = self.cache_key(user_message, plant_topic) if self.cache is not None and not history else None
+        if cache_key and use_cache:
+            cached = self._cache_lookup(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        for model in self.router.order():
+            started = time.monotonic()
+            try:
+                stream = self.client.chat.completions.create(
+                    messages=self.build_messages(user_message, plant_topic, history),
                     model=model,
                     temperature=0.7,
-                    max_tokens=2000,
+                    max_tokens=self.max_tokens,
+                    stream=True,
                 )
-                
-                self.model = model  # Update model yang berhasil
-                return message.choices[0].message.content
-            
             except Exception as e:
-                error_msg = str(e)
-                if "decommissioned" in error_msg or "not found" in error_msg:
-                    print(f"Model {model} tidak tersedia, mencoba model lain...")
-                    continue
-                else:
-                    print(f"Error from Groq API: {e}")
-                    raise Exception(f"Gagal mendapatkan respons dari AI: {str(e)}")
+                self._record_usage(model, None, started, error=e)
+                if is_model_failure(e):
+                    self.router.failed(model, unavailable=is_unavailable(e))
+                self._check_failover(model, e)
+                continue
+            
+            self.model = model  # Update model yang berhasil
+            parts = []
+            usage = None
+            completed = False
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                    # Groq reports usage on the final chunk
+                    x_groq = getattr(chunk, 'x_groq', None)
+                    if x_groq is not None and getattr(x_groq, 'usage', None) is not None:
+                        usage = x_groq.usage
+                
+                completed = True
+                if cache_key and parts:
+                    self._cache_store(cache_key, ''.join(parts), model, usage)
+            finally:
+                # Closing the stream releases the pooled connection if the client went away
+                stream.close()
+                self._record_usage(model, usage, started, error=None if completed else 'stream aborted')
+            return
         
         # Jika semua model gagal
         raise Exception("Semua model Groq tidak tersedia. Cek API key dan status layanan.")
+    
+class AsyncGroqService(GroqService):
+    """
+    Groq client on AsyncGroq/httpx.AsyncClient for the ASGI app.
+    Awaiting a completion holds no thread; prompts, model fallback and the
+    shared response cache work as in GroqService. Cache reads and writes go
+    through the database, so they run in a worker thread (see run_sync).
+    """
+    
+    def create_client(self, api_key, http_client):
+        return AsyncGroq(api_key=api_key, http_client=http_client)
+    
+    async def aclose(self):
+        await self.client.close()
+    
+    async def get_plant_response(self, user_message, plant_topic="tanaman umum", use_cache=True, history=None):
+        """Async version of GroqService.get_plant_response"""
+        if history:
+            return await self.complete(self.build_messages(user_message, plant_topic, history))
+        
+        cache_key = self.cache_key(user_message, plant_topic) if self.cache is not None else None
+        if cache_key and use_cache:
+            cached = await run_sync(self._cache_lookup, cache_key)
+            if cached is not None:
+                return cached
+        
+        messages = self.build_messages(user_message, plant_topic)
+        if not use_cache:
+            return await self.complete(messages, cache_key)
+        
+        # Identical questions arriving together share one API call, as in the sync path
+        response, _ = await self.flight.ado(
+            cache_key or self.cache_key(user_message, plant_topic),
+            lambda: self.complete(messages, cache_key),
+            recheck=(lambda: run_sync(self._cache_lookup, cache_key)) if cache_key else None
+        )
+        return response
+    
+    async def complete(self, messages, cache_key=None, max_tokens=None):
+        """Async version of GroqService.complete"""
+        models = self.router.order()
+        delay = self.router.hedge_after(models[0])
+        if delay is None:
+            model, message = await self._fallback(models, messages, max_tokens or self.max_tokens)
+        else:
+            model, message = await self._hedged(models, messages, max_tokens or self.max_tokens, delay)
+        
+        self.model = model
+        response = message.choices[0].message.content
+        if cache_key:
+            await run_sync(self._cache_store, cache_key, response, model, message.usage)
+        return response
+    
+    async def _attempt(self, model, messages, max_tokens):
+        started = time.monotonic()
+        try:
+            message = await self.client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=0.7,
+                max_tokens=max_tokens,
+            )
+        except asyncio.CancelledError:
+            # A hedged call that lost: how long it ran is still a lower bound on the model's latency
+            self.router.observe(model, time.monotonic() - started)
+            self._record_usage(model, None, started, error='cancelled')
+            raise
+        except Exception as e:
+            self._record_usage(model, None, started, error=e)
+            if is_model_failure(e):
+                self.router.failed(model, unavailable=is_unavailable(e))
+            raise
+        self._record_usage(model, message.usage, started)
+        self.router.succeeded(model, time.monotonic() - started)
+        return model, message
+    
+    async def _fallback(self, models, messages, max_tokens):
+        for model in models:
+            try:
+                return await self._attempt(model, messages, max_tokens)
+            except Exception as e:
+                self._check_failover(model, e)
+        
+        raise Exception("Semua model Groq tidak tersedia. Cek API key dan status layanan.")
+    
+    async def _hedged(self, models, messages, max_tokens, delay):
+        tasks = {asyncio.ensure_future(self._attempt(models[0], messages, max_tokens)): 0}
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and self.router.take_hedge():
+            tasks[asyncio.ensure_future(self._attempt(models[1], messages, max_tokens))] = 1
+        
+        remaining = set(tasks)
+        try:
+            while remaining:
+                done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self._check_failover(models[tasks[task]], e)
+                        continue
+                    if tasks[task] == 1:
+                        self.router.hedge_won()
+                    return result
+        finally:
+            # Unlike threads, the slower call can be cancelled to free its connection
+            for task in remaining:
+                task.cancel()
+        
+        return await self._fallback(models[len(tasks):], messages, max_tokens)
+    
+    async def stream_plant_response(self, user_message, plant_topic="tanaman umum", use_cache=True, history=None):
+        """Async version of GroqService.stream_plant_response"""
+        cache_key = self.cache_key(user_message, plant_topic) if self.cache is not None and not history else None
+        if cache_key and use_cache:
+            cached = await run_sync(self._cache_lookup, cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        for model in self.router.order():
+            started = time.monotonic()
+            try:
+                stream = await self.client.chat.completions.create(
+                    messages=self.build_messages(user_message, plant_topic, history),
+                    model=model,
+                    temperature=0.7,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                )
+            except Exception as e:
+                self._record_usage(model, None, started, error=e)
+                if is_model_failure(e):
+                    self.router.failed(model, unavailable=is_unavailable(e))
+                self._check_failover(model, e)
+                continue
+            
+            self.model = model
+            parts = []
+            usage = None
+            completed = False
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                    x_groq = getattr(chunk, 'x_groq', None)
+                    if x_groq is not None and getattr(x_groq, 'usage', None) is not None:
+                        usage = x_groq.usage
+                
+                completed = True
+                if cache_key and parts:
+                    await run_sync(self._cache_store, cache_key, ''.join(parts), model, usage)
+            finally:
+                await stream.close()
+                self._record_usage(model, usage, started, error=None if completed else 'stream aborted')
+            return
+        
+        raise Exception("Semua model Groq tidak tersedia. Cek API key dan status layanan.")
+
+# Shared services per (process, api_key); gunicorn workers each build their own after fork
+_services = {}
+_services_lock = threading.Lock()
+
+def get_groq_service(api_key=None):
+    """
+    Get the process-wide GroqService for an API key, creating it on first use
+    
+    Args:
+        api_key (str): Groq API key (defaults to GROQ_API_KEY)
+        
+    Returns:
+        GroqService: Shared, thread-safe service with a pooled keep-alive transport
+    """
+    api_key = api_key or os.getenv('GROQ_API_KEY')
+    key = (os.getpid(), api_key)
+    service = _services.get(key)
+    if service is not None:
+        return service
+    
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+            )
+            cache = DbCache('groq', ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES) if CACHE_ENABLED else None
+            service = GroqService(api_key=api_key, http_client=http_client, cache=cache)
+            _services[key] = service
+    return service
+
+# Async services belong to the event loop whose connection pool they use
+_async_services = {}
+
+def get_async_groq_service(api_key=None):
+    """
+    Get the AsyncGroqService for an API key in the running event loop
+    
+    Args:
+        api_key (str): Groq API key (defaults to GROQ_API_KEY)
+        
+    Returns:
+        AsyncGroqService: Service with a pooled async transport
+    """
+    api_key = api_key or os.getenv('GROQ_API_KEY')
+    key = (os.getpid(), id(asyncio.get_running_loop()), api_key)
+    service = _async_services.get(key)
+    if service is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        cache = DbCache('groq', ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES) if CACHE_ENABLED else None
+        service = AsyncGroqService(api_key=api_key, http_client=http_client, cache=cache)
+        _async_services[key] = service
+    return service
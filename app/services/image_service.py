@@ -0,0 +1,141 @@
+import io
+import os
+import threading
+from PIL import Image, ImageOps
+
+# Normalization settings for images sent to Plant.id
+NORMALIZE_ENABLED = os.getenv('IMAGE_NORMALIZE', 'true').lower() == 'true'
+MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', 1500))
+JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
+THUMBNAIL_SIZE = int(os.getenv('IMAGE_THUMBNAIL_SIZE', 240))
+
+MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp'
+}
+
+_stats_lock = threading.Lock()
+_stats = {
+    'images': 0,
+    'failed': 0,
+    'bytes_in': 0,
+    'bytes_out': 0
+}
+
+def mime_type_for(filename):
+    """Guess the MIME type of an upload from its extension"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return MIME_TYPES.get(extension, 'image/jpeg')
+
+def stream_size(stream):
+    """Return the number of bytes left in a seekable stream"""
+    start = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell() - start
+    stream.seek(start)
+    return size
+
+def normalize_image(stream, filename, max_edge=MAX_EDGE, quality=JPEG_QUALITY):
+    """
+    Downsize an uploaded image, apply its EXIF orientation, drop metadata
+    and re-encode it as JPEG
+    
+    Args:
+        stream: Seekable binary stream of the upload
+        filename (str): Original filename, used for the fallback MIME type
+        max_edge (int): Longest edge in pixels after resizing
+        quality (int): JPEG quality (1-95)
+        
+    Returns:
+        tuple: (stream, mime_type, stats) where stats holds before/after bytes and pixel sizes.
+            The original stream is returned unchanged if normalization is disabled or fails.
+    """
+    start = stream.tell()
+    original_bytes = stream_size(stream)
+    stats = {'original_bytes': original_bytes, 'normalized_bytes': original_bytes}
+    
+    if not NORMALIZE_ENABLED:
+        return stream, mime_type_for(filename), stats
+    
+    try:
+        image = Image.open(stream)
+        stats['original_size'] = image.size
+        # Let the JPEG decoder scale down while decoding instead of loading every pixel
+        image.draft('RGB', (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        
+        output = io.BytesIO()
+        # No exif argument: metadata is stripped from the re-encoded file
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+        output.seek(0)
+        
+        stats['normalized_bytes'] = output.getbuffer().nbytes
+        stats['normalized_size'] = image.size
+        _record(original_bytes, stats['normalized_bytes'])
+        print(f"Image normalized: {original_bytes} -> {stats['normalized_bytes']} bytes, "
+              f"{stats['original_size']} -> {stats['normalized_size']}")
+        return output, 'image/jpeg', stats
+    
+    except Exception as e:
+        print(f"Warning: Could not normalize image {filename}: {e}")
+        with _stats_lock:
+            _stats['failed'] += 1
+        stream.seek(start)
+        return stream, mime_type_for(filename), stats
+
+def make_thumbnail(source_path, dest_path, size=THUMBNAIL_SIZE):
+    """
+    Write a small JPEG thumbnail for the history list
+    
+    Args:
+        source_path (str): Stored upload
+        dest_path (str): Thumbnail path to write
+        size (int): Longest edge in pixels
+        
+    Returns:
+        bool: True if the thumbnail was written
+    """
+    try:
+        with Image.open(source_path) as image:
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((size, size), Image.LANCZOS)
+            image.save(dest_path, format='JPEG', quality=80, optimize=True)
+        return True
+    except Exception as e:
+        print(f"Warning: Could not create thumbnail for {source_path}: {e}")
+        return False
+
+def _record(bytes_in, bytes_out):
+    with _stats_lock:
+        _stats['images'] += 1
+        _stats['bytes_in'] += bytes_in
+        _stats['bytes_out'] += bytes_out
+
+def get_image_stats():
+    """
+    Get normalization statistics for this worker
+    
+    Returns:
+        dict: Images processed, failures and total bytes before/after
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['reduction_ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 4) if stats['bytes_in'] else None
+    stats['enabled'] = NORMALIZE_ENABLED
+    stats['max_edge'] = MAX_EDGE
+    stats['jpeg_quality'] = JPEG_QUALITY
+    return stats
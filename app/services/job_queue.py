@@ -0,0 +1,149 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import db
+from app.models import AnalysisJob
+
+class JobQueue:
+    """
+    Bounded background worker pool for analysis jobs.
+    The analysis_jobs table is the persistent queue: a job is claimed with an
+    atomic UPDATE, so several gunicorn workers can share the table and jobs
+    left behind by a crashed worker are picked up again by recover().
+    """
+    
+    def __init__(self, app, handler, max_workers=2, stale_after=300):
+        """
+        Args:
+            app: Flask application used to push an app context in worker threads
+            handler (callable): Called with the claimed AnalysisJob, returns the PlantAnalysis id
+            max_workers (int): Worker threads per process
+            stale_after (int): Seconds after which a running job is considered abandoned
+        """
+        self.app = app
+        self.handler = handler
+        self.max_workers = max_workers
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0}
+    
+    def _get_executor(self):
+        # Threads do not survive a fork, so each gunicorn worker builds its own pool
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+                self._executor_pid = os.getpid()
+            return self._executor
+    
+    def enqueue(self, user_id, image_filename, original_filename=None):
+        """
+        Persist a new job and hand it to the worker pool
+        
+        Returns:
+            AnalysisJob: The queued job
+        """
+        job = AnalysisJob(user_id=user_id, image_filename=image_filename, original_filename=original_filename)
+        db.session.add(job)
+        db.session.commit()
+        self.submit(job.id)
+        return job
+    
+    def submit(self, job_id):
+        """Schedule a queued job on this process's worker pool"""
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._get_executor().submit(self._run, job_id)
+    
+    def _claim(self, job_id):
+        claimed = AnalysisJob.query.filter_by(id=job_id, status='queued').update({
+            'status': 'running',
+            'started_at': datetime.utcnow(),
+            'attempts': AnalysisJob.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+    
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return  # Already taken by another worker
+                
+                job = db.session.get(AnalysisJob, job_id)
+                analysis_id = self.handler(job)
+                
+                AnalysisJob.query.filter_by(id=job_id).update({
+                    'status': 'done',
+                    'analysis_id': analysis_id,
+                    'error': None,
+                    'finished_at': datetime.utcnow()
+                }, synchronize_session=False)
+                db.session.commit()
+                with self._lock:
+                    self._stats['completed'] += 1
+            
+            except Exception as e:
+                print(f"Analysis job {job_id} failed: {e}")
+                traceback.print_exc()
+                db.session.rollback()
+                try:
+                    AnalysisJob.query.filter_by(id=job_id).update({
+                        'status': 'failed',
+                        'error': str(e),
+                        'finished_at': datetime.utcnow()
+                    }, synchronize_session=False)
+                    db.session.commit()
+                except Exception as update_error:
+                    db.session.rollback()
+                    print(f"Could not mark job {job_id} as failed: {update_error}")
+                with self._lock:
+                    self._stats['failed'] += 1
+            finally:
+                db.session.remove()
+    
+    def recover(self):
+        """Requeue abandoned running jobs and submit every queued job"""
+        try:
+            stale_before = datetime.utcnow() - timedelta(seconds=self.stale_after)
+            requeued = AnalysisJob.query.filter(
+                AnalysisJob.status == 'running',
+                AnalysisJob.started_at < stale_before
+            ).update({'status': 'queued'}, synchronize_session=False)
+            db.session.commit()
+            
+            job_ids = [job_id for (job_id,) in db.session.query(AnalysisJob.id).filter_by(status='queued').order_by(
+                AnalysisJob.created_at.asc()
+            ).all()]
+            for job_id in job_ids:
+                self.submit(job_id)
+            
+            if requeued or job_ids:
+                print(f"Job queue recovered: {requeued} stale, {len(job_ids)} queued")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job queue recovery error: {e}")
+    
+    def pending_count(self):
+        """Number of queued or running jobs across all workers"""
+        return AnalysisJob.query.filter(AnalysisJob.status.in_(['queued', 'running'])).count()
+    
+    def get_stats(self):
+        """
+        Get worker pool counters for this process plus shared queue depth
+        
+        Returns:
+            dict: Pool size, local counters and queued/running job counts
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_workers'] = self.max_workers
+        try:
+            stats['queued'] = AnalysisJob.query.filter_by(status='queued').count()
+            stats['running'] = AnalysisJob.query.filter_by(status='running').count()
+        except Exception:
+            db.session.rollback()
+        return stats
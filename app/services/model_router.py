@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Seconds of latency/error history kept per model; a model not used for this long is measured afresh
+WINDOW_SECONDS = float(os.getenv('GROQ_ROUTER_WINDOW', 300))
+# Latency samples a model needs before it is ranked by speed
+MIN_SAMPLES = int(os.getenv('GROQ_ROUTER_MIN_SAMPLES', 5))
+# Error rate over the window, or failures in a row, that put a model in cooldown
+MAX_ERROR_RATE = float(os.getenv('GROQ_ROUTER_MAX_ERROR_RATE', 0.5))
+MAX_CONSECUTIVE_FAILURES = int(os.getenv('GROQ_ROUTER_MAX_FAILURES', 3))
+COOLDOWN = float(os.getenv('GROQ_ROUTER_COOLDOWN', 30))
+# Decommissioned or unknown models are skipped for much longer
+UNAVAILABLE_COOLDOWN = 3600
+# Hedged requests: ask the next model too once the first is slower than this latency percentile
+HEDGE_ENABLED = os.getenv('GROQ_HEDGE_ENABLED', 'true').lower() == 'true'
+HEDGE_PERCENTILE = float(os.getenv('GROQ_HEDGE_PERCENTILE', 95))
+HEDGE_MIN_DELAY = float(os.getenv('GROQ_HEDGE_MIN_DELAY', 1.0))
+# Largest share of requests that may be hedged, so a slow upstream does not get double the load
+HEDGE_MAX_RATIO = float(os.getenv('GROQ_HEDGE_MAX_RATIO', 0.1))
+HEDGE_BURST = 10
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+class _ModelState:
+    def __init__(self):
+        self.latencies = deque()  # (time, seconds)
+        self.outcomes = deque()  # (time, ok)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0
+        self.requests = 0
+        self.errors = 0
+    
+    def expire(self, now):
+        cutoff = now - WINDOW_SECONDS
+        while self.latencies and self.latencies[0][0] < cutoff:
+            self.latencies.popleft()
+        while self.outcomes and self.outcomes[0][0] < cutoff:
+            self.outcomes.popleft()
+
+class ModelRouter:
+    """
+    Rolling latency and error statistics per Groq model.
+    order() puts healthy models first, fastest median latency first; models
+    without enough recent samples follow in configured order and models in
+    cooldown come last, so a request is still attempted when every model is
+    failing. hedge_after() gives the delay after which a second request to
+    the next model is worth sending.
+    """
+    
+    def __init__(self, models):
+        """
+        Args:
+            models (list): Model names in configured preference order
+        """
+        self.models = list(models)
+        self._lock = threading.Lock()
+        self._states = {model: _ModelState() for model in self.models}
+        self._hedge_tokens = 1.0
+        self._hedge_stats = {'sent': 0, 'won': 0, 'skipped': 0}
+    
+    def order(self):
+        """Models in the order they should be tried for the next request"""
+        now = time.monotonic()
+        ranked = []
+        with self._lock:
+            for index, model in enumerate(self.models):
+                state = self._states[model]
+                state.expire(now)
+                if state.cooldown_until > now:
+                    ranked.append((2, state.cooldown_until, index, model))
+                elif len(state.latencies) >= MIN_SAMPLES:
+                    ranked.append((0, percentile([latency for _, latency in state.latencies], 50), index, model))
+                else:
+                    ranked.append((1, 0, index, model))
+        return [model for *_, model in sorted(ranked)]
+    
+    def observe(self, model, latency):
+        """Record a latency sample without an outcome (e.g. a hedged call abandoned after `latency` seconds)"""
+        with self._lock:
+            self._states[model].latencies.append((time.monotonic(), latency))
+    
+    def succeeded(self, model, latency):
+        now = time.monotonic()
+        with self._lock:
+            state = self._states[model]
+            state.requests += 1
+            state.consecutive_failures = 0
+            state.latencies.append((now, latency))
+            state.outcomes.append((now, True))
+    
+    def failed(self, model, unavailable=False):
+        """Record a failed call; enough failures put the model in cooldown"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states[model]
+            state.requests += 1
+            state.errors += 1
+            state.consecutive_failures += 1
+            state.outcomes.append((now, False))
+            state.expire(now)
+            
+            errors = sum(1 for _, ok in state.outcomes if not ok)
+            if unavailable:
+                state.cooldown_until = now + UNAVAILABLE_COOLDOWN
+            elif (state.consecutive_failures >= MAX_CONSECUTIVE_FAILURES or
+                    (len(state.outcomes) >= MIN_SAMPLES and errors / len(state.outcomes) > MAX_ERROR_RATE)):
+                state.cooldown_until = now + COOLDOWN
+    
+    def hedge_after(self, model):
+        """
+        Seconds to wait for `model` before hedging, or None when hedging is off
+        or the model has too few recent samples. Each call is one request for
+        the hedge budget.
+        """
+        if not HEDGE_ENABLED or len(self.models) < 2:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._hedge_tokens = min(HEDGE_BURST, self._hedge_tokens + HEDGE_MAX_RATIO)
+            state = self._states[model]
+            state.expire(now)
+            if len(state.latencies) < MIN_SAMPLES:
+                return None
+            return max(HEDGE_MIN_DELAY, percentile([latency for _, latency in state.latencies], HEDGE_PERCENTILE))
+    
+    def take_hedge(self):
+        """Spend one hedge from the budget; False when too many requests were hedged recently"""
+        with self._lock:
+            if self._hedge_tokens < 1:
+                self._hedge_stats['skipped'] += 1
+                return False
+            self._hedge_tokens -= 1
+            self._hedge_stats['sent'] += 1
+            return True
+    
+    def hedge_won(self):
+        with self._lock:
+            self._hedge_stats['won'] += 1
+    
+    def get_stats(self):
+        """
+        Get per-model statistics over the rolling window
+        
+        Returns:
+            dict: Routing order, per-model latency percentiles, error rate and
+                cooldown, plus hedged request counters
+        """
+        now = time.monotonic()
+        models = {}
+        with self._lock:
+            for model, state in self._states.items():
+                state.expire(now)
+                latencies = [latency for _, latency in state.latencies]
+                errors = sum(1 for _, ok in state.outcomes if not ok)
+                models[model] = {
+                    'requests': state.requests,
+                    'errors': state.errors,
+                    'window_requests': len(state.outcomes),
+                    'window_error_rate': round(errors / len(state.outcomes), 3) if state.outcomes else 0,
+                    'p50_ms': round(percentile(latencies, 50) * 1000) if latencies else None,
+                    'p95_ms': round(percentile(latencies, 95) * 1000) if latencies else None,
+                    'p99_ms': round(percentile(latencies, 99) * 1000) if latencies else None,
+                    'healthy': state.cooldown_until <= now,
+                    'cooldown_remaining': max(0, round(state.cooldown_until - now, 1))
+                }
+            hedging = dict(self._hedge_stats, enabled=HEDGE_ENABLED, percentile=HEDGE_PERCENTILE)
+        return {'order': self.order(), 'models': models, 'hedging': hedging}
@@ -0,0 +1,129 @@
+import base64
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import event
+from app import db
+from app.models import ChatHistory, PlantAnalysis
+
+# Seconds a per-user history total is reused before it is counted again
+COUNT_CACHE_TTL = float(os.getenv('HISTORY_COUNT_CACHE_TTL', 60))
+COUNT_CACHE_MAX_ENTRIES = 10000
+MAX_PER_PAGE = 100
+
+def encode_cursor(row):
+    """Opaque cursor pointing just past a row in (created_at, id) descending order"""
+    payload = json.dumps([row.created_at.isoformat(), row.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (created_at, id) of the last row of the previous page
+    
+    Raises:
+        ValueError: The cursor was not produced by encode_cursor
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(payload)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Cursor tidak valid')
+
+def keyset_page(query, model, cursor, per_page):
+    """
+    Fetch one page of a user's rows, newest first, without OFFSET
+    
+    The (user_id, created_at, id) index lets the database seek straight to the
+    cursor position, so a page costs the same at any depth.
+    
+    Args:
+        query: Query already filtered to one user
+        model: ChatHistory or PlantAnalysis
+        cursor (str): next_cursor of the previous page, empty for the first page
+        per_page (int): Rows per page (capped at MAX_PER_PAGE)
+    
+    Returns:
+        tuple: (rows, next_cursor or None on the last page)
+    """
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(db.tuple_(model.created_at, model.id) < (created_at, row_id))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+    next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+def page_count(total, per_page):
+    return max(1, math.ceil(total / per_page)) if per_page > 0 else 1
+
+class CountCache:
+    """
+    Per-worker cache of history totals, so paging does not run COUNT(*) on
+    every request. Totals may lag by up to the TTL for rows written by other
+    workers; writes in this worker invalidate the user's entry.
+    """
+    
+    def __init__(self, ttl=COUNT_CACHE_TTL, max_entries=COUNT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0}
+    
+    def get(self, key, compute):
+        """Cached total for key, calling compute() when missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+        
+        total = compute()
+        with self._lock:
+            self._entries[key] = (total, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return total
+    
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), ttl=self.ttl)
+
+history_counts = CountCache()
+
+def count_user_rows(model, user_id):
+    """Total rows of a user (served by the user_id index), not counting rows marked deleted"""
+    def count():
+        query = db.session.query(db.func.count(model.id)).filter(model.user_id == user_id)
+        if hasattr(model, 'deleted_at'):
+            query = query.filter(model.deleted_at.is_(None))
+        return query.scalar()
+    
+    return history_counts.get((model.__tablename__, user_id), count)
+
+def invalidate_user_rows(model, user_id):
+    history_counts.invalidate((model.__tablename__, user_id))
+
+def _track_user_rows(model):
+    # Row-by-row inserts and deletes in this worker; bulk query deletes call invalidate_user_rows
+    @event.listens_for(model, 'after_insert')
+    @event.listens_for(model, 'after_delete')
+    def invalidate(mapper, connection, target):
+        invalidate_user_rows(model, target.user_id)
+
+_track_user_rows(ChatHistory)
+_track_user_rows(PlantAnalysis)
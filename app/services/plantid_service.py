@@ -1,54 +1,355 @@
 import requests
+import asyncio
 import base64
 import json
+import os
+import threading
+import time
 import urllib3
+from contextlib import ExitStack
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.services.rate_limiter import SqliteStateStore, TokenBucket, CircuitBreaker, acquire_all
+from app.services.usage_service import record_usage
 
 # Suppress SSL warnings
 urllib3.disable_warnings()
 
+# Connection pool settings (per gunicorn worker process)
+POOL_CONNECTIONS = int(os.getenv('PLANTID_POOL_CONNECTIONS', 1))
+POOL_MAXSIZE = int(os.getenv('PLANTID_POOL_MAXSIZE', 10))
+POOL_BLOCK = os.getenv('PLANTID_POOL_BLOCK', 'false').lower() == 'true'
+CONNECT_TIMEOUT = float(os.getenv('PLANTID_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.getenv('PLANTID_READ_TIMEOUT', 90))
+API_URL = os.getenv('PLANTID_API_URL', 'https://plant.id/api/v3/identification')
+# Connections per worker for the async client used by the ASGI app
+ASYNC_MAX_CONNECTIONS = int(os.getenv('PLANTID_ASYNC_MAX_CONNECTIONS', 200))
+
+# Client-side quota: requests per minute with a burst allowance, plus an optional daily quota
+RATE_LIMIT_PER_MINUTE = float(os.getenv('PLANTID_RATE_LIMIT_PER_MINUTE', 60))
+RATE_LIMIT_BURST = float(os.getenv('PLANTID_RATE_LIMIT_BURST', 10))
+DAILY_QUOTA = float(os.getenv('PLANTID_DAILY_QUOTA', 0))
+BREAKER_THRESHOLD = int(os.getenv('PLANTID_BREAKER_THRESHOLD', 3))
+BREAKER_COOLDOWN = float(os.getenv('PLANTID_BREAKER_COOLDOWN', 60))
+
+QUOTA_ERROR = (
+    "🚫 Quota API Plant.id habis atau rate limit tercapai. "
+    "Silakan tunggu beberapa saat atau upgrade paket API Anda di https://plant.id"
+)
+
+# Usage accounting: name recorded for identification calls and credits charged per successful one
+USAGE_MODEL = 'plant.id/v3'
+CREDITS_PER_IDENTIFICATION = float(os.getenv('PLANTID_CREDITS_PER_IDENTIFICATION', 1))
+
+# Raw bytes read per chunk when streaming images (must be a multiple of 3 for base64)
+STREAM_CHUNK_SIZE = int(os.getenv('PLANTID_STREAM_CHUNK_SIZE', 49152)) // 3 * 3
+
+class StreamingImagePayload:
+    """
+    JSON request body that base64-encodes image streams chunk by chunk.
+    Only one raw chunk and its encoded form are held in memory at a time,
+    and the body can be iterated again when urllib3 retries the request.
+    """
+    
+    def __init__(self, streams, fields, mime_types="image/jpeg", chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Args:
+            streams: Seekable binary stream, or a list of them for several photos of one plant
+            fields (dict): Other payload fields sent next to "images"
+            mime_types (str or list): MIME type(s) used in the data URIs
+            chunk_size (int): Raw bytes read per chunk
+        """
+        if not isinstance(streams, (list, tuple)):
+            streams = [streams]
+        if isinstance(mime_types, str):
+            mime_types = [mime_types] * len(streams)
+        
+        self.chunk_size = max(chunk_size // 3 * 3, 3)
+        self.images = []
+        for stream, mime_type in zip(streams, mime_types):
+            start = stream.tell()
+            stream.seek(0, os.SEEK_END)
+            size = stream.tell() - start
+            stream.seek(start)
+            self.images.append((stream, start, size, f'data:{mime_type};base64,'.encode('ascii')))
+        
+        self.image_size = sum(size for _, _, size, _ in self.images)
+        extra = json.dumps(fields)[1:]
+        self.suffix = ('"]' + (', ' + extra if extra != '}' else '}')).encode('utf-8')
+        self.peak_buffer_bytes = 0
+    
+    def __len__(self):
+        # The closing quote of the last image is part of the suffix
+        length = len(b'{"images": [') + len(self.suffix) - 1
+        for _, _, size, uri_prefix in self.images:
+            length += 2 + len(uri_prefix) + 4 * ((size + 2) // 3)
+        length += len(b', ') * (len(self.images) - 1)
+        return length
+    
+    def __iter__(self):
+        yield b'{"images": ['
+        for index, (stream, start, _, uri_prefix) in enumerate(self.images):
+            yield (b'"' if index == 0 else b', "') + uri_prefix
+            stream.seek(start)
+            
+            carry = b''
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                chunk = carry + chunk
+                # Short reads must not put base64 padding in the middle of the data
+                cut = len(chunk) // 3 * 3
+                carry = chunk[cut:]
+                encoded = base64.b64encode(chunk[:cut])
+                self.peak_buffer_bytes = max(self.peak_buffer_bytes, len(chunk) + len(encoded))
+                yield encoded
+            
+            if carry:
+                yield base64.b64encode(carry)
+            if index < len(self.images) - 1:
+                yield b'"'
+        yield self.suffix
+
 class PlantIdService:
-    def __init__(self, api_key):
+    def __init__(self, api_key, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 pool_block=POOL_BLOCK, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 url=API_URL, rate_limits=True):
         """
         Initialize Plant.id API client
         
         Args:
             api_key (str): Your Plant.id API key
+            pool_connections (int): Number of host pools to keep
+            pool_maxsize (int): Max keep-alive connections per host
+            pool_block (bool): Block when pool is exhausted instead of opening extra connections
+            connect_timeout (float): TCP/TLS connect timeout in seconds
+            read_timeout (float): Response read timeout in seconds
+            url (str): Identification endpoint (a local stub for offline benchmarks)
+            rate_limits (bool): Apply the shared token bucket and circuit breaker
         """
         self.api_key = api_key
-        self.url = "https://plant.id/api/v3/identification"
+        self.url = url
         self.headers = {
             "Api-Key": api_key,
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            "Connection": "keep-alive"
+        }
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.timeout = (connect_timeout, read_timeout)
+        
+        self.buckets = []
+        self.breaker = None
+        if rate_limits:
+            self._setup_limits()
+        
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._session_pid = None
+        self._request_count = 0
+        self._stream_stats = {
+            'payloads_streamed': 0,
+            'image_bytes_total': 0,
+            'payload_bytes_total': 0,
+            'peak_buffer_bytes': 0
+        }
+    
+    def _setup_limits(self):
+        """Create the shared token buckets and circuit breaker (state lives in a local SQLite file)"""
+        try:
+            store = SqliteStateStore()
+            if RATE_LIMIT_PER_MINUTE > 0:
+                self.buckets.append(TokenBucket(store, 'plantid_minute', RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BURST))
+            if DAILY_QUOTA > 0:
+                self.buckets.append(TokenBucket(store, 'plantid_daily', DAILY_QUOTA / 86400, DAILY_QUOTA))
+            self.breaker = CircuitBreaker(store, 'plantid', BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+        except Exception as e:
+            print(f"Warning: Plant.id rate limiter disabled: {e}")
+    
+    def _check_limits(self):
+        """Fail fast when the breaker is open or the local quota is used up"""
+        probe = self.breaker.allow_request() if self.breaker is not None else True
+        if not probe:
+            raise Exception(
+                "Plant.id API sedang bermasalah, permintaan dihentikan sementara. "
+                f"Coba lagi dalam {int(self.breaker.retry_after()) + 1} detik."
+            )
+        # Every bucket is checked before any is spent, so a daily rejection keeps the minute token
+        bucket = acquire_all(self.buckets)
+        if bucket is not None:
+            if self.breaker is not None:
+                # A half-open probe that will not be sent must not block the breaker for a cool-down
+                self.breaker.release_probe(probe)
+            wait = bucket.retry_after()
+            raise Exception(QUOTA_ERROR + (f" Coba lagi dalam {int(wait) + 1} detik." if wait else ""))
+    
+    def _record_outcome(self, status_code=None, error=None):
+        if self.breaker is None:
+            return
+        if error is not None or status_code == 429 or (status_code or 0) >= 500:
+            self.breaker.record_failure(str(status_code or error)[:200])
+        else:
+            self.breaker.record_success()
+    
+    def _record_usage(self, started, status_code=None, error=None):
+        ok = error is None and status_code in (200, 201)
+        record_usage(
+            'plantid', USAGE_MODEL, operation='identification',
+            credits=CREDITS_PER_IDENTIFICATION if ok else 0,
+            latency=time.monotonic() - started,
+            error=None if ok else (error or f"HTTP {status_code}")
+        )
+    
+    def get_limit_stats(self):
+        """
+        Get shared rate limiter and circuit breaker state
+        
+        Returns:
+            dict: Remaining tokens and rejections per bucket, breaker state
+        """
+        try:
+            return {
+                'buckets': {bucket.name: bucket.get_state() for bucket in self.buckets},
+                'breaker': self.breaker.get_state() if self.breaker is not None else None
+            }
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def _get_session(self):
+        """
+        Return the long-lived session, creating it on first use.
+        The session is rebuilt after a fork so gunicorn workers never share sockets.
+        """
+        pid = os.getpid()
+        if self._session is not None and self._session_pid == pid:
+            return self._session
+        
+        with self._lock:
+            if self._session is None or self._session_pid != pid:
+                # Retry strategy - don't retry on 429 (rate limit)
+                retry_strategy = Retry(
+                    total=2,
+                    backoff_factor=2,
+                    status_forcelist=[500, 502, 503, 504],  # Removed 429
+                    allowed_methods=["POST", "GET"]
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block,
+                    max_retries=retry_strategy
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(self.headers)
+                session.verify = False
+                
+                self._adapter = adapter
+                self._session = session
+                self._session_pid = pid
+                self._request_count = 0
+        return self._session
+    
+    def get_pool_stats(self):
+        """
+        Get connection pool statistics for the current worker
+        
+        Returns:
+            dict: Requests sent, new connections opened, reused connections and idle sockets
+        """
+        stats = {
+            'pid': os.getpid(),
+            'pool_maxsize': self.pool_maxsize,
+            'requests': self._request_count,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'idle_connections': 0,
+            'hosts': {}
         }
+        
+        with self._lock:
+            adapter = self._adapter
+            if adapter is None or self._session_pid != os.getpid():
+                return stats
+            pools = adapter.poolmanager.pools
+            with pools.lock:
+                host_pools = [(key, pools._container[key]) for key in pools.keys()]
+        
+        for key, pool in host_pools:
+            # The pool queue is pre-filled with None placeholders; count real sockets only
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            opened = pool.num_connections
+            stats['hosts'][f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                'requests': pool.num_requests,
+                'connections_opened': opened,
+                'idle_connections': idle
+            }
+            stats['connections_opened'] += opened
+            stats['connections_reused'] += max(pool.num_requests - opened, 0)
+            stats['idle_connections'] += idle
+        
+        return stats
     
-    def encode_image(self, image_path):
+    def get_stream_stats(self):
+        """
+        Get upload streaming statistics for the current worker
+        
+        Returns:
+            dict: Images streamed, bytes sent and the largest in-memory buffer used
+        """
+        with self._lock:
+            return dict(self._stream_stats)
+    
+    def encode_image(self, image_path, mime_type="image/jpeg"):
         """
         Encode image to base64 string
         
         Args:
             image_path (str): Path to image file
+            mime_type (str): MIME type used in the data URI
             
         Returns:
             str: Base64 encoded image with data URI prefix
         """
         with open(image_path, "rb") as image_file:
             encoded = base64.b64encode(image_file.read()).decode('utf-8')
-            return f"data:image/jpeg;base64,{encoded}"
+            return f"data:{mime_type};base64,{encoded}"
     
-    def identify_plant(self, image_path, classification_level="all", health="auto", similar_images=True):
+    def identify_plant(self, image, classification_level="all", health="auto", similar_images=True, mime_type="image/jpeg"):
         """
         Identify plant from image using Plant.id API v3
         Includes health assessment and disease detection
         
         Args:
-            image_path (str): Path to the image file
+            image (str, file-like or list): Path to the image file, or a seekable binary stream
+                which is encoded in chunks without being read into memory at once.
+                A list sends several photos of the same plant in one request.
             classification_level (str): 'all', 'genus', or 'species'
             health (str): 'all', 'auto', 'only', or 'probability'
             similar_images (bool): Include similar images in response
+            mime_type (str or list): MIME type of the image data, one per image for a list
         
         Returns:
             Dictionary with plant identification and health assessment results
         """
+        self._check_api_key()
+        
+        try:
+            result = self.request_identification(image, classification_level, health, similar_images, mime_type)
+            return self.parse_result(result)
+        
+        except requests.exceptions.RequestException as e:
+            raise self._connection_error(e)
+        except Exception as e:
+            raise self._identification_error(e)
+    
+    def _check_api_key(self):
         # Check if API key is configured
         if not self.api_key or self.api_key.startswith('your_'):
             raise Exception(
@@ -56,117 +357,150 @@ class PlantIdService:
                 "Silakan set PLANTID_API_KEY di file .env. "
                 "Dapatkan API key dari https://plant.id"
             )
+    
+    def _connection_error(self, error):
+        """Record a failed request and build the user-facing error for it"""
+        error_msg = str(error)
+        print(f"Error connecting to Plant.id API: {error}")
+        self._record_outcome(error=error)
         
-        try:
-            # Encode image
-            image_data = self.encode_image(image_path)
-            
-            # Prepare payload dengan health assessment
-            payload = {
-                "images": [image_data],
-                "similar_images": similar_images,
-                "classification_level": classification_level,
-                "health": "all"  # Request semua informasi kesehatan
-            }
-            
-            # Send request dengan retry dan error handling lebih baik
-            headers_with_ua = self.headers.copy()
-            headers_with_ua["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            headers_with_ua["Connection"] = "keep-alive"
-            
-            # Retry strategy - don't retry on 429 (rate limit)
-            from requests.adapters import HTTPAdapter
-            from urllib3.util.retry import Retry
-            
-            retry_strategy = Retry(
-                total=2,
-                backoff_factor=2,
-                status_forcelist=[500, 502, 503, 504],  # Removed 429
-                allowed_methods=["POST", "GET"]
-            )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
-            
-            session = requests.Session()
-            session.mount("https://", adapter)
-            session.mount("http://", adapter)
+        # Better error message
+        if "429" in error_msg or "too many" in error_msg.lower():
+            return Exception(QUOTA_ERROR)
+        elif "401" in error_msg or "Unauthorized" in error_msg:
+            return Exception("Plant.id API key tidak valid. Periksa kembali PLANTID_API_KEY di .env")
+        elif "Connection" in error_msg or "connect" in error_msg.lower():
+            return Exception("Gagal terhubung ke Plant.id API. Periksa koneksi internet Anda.")
+        else:
+            return Exception(f"Plant.id API error: {error_msg}")
+    
+    def _identification_error(self, error):
+        error_str = str(error)
+        print(f"Error in plant identification: {error}")
+        # Don't wrap if already a proper error message
+        if "Plant.id" in error_str or "Quota" in error_str or "API" in error_str:
+            return error
+        else:
+            return Exception(f"Gagal menganalisis tanaman: {error_str}")
+    
+    def request_identification(self, image, classification_level="all", health="auto", similar_images=True,
+                               mime_type="image/jpeg"):
+        """
+        Send an identification request and return the raw Plant.id v3 response
+        
+        Args:
+            Same as identify_plant
             
-            response = session.post(
-                self.url,
-                headers=headers_with_ua,
-                json=payload,
-                timeout=90,
-                verify=False
-            )
+        Returns:
+            dict: Decoded JSON response
+        """
+        # Prepare payload dengan health assessment
+        fields = {
+            "similar_images": similar_images,
+            "classification_level": classification_level,
+            "health": "all"  # Request semua informasi kesehatan
+        }
+        
+        images = image if isinstance(image, (list, tuple)) else [image]
+        with ExitStack() as stack:
+            # Files opened here are closed even if a later one fails to open or the limits refuse the call
+            streams = [stack.enter_context(open(item, "rb")) if isinstance(item, str) else item for item in images]
+            self._check_limits()
+            started = time.monotonic()
+            try:
+                response = self._post_image(streams, fields, mime_type)
+            except Exception as e:
+                self._record_usage(started, error=e)
+                raise
+        
+        self._record_usage(started, status_code=response.status_code)
+        self._record_outcome(status_code=response.status_code)
+        self._check_response(response.status_code, response.text)
+        return response.json()
+    
+    def _check_response(self, status_code, text):
+        """Raise the user-facing error for a non-success Plant.id response"""
+        # Check for rate limit first
+        if status_code == 429:
+            print("Rate limit exceeded (429)")
+            raise Exception(QUOTA_ERROR)
+        
+        # Check response
+        if status_code not in [200, 201]:
+            print(f"Status Code: {status_code}")
+            print(f"Response: {text}")
             
-            # Check for rate limit first
-            if response.status_code == 429:
-                print("Rate limit exceeded (429)")
-                raise Exception(
-                    "🚫 Quota API Plant.id habis atau rate limit tercapai. "
-                    "Silakan tunggu beberapa saat atau upgrade paket API Anda di https://plant.id"
-                )
+            if status_code == 401:
+                raise Exception("Plant.id API key tidak valid. Periksa kembali PLANTID_API_KEY di .env")
             
-            # Check response
-            if response.status_code not in [200, 201]:
-                print(f"Status Code: {response.status_code}")
-                print(f"Response: {response.text}")
-                
-                if response.status_code == 401:
-                    raise Exception("Plant.id API key tidak valid. Periksa kembali PLANTID_API_KEY di .env")
-                
-                raise Exception(f"Plant.id API error: {response.status_code}")
+            raise Exception(f"Plant.id API error: {status_code}")
+    
+    def parse_result(self, result):
+        """
+        Turn a raw Plant.id v3 response into the analysis result stored by the app
+        
+        Args:
+            result (dict): API response
             
-            result = response.json()
+        Returns:
+            dict: Top suggestion with confidence, details and health assessment
+        """
+        # Extract suggestions
+        suggestions = self.get_suggestions(result, top_n=1)
+        
+        if suggestions:
+            plant = suggestions[0]
+            analysis_result = {
+                'name': plant.get('name', 'Tidak diketahui'),
+                'probability': plant.get('probability', 0),
+                'confidence': plant.get('probability', 0) * 100,
+                'plant_details': plant.get('details', {})
+            }
             
-            # Extract suggestions
-            suggestions = self.get_suggestions(result, top_n=1)
+            # Extract health assessment if available
+            health_info = self.get_health_assessment(result)
+            if health_info:
+                analysis_result['health'] = health_info
             
-            if suggestions:
-                plant = suggestions[0]
-                analysis_result = {
-                    'name': plant.get('name', 'Tidak diketahui'),
-                    'probability': plant.get('probability', 0),
-                    'confidence': plant.get('probability', 0) * 100,
-                    'plant_details': plant.get('details', {})
-                }
-                
-                # Extract health assessment if available
-                health_info = self.get_health_assessment(result)
-                if health_info:
-                    analysis_result['health'] = health_info
-                
-                return analysis_result
-            else:
-                return {
-                    'name': 'Tanaman tidak dikenali',
-                    'confidence': 0,
-                    'message': 'Tidak dapat mengidentifikasi tanaman dari gambar'
-                }
+            return analysis_result
+        else:
+            return {
+                'name': 'Tanaman tidak dikenali',
+                'confidence': 0,
+                'message': 'Tidak dapat mengidentifikasi tanaman dari gambar'
+            }
+    
+    def _post_image(self, streams, fields, mime_type):
+        """
+        Stream the images as a JSON body through the shared keep-alive pool
         
-        except requests.exceptions.RequestException as e:
-            error_msg = str(e)
-            print(f"Error connecting to Plant.id API: {e}")
+        Args:
+            streams (list): Seekable binary file-like objects
+            fields (dict): Other payload fields
+            mime_type (str or list): MIME type(s) of the image data
             
-            # Better error message
-            if "429" in error_msg or "too many" in error_msg.lower():
-                raise Exception(
-                    "🚫 Quota API Plant.id habis atau rate limit tercapai. "
-                    "Silakan tunggu beberapa saat atau upgrade paket API Anda di https://plant.id"
-                )
-            elif "401" in error_msg or "Unauthorized" in error_msg:
-                raise Exception("Plant.id API key tidak valid. Periksa kembali PLANTID_API_KEY di .env")
-            elif "Connection" in error_msg:
-                raise Exception("Gagal terhubung ke Plant.id API. Periksa koneksi internet Anda.")
-            else:
-                raise Exception(f"Plant.id API error: {error_msg}")
-        except Exception as e:
-            error_str = str(e)
-            print(f"Error in plant identification: {e}")
-            # Don't wrap if already a proper error message
-            if "Plant.id" in error_str or "Quota" in error_str or "API" in error_str:
-                raise
-            else:
-                raise Exception(f"Gagal menganalisis tanaman: {error_str}")
+        Returns:
+            requests.Response: Raw API response
+        """
+        payload = StreamingImagePayload(streams, fields, mime_types=mime_type)
+        session = self._get_session()
+        with self._lock:
+            self._request_count += 1
+        
+        response = session.post(
+            self.url,
+            data=payload,
+            timeout=self.timeout
+        )
+        
+        with self._lock:
+            self._stream_stats['payloads_streamed'] += 1
+            self._stream_stats['image_bytes_total'] += payload.image_size
+            self._stream_stats['payload_bytes_total'] += len(payload)
+            self._stream_stats['peak_buffer_bytes'] = max(
+                self._stream_stats['peak_buffer_bytes'], payload.peak_buffer_bytes
+            )
+        return response
     
     def get_suggestions(self, result, top_n=5):
         """
@@ -362,3 +696,127 @@ class PlantIdService:
         
         return parsed
 
+class AsyncPlantIdService(PlantIdService):
+    """
+    Plant.id client on httpx.AsyncClient for the ASGI app.
+    A request waiting on Plant.id holds no thread, so one worker can keep
+    hundreds of identifications in flight. Payload streaming, limits and
+    response parsing are shared with PlantIdService.
+    """
+    
+    def __init__(self, api_key, max_connections=ASYNC_MAX_CONNECTIONS, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, url=API_URL, rate_limits=True):
+        """
+        Args:
+            api_key (str): Your Plant.id API key
+            max_connections (int): Max concurrent connections to Plant.id
+            connect_timeout (float): TCP/TLS connect timeout in seconds
+            read_timeout (float): Response read timeout in seconds
+            url (str): Identification endpoint
+            rate_limits (bool): Apply the shared token bucket and circuit breaker
+        """
+        super().__init__(api_key, connect_timeout=connect_timeout, read_timeout=read_timeout,
+                         url=url, rate_limits=rate_limits)
+        self.max_connections = max_connections
+        self._client = None
+    
+    def _get_client(self):
+        """Return the AsyncClient, creating it on first use inside the running event loop"""
+        if self._client is None:
+            headers = {key: value for key, value in self.headers.items() if key != "Connection"}
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                verify=False,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                transport=httpx.AsyncHTTPTransport(retries=2, verify=False)
+            )
+        return self._client
+    
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def identify_plant(self, image, classification_level="all", health="auto", similar_images=True,
+                             mime_type="image/jpeg"):
+        """Async version of PlantIdService.identify_plant"""
+        self._check_api_key()
+        
+        try:
+            result = await self.request_identification(image, classification_level, health, similar_images, mime_type)
+            return self.parse_result(result)
+        
+        except httpx.HTTPError as e:
+            raise await asyncio.to_thread(self._connection_error, e)
+        except Exception as e:
+            raise self._identification_error(e)
+    
+    async def request_identification(self, image, classification_level="all", health="auto", similar_images=True,
+                                     mime_type="image/jpeg"):
+        """Async version of PlantIdService.request_identification (image streams only)"""
+        fields = {
+            "similar_images": similar_images,
+            "classification_level": classification_level,
+            "health": "all"
+        }
+        
+        # Limiter state lives in a SQLite file; keep its lock waits off the event loop
+        await asyncio.to_thread(self._check_limits)
+        
+        streams = image if isinstance(image, (list, tuple)) else [image]
+        started = time.monotonic()
+        try:
+            response = await self._post_image(streams, fields, mime_type)
+        except Exception as e:
+            self._record_usage(started, error=e)
+            raise
+        
+        self._record_usage(started, status_code=response.status_code)
+        
+        await asyncio.to_thread(self._record_outcome, response.status_code)
+        self._check_response(response.status_code, response.text)
+        return response.json()
+    
+    async def _post_image(self, streams, fields, mime_type):
+        """Stream the images as a JSON body through the shared async connection pool"""
+        payload = StreamingImagePayload(streams, fields, mime_types=mime_type)
+        with self._lock:
+            self._request_count += 1
+        
+        async def body():
+            for chunk in payload:
+                yield chunk
+        
+        response = await self._get_client().post(
+            self.url,
+            content=body(),
+            headers={"Content-Length": str(len(payload))}
+        )
+        
+        with self._lock:
+            self._stream_stats['payloads_streamed'] += 1
+            self._stream_stats['image_bytes_total'] += payload.image_size
+            self._stream_stats['payload_bytes_total'] += len(payload)
+            self._stream_stats['peak_buffer_bytes'] = max(
+                self._stream_stats['peak_buffer_bytes'], payload.peak_buffer_bytes
+            )
+        return response
+    
+    def get_pool_stats(self):
+        """
+        Get async connection pool statistics for the current worker
+        
+        Returns:
+            dict: Requests sent, open and idle connections
+        """
+        stats = {'pid': os.getpid(), 'max_connections': self.max_connections, 'requests': self._request_count}
+        try:
+            # httpx keeps its connection pool on the transport; no public API for it
+            connections = self._client._transport._pool.connections
+            stats['connections'] = len(connections)
+            stats['idle_connections'] = sum(1 for conn in connections if conn.is_idle())
+        except Exception:
+            pass
+        return stats
@@ -0,0 +1,258 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Shared state file for every gunicorn worker on this host
+STATE_PATH = os.getenv('PLANTID_LIMITER_DB', os.path.join('instance', 'plantid_limiter.db'))
+
+class SqliteStateStore:
+    """
+    Small SQLite file holding limiter and breaker state.
+    Each operation opens its own connection and runs inside BEGIN IMMEDIATE,
+    which takes the write lock up front, so read-modify-write is atomic
+    across threads and processes.
+    """
+    
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, "
+                "granted INTEGER NOT NULL DEFAULT 0, rejected INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS circuit_breakers ("
+                "name TEXT PRIMARY KEY, state TEXT NOT NULL, failures INTEGER NOT NULL DEFAULT 0, "
+                "opened_at REAL, probe_at REAL, rejected INTEGER NOT NULL DEFAULT 0, "
+                "last_failure TEXT)"
+            )
+    
+    @contextmanager
+    def transaction(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding at most `capacity` tokens"""
+    
+    def __init__(self, store, name, rate, capacity):
+        """
+        Args:
+            store (SqliteStateStore): Shared state store
+            name (str): Bucket name
+            rate (float): Tokens added per second
+            capacity (float): Maximum burst size
+        """
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+    
+    def _refill(self, conn, now):
+        row = conn.execute(
+            "SELECT tokens, updated_at, granted, rejected FROM token_buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, self.capacity, now)
+            )
+            return self.capacity, 0, 0
+        tokens, updated_at, granted, rejected = row
+        return min(self.capacity, tokens + max(now - updated_at, 0) * self.rate), granted, rejected
+    
+    def _save(self, conn, available, now, granted, rejected):
+        conn.execute(
+            "UPDATE token_buckets SET tokens = ?, updated_at = ?, "
+            "granted = granted + ?, rejected = rejected + ? WHERE name = ?",
+            (available, now, granted, rejected, self.name)
+        )
+    
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket
+        
+        Returns:
+            bool: True if the tokens were granted
+        """
+        return acquire_all([self], tokens) is None
+    
+    def retry_after(self, tokens=1):
+        """Seconds until `tokens` tokens are available"""
+        available = self.get_state()['tokens']
+        return max((tokens - available) / self.rate, 0) if self.rate else None
+    
+    def get_state(self):
+        now = time.time()
+        with self.store.transaction() as conn:
+            available, granted, rejected = self._refill(conn, now)
+        return {
+            'tokens': round(available, 3),
+            'capacity': self.capacity,
+            'rate_per_second': self.rate,
+            'granted': granted,
+            'rejected': rejected
+        }
+
+def acquire_all(buckets, tokens=1):
+    """
+    Take tokens from every bucket, or from none of them
+    
+    All buckets are checked before any is spent, in one transaction on their
+    shared store, so a request rejected by one quota (e.g. the daily one)
+    does not use up another (e.g. the per-minute one).
+    
+    Args:
+        buckets (list): TokenBuckets sharing one SqliteStateStore
+        tokens (float): Tokens taken from each bucket
+    
+    Returns:
+        TokenBucket: The first bucket without enough tokens, or None if all were granted
+    """
+    if not buckets:
+        return None
+    now = time.time()
+    with buckets[0].store.transaction() as conn:
+        levels = [(bucket, bucket._refill(conn, now)[0]) for bucket in buckets]
+        rejected = next((bucket for bucket, available in levels if available < tokens), None)
+        for bucket, available in levels:
+            if rejected is None:
+                bucket._save(conn, available - tokens, now, 1, 0)
+            else:
+                bucket._save(conn, available, now, 0, 1 if bucket is rejected else 0)
+    return rejected
+
+class CircuitBreaker:
+    """
+    Circuit breaker: opens after `failure_threshold` consecutive failures,
+    rejects calls for `cooldown` seconds, then lets one probe request through
+    (half-open) and closes again when it succeeds.
+    """
+    
+    def __init__(self, store, name, failure_threshold=5, cooldown=60):
+        self.store = store
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+    
+    def _load(self, conn):
+        row = conn.execute(
+            "SELECT state, failures, opened_at, probe_at, rejected, last_failure FROM circuit_breakers WHERE name = ?",
+            (self.name,)
+        ).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO circuit_breakers (name, state) VALUES (?, 'closed')", (self.name,))
+            return 'closed', 0, None, None, 0, None
+        return row
+    
+    def allow_request(self):
+        """
+        Check whether a call may go upstream
+        
+        Returns:
+            False while the breaker is open (or a half-open probe is in flight),
+            True when closed, or the probe's start time (truthy) when this call
+            is the half-open probe
+        """
+        now = time.time()
+        with self.store.transaction() as conn:
+            state, _, opened_at, probe_at, _, _ = self._load(conn)
+            if state == 'closed':
+                return True
+            
+            # Open breaker: after the cool-down a single probe is allowed through.
+            # A probe that never reports back is replaced after another cool-down.
+            if (state == 'open' and now - (opened_at or 0) >= self.cooldown) or \
+                    (state == 'half_open' and now - (probe_at or 0) >= self.cooldown):
+                conn.execute(
+                    "UPDATE circuit_breakers SET state = 'half_open', probe_at = ? WHERE name = ?",
+                    (now, self.name)
+                )
+                return now
+            
+            conn.execute("UPDATE circuit_breakers SET rejected = rejected + 1 WHERE name = ?", (self.name,))
+            return False
+    
+    def record_success(self):
+        with self.store.transaction() as conn:
+            self._load(conn)
+            conn.execute(
+                "UPDATE circuit_breakers SET state = 'closed', failures = 0, opened_at = NULL, probe_at = NULL "
+                "WHERE name = ?",
+                (self.name,)
+            )
+    
+    def record_failure(self, reason=''):
+        now = time.time()
+        with self.store.transaction() as conn:
+            state, failures, _, _, _, _ = self._load(conn)
+            failures += 1
+            if state == 'half_open' or failures >= self.failure_threshold:
+                if state != 'open':
+                    print(f"Circuit breaker {self.name} opened after {failures} failures ({reason})")
+                conn.execute(
+                    "UPDATE circuit_breakers SET state = 'open', failures = ?, opened_at = ?, probe_at = NULL, "
+                    "last_failure = ? WHERE name = ?",
+                    (failures, now, reason, self.name)
+                )
+            else:
+                conn.execute(
+                    "UPDATE circuit_breakers SET failures = ?, last_failure = ? WHERE name = ?",
+                    (failures, reason, self.name)
+                )
+    
+    def release_probe(self, probe):
+        """
+        Give back a half-open probe that was allowed but never sent (e.g. the
+        local quota refused it), so the next call can probe right away instead
+        of waiting for the unreported probe to time out
+        
+        Args:
+            probe: Value returned by allow_request(); only a probe start time is released
+        """
+        if probe is True or not probe:
+            return
+        with self.store.transaction() as conn:
+            conn.execute(
+                "UPDATE circuit_breakers SET state = 'open', probe_at = NULL "
+                "WHERE name = ? AND state = 'half_open' AND probe_at = ?",
+                (self.name, probe)
+            )
+    
+    def retry_after(self):
+        """Seconds until the breaker allows a probe request"""
+        state = self.get_state()
+        if state['state'] == 'open' and state['opened_at'] is not None:
+            return max(state['opened_at'] + self.cooldown - time.time(), 0)
+        if state['state'] == 'half_open' and state['probe_at'] is not None:
+            # A probe is in flight; it is replaced if it does not report back within the cool-down
+            return max(state['probe_at'] + self.cooldown - time.time(), 0)
+        return 0
+    
+    def get_state(self):
+        with self.store.transaction() as conn:
+            state, failures, opened_at, probe_at, rejected, last_failure = self._load(conn)
+        return {
+            'state': state,
+            'failures': failures,
+            'failure_threshold': self.failure_threshold,
+            'cooldown': self.cooldown,
+            'opened_at': opened_at,
+            'probe_at': probe_at,
+            'rejected': rejected,
+            'last_failure': last_failure
+        }
@@ -0,0 +1,137 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import db
+from app.models import PlantAnalysis
+from app.services.usage_service import usage_context
+
+class RecommendationQueue:
+    """
+    Background worker pool that fills ai_recommendations for stored analyses.
+    recommendations_status is the persistent queue: a pending row is claimed
+    with an atomic UPDATE to 'generating', so several gunicorn workers can
+    share it and rows left behind by a crashed worker are picked up again by
+    recover().
+    """
+    
+    def __init__(self, app, generate, max_workers=4, stale_after=300):
+        """
+        Args:
+            app: Flask application used to push an app context in worker threads
+            generate (callable): Called with the analysis result, returns the advice text or None
+            max_workers (int): Worker threads per process
+            stale_after (int): Seconds after which a generating row is considered abandoned
+        """
+        self.app = app
+        self.generate = generate
+        self.max_workers = max_workers
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._stats = {'submitted': 0, 'ready': 0, 'failed': 0}
+    
+    def _get_executor(self):
+        # Threads do not survive a fork, so each gunicorn worker builds its own pool
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='recommendations')
+                self._executor_pid = os.getpid()
+            return self._executor
+    
+    def submit(self, analysis_id):
+        """Schedule recommendations for a pending analysis on this process's worker pool"""
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._get_executor().submit(self._run, analysis_id)
+    
+    def _claim(self, analysis_id):
+        # Analyses deleted while they waited are left to the deletion queue
+        claimed = PlantAnalysis.query.filter_by(id=analysis_id, recommendations_status='pending', deleted_at=None).update({
+            'recommendations_status': 'generating'
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+    
+    def _run(self, analysis_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(analysis_id):
+                    return  # Already taken by another worker
+                
+                analysis = db.session.get(PlantAnalysis, analysis_id)
+                advice = None
+                if analysis is not None:
+                    with usage_context(user_id=analysis.user_id):
+                        advice = self.generate(analysis.analysis_result or {})
+                status = 'ready' if advice else 'failed'
+                
+                PlantAnalysis.query.filter_by(id=analysis_id).update({
+                    'ai_recommendations': advice,
+                    'recommendations_status': status
+                }, synchronize_session=False)
+                db.session.commit()
+                with self._lock:
+                    self._stats[status] += 1
+            
+            except Exception as e:
+                print(f"Recommendations for analysis {analysis_id} failed: {e}")
+                traceback.print_exc()
+                db.session.rollback()
+                try:
+                    PlantAnalysis.query.filter_by(id=analysis_id).update({
+                        'recommendations_status': 'failed'
+                    }, synchronize_session=False)
+                    db.session.commit()
+                except Exception as update_error:
+                    db.session.rollback()
+                    print(f"Could not mark analysis {analysis_id} as failed: {update_error}")
+                with self._lock:
+                    self._stats['failed'] += 1
+            finally:
+                db.session.remove()
+    
+    def recover(self):
+        """Requeue abandoned generating rows and submit every pending one"""
+        try:
+            # Generation starts right after the row is created, so its age tells if it was abandoned
+            stale_before = datetime.utcnow() - timedelta(seconds=self.stale_after)
+            requeued = PlantAnalysis.query.filter(
+                PlantAnalysis.recommendations_status == 'generating',
+                PlantAnalysis.created_at < stale_before,
+                PlantAnalysis.deleted_at.is_(None)
+            ).update({'recommendations_status': 'pending'}, synchronize_session=False)
+            db.session.commit()
+            
+            analysis_ids = [analysis_id for (analysis_id,) in db.session.query(PlantAnalysis.id).filter_by(
+                recommendations_status='pending', deleted_at=None
+            ).order_by(PlantAnalysis.created_at.asc()).all()]
+            for analysis_id in analysis_ids:
+                self.submit(analysis_id)
+            
+            if requeued or analysis_ids:
+                print(f"Recommendation queue recovered: {requeued} stale, {len(analysis_ids)} pending")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Recommendation queue recovery error: {e}")
+    
+    def get_stats(self):
+        """
+        Get worker pool counters for this process plus shared queue depth
+        
+        Returns:
+            dict: Pool size, local counters and pending/generating row counts
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_workers'] = self.max_workers
+        try:
+            stats['pending'] = PlantAnalysis.query.filter_by(recommendations_status='pending', deleted_at=None).count()
+            stats['generating'] = PlantAnalysis.query.filter_by(
+                recommendations_status='generating', deleted_at=None
+            ).count()
+        except Exception:
+            db.session.rollback()
+        return stats
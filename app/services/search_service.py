@@ -0,0 +1,228 @@
+import html
+import re
+from sqlalchemy.exc import OperationalError
+from app import db
+
+# Highlight markers put around matches by snippet()/ts_headline(); the text is
+# HTML-escaped afterwards and the markers become <mark> tags
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+MAX_TERMS = 8
+MAX_PAGE = 50
+MAX_PER_PAGE = 50
+
+# Searchable tables: indexed columns with their rank weight (a hit in the
+# question or plant name counts more than one in a long AI answer), and the
+# extra columns returned with each result
+SOURCES = {
+    'chat': {
+        'table': 'chat_history',
+        'columns': [('user_message', 2.0), ('ai_response', 1.0), ('plant_topic', 3.0)],
+        'fields': ['plant_topic', 'user_message_excerpt'],
+        'detail_url': '/api/chat/history/{id}'
+    },
+    'analysis': {
+        'table': 'plant_analysis',
+        'columns': [('plant_name', 3.0), ('ai_recommendations', 1.0)],
+        'fields': ['plant_name', 'thumbnail_filename', 'image_filename'],
+        # Deleted analyses stay indexed until the deletion queue removes the row
+        'where': 't.deleted_at IS NULL',
+        'detail_url': '/api/plant/history/{id}'
+    }
+}
+
+# Postgres tsvector weight letters, by position in SOURCES columns sorted by weight
+PG_WEIGHTS = 'ABCD'
+
+_backend = None
+
+def search_backend():
+    """fts5, postgres, or None when the database cannot search"""
+    return _backend
+
+def setup_search(engine):
+    """
+    Create the search indexes if missing (called at startup after upgrade_schema)
+    
+    SQLite: an external-content FTS5 table per source, kept in sync by
+    insert/update/delete triggers and built from existing rows once.
+    PostgreSQL (12+): a generated, weighted tsvector column with a GIN index.
+    """
+    global _backend
+    if engine.dialect.name == 'sqlite':
+        try:
+            with engine.begin() as conn:
+                for source in SOURCES.values():
+                    _setup_fts5(conn, source)
+            _backend = 'fts5'
+        except OperationalError as e:
+            # SQLite built without FTS5
+            print(f"Full-text search disabled: {e}")
+    elif engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            for source in SOURCES.values():
+                _setup_postgres(conn, source)
+        _backend = 'postgres'
+    return _backend
+
+def _setup_fts5(conn, source):
+    table = source['table']
+    fts = f'{table}_fts'
+    columns = [name for name, _ in source['columns']]
+    exists = conn.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}
+    ).first()
+    
+    conn.execute(db.text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({', '.join(columns)}, "
+        f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    ))
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    conn.execute(db.text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {', '.join(columns)}) VALUES (new.id, {new_values}); END"
+    ))
+    conn.execute(db.text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {', '.join(columns)}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    conn.execute(db.text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {', '.join(columns)} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {', '.join(columns)}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {', '.join(columns)}) VALUES (new.id, {new_values}); END"
+    ))
+    if not exists:
+        conn.execute(db.text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        print(f"Search index: built {fts}")
+
+def _setup_postgres(conn, source):
+    table = source['table']
+    ranked = sorted(source['columns'], key=lambda column: -column[1])
+    vector = ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce({name}, '')), '{PG_WEIGHTS[min(index, 3)]}')"
+        for index, (name, _) in enumerate(ranked)
+    )
+    conn.execute(db.text(
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({vector}) STORED"
+    ))
+    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING GIN (search_vector)"))
+
+def query_terms(text):
+    """Words of a search box input; everything else (quotes, operators) is dropped"""
+    return re.findall(r'\w+', (text or '').lower())[:MAX_TERMS]
+
+def highlight(snippet):
+    """Escape a snippet and turn the highlight markers into <mark> tags"""
+    escaped = html.escape(snippet or '')
+    return escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+def _fts5_rows(source, user_id, terms, limit, offset):
+    table = source['table']
+    fts = f'{table}_fts'
+    # Every term must match; the last one also matches as a prefix (search as you type)
+    match = ' '.join(f'"{term}"' for term in terms[:-1])
+    match += f' "{terms[-1]}"' + ('*' if len(terms[-1]) >= 3 else '')
+    weights = ', '.join(str(weight) for _, weight in source['columns'])
+    fields = ', '.join(f't.{name}' for name in source['fields'])
+    return db.session.execute(db.text(
+        f"SELECT t.id, t.created_at, {fields}, -bm25({fts}, {weights}) AS score, "
+        f"snippet({fts}, -1, :start, :end, '…', 16) AS snippet "
+        f"FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+        f"WHERE {fts} MATCH :match AND t.user_id = :user_id AND {source.get('where', '1 = 1')} "
+        f"ORDER BY bm25({fts}, {weights}) LIMIT :limit OFFSET :offset"
+    ).columns(created_at=db.DateTime), {
+        'match': match.strip(), 'user_id': user_id, 'limit': limit, 'offset': offset,
+        'start': HIGHLIGHT_START, 'end': HIGHLIGHT_END
+    }).mappings().all()
+
+def _postgres_rows(source, user_id, terms, limit, offset):
+    table = source['table']
+    query = ' & '.join(terms[:-1] + [terms[-1] + (':*' if len(terms[-1]) >= 3 else '')])
+    fields = ', '.join(f't.{name}' for name in source['fields'])
+    ranked_fields = ', '.join(f'ranked.{name}' for name in source['fields'])
+    text = " || ' ' || ".join(f"coalesce(t.{name}, '')" for name, _ in source['columns'])
+    # Rank and limit first, so ts_headline only runs for the returned rows
+    return db.session.execute(db.text(
+        f"SELECT ranked.id, ranked.created_at, {ranked_fields}, ranked.score, ts_headline('simple', ranked.document, to_tsquery('simple', :query), :options) AS snippet "
+        f"FROM (SELECT t.id, t.created_at, {fields}, {text} AS document, "
+        f"ts_rank_cd(t.search_vector, to_tsquery('simple', :query)) AS score "
+        f"FROM {table} t WHERE t.user_id = :user_id AND {source.get('where', '1 = 1')} "
+        f"AND t.search_vector @@ to_tsquery('simple', :query) "
+        f"ORDER BY score DESC, t.id DESC LIMIT :limit OFFSET :offset) ranked ORDER BY ranked.score DESC, ranked.id DESC"
+    ), {
+        'query': query, 'user_id': user_id, 'limit': limit, 'offset': offset,
+        'options': f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=30, MinWords=12, MaxFragments=1'
+    }).mappings().all()
+
+def _result(kind, source, row):
+    result = {
+        'type': kind,
+        'id': row['id'],
+        'score': float(row['score']),
+        'snippet': highlight(row['snippet']),
+        'detail_url': source['detail_url'].format(id=row['id'])
+    }
+    for name in source['fields']:
+        result[name] = row[name]
+    result['created_at'] = row['created_at'].isoformat()
+    return result
+
+def clamp_page(page, per_page):
+    """Page and page size actually used for a request, within MAX_PAGE and MAX_PER_PAGE"""
+    return min(max(page, 1), MAX_PAGE), min(max(per_page, 1), MAX_PER_PAGE)
+
+def search(user_id, text, kind='all', page=1, per_page=10):
+    """
+    Ranked full-text search over one user's chats and analyses
+    
+    Args:
+        user_id (int): Owner of the rows searched
+        text (str): Search box input
+        kind (str): all, chat or analysis
+        page (int): 1-based page (at most MAX_PAGE)
+        per_page (int): Results per page (at most MAX_PER_PAGE)
+    
+    Returns:
+        tuple: (results, has_more), best match first; with kind all, scores
+            are relative to the best match of each source (1.0)
+    
+    Raises:
+        ValueError: Unknown kind or search unavailable
+    """
+    if _backend is None:
+        raise ValueError('Pencarian tidak tersedia')
+    kinds = list(SOURCES) if kind == 'all' else [kind]
+    if any(name not in SOURCES for name in kinds):
+        raise ValueError('Jenis pencarian tidak valid')
+    terms = query_terms(text)
+    if not terms:
+        return [], False
+    
+    page, per_page = clamp_page(page, per_page)
+    fetch = _fts5_rows if _backend == 'fts5' else _postgres_rows
+    
+    if len(kinds) == 1:
+        source = SOURCES[kinds[0]]
+        rows = fetch(source, user_id, terms, per_page + 1, (page - 1) * per_page)
+        results = [_result(kinds[0], source, row) for row in rows]
+        for result in results:
+            result['score'] = round(result['score'], 4)
+        return results[:per_page], len(results) > per_page
+    
+    # Across sources: top page * per_page + 1 of each, merged by score. Each
+    # index ranks against its own corpus statistics, so raw scores are not
+    # comparable; every source is scaled to its best match first
+    end = page * per_page
+    results = []
+    for name in kinds:
+        rows = [_result(name, SOURCES[name], row) for row in fetch(SOURCES[name], user_id, terms, end + 1, 0)]
+        best = max((result['score'] for result in rows), default=0)
+        for result in rows:
+            result['score'] = result['score'] / best if best > 0 else 0.0
+        results += rows
+    results.sort(key=lambda result: (result['score'], result['created_at']), reverse=True)
+    for result in results[end - per_page:end]:
+        result['score'] = round(result['score'], 4)
+    return results[end - per_page:end], len(results) > end
@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays within one worker
+    fcntl = None
+
+# Lock files shared by every gunicorn worker on this host
+LOCK_DIR = os.getenv('SINGLE_FLIGHT_LOCK_DIR', os.path.join('instance', 'single_flight'))
+# Keys are spread over a fixed set of lock files so the directory never grows
+LOCK_STRIPES = int(os.getenv('SINGLE_FLIGHT_LOCK_STRIPES', 1024))
+# Longest a caller waits for another worker's call before calling upstream itself
+LOCK_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT', 120))
+LOCK_POLL_INTERVAL = 0.05
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # False if the leader stopped without a result or an Exception
+        # (asyncio.CancelledError, KeyboardInterrupt); waiters then retry
+        self.completed = False
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent upstream calls.
+    Threads of one worker asking for the same key while a call is in flight
+    wait for it and share its result. Across workers the caller holds a file
+    lock for the key; a worker that had to wait for that lock first checks the
+    shared cache through `recheck` and only calls upstream if it is still empty.
+    """
+    
+    def __init__(self, name, lock_dir=LOCK_DIR, stripes=LOCK_STRIPES, timeout=LOCK_TIMEOUT):
+        """
+        Args:
+            name (str): Name separating the lock files of different upstreams
+            lock_dir (str): Directory holding the lock files
+            stripes (int): Number of lock files keys are hashed onto
+            timeout (float): Seconds to wait for another worker's call
+        """
+        self.name = name
+        self.stripes = stripes
+        self.timeout = timeout
+        self.lock_dir = lock_dir
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'shared': 0, 'rechecked': 0, 'retried': 0, 'lock_waits': 0, 'lock_timeouts': 0}
+        
+        if fcntl is not None:
+            try:
+                os.makedirs(lock_dir, exist_ok=True)
+            except OSError as e:
+                print(f"Warning: single-flight file locks disabled ({name}): {e}")
+                self.lock_dir = None
+    
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+    
+    def do(self, key, fn, recheck=None):
+        """
+        Run `fn` once for all concurrent callers with the same key
+        
+        Args:
+            key (str): Identity of the upstream call (e.g. its cache key)
+            fn: Callable doing the upstream call
+            recheck: Optional callable returning the shared cached result or None
+        
+        Returns:
+            tuple: (result, shared flag); a shared error is raised in every caller,
+                while a cancelled leader hands the call to one of its waiters
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        
+        if not leader:
+            call.done.wait()
+            if not call.completed:
+                # The leader was cancelled before it finished; take the call over
+                self._count('retried')
+                return self.do(key, fn, recheck)
+            self._count('shared')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        shared = False
+        try:
+            with _FileLock(self, key) as waited:
+                result = recheck() if waited and recheck is not None else None
+                if result is not None:
+                    self._count('rechecked')
+                    shared = True
+                else:
+                    self._count('calls')
+                    result = fn()
+            call.result = result
+            call.completed = True
+            return result, shared
+        except Exception as e:
+            call.error = e
+            call.completed = True
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+    
+    async def ado(self, key, fn, recheck=None):
+        """
+        Async version of do() for coroutines on the event loop
+        
+        Callers share in-flight calls with do() on the same SingleFlight.
+        Waiting for another caller or for the file lock polls with
+        asyncio.sleep instead of holding a thread.
+        
+        Args:
+            key (str): Identity of the upstream call (e.g. its cache key)
+            fn: Coroutine function doing the upstream call
+            recheck: Optional coroutine function returning the shared cached result or None
+        
+        Returns:
+            tuple: (result, shared flag); a shared error is raised in every caller,
+                while a cancelled leader hands the call to one of its waiters
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        
+        if not leader:
+            while not call.done.is_set():
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+            if not call.completed:
+                # The leader was cancelled before it finished; take the call over
+                self._count('retried')
+                return await self.ado(key, fn, recheck)
+            self._count('shared')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        shared = False
+        try:
+            async with _FileLock(self, key) as waited:
+                result = await recheck() if waited and recheck is not None else None
+                if result is not None:
+                    self._count('rechecked')
+                    shared = True
+                else:
+                    self._count('calls')
+                    result = await fn()
+            call.result = result
+            call.completed = True
+            return result, shared
+        except Exception as e:
+            call.error = e
+            call.completed = True
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+    
+    def get_stats(self):
+        """
+        Get coalescing counters for this worker
+        
+        Returns:
+            dict: Upstream calls, callers served by another thread's call or
+                by the shared cache after waiting, lock waits and timeouts
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        stats['cross_worker'] = self.lock_dir is not None and fcntl is not None
+        return stats
+
+class _FileLock:
+    """Exclusive flock on the key's stripe file; entering yields whether another worker held it"""
+    
+    def __init__(self, flight, key):
+        self.flight = flight
+        self.key = key
+        self.fd = None
+    
+    def _open(self):
+        flight = self.flight
+        if fcntl is None or flight.lock_dir is None:
+            return False
+        
+        stripe = int(hashlib.sha1(self.key.encode('utf-8')).hexdigest(), 16) % flight.stripes
+        try:
+            self.fd = os.open(os.path.join(flight.lock_dir, f'{flight.name}-{stripe}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            print(f"Single-flight lock error ({flight.name}): {e}")
+            return False
+        return True
+    
+    def _attempt(self, waited, deadline):
+        """Try the lock once; returns (finished, waited) where finished means locked or given up"""
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True, waited
+        except BlockingIOError:
+            if not waited:
+                waited = True
+                self.flight._count('lock_waits')
+            if time.monotonic() >= deadline:
+                # Give up waiting and call upstream without the lock
+                self.flight._count('lock_timeouts')
+                os.close(self.fd)
+                self.fd = None
+                return True, True
+            return False, waited
+    
+    def __enter__(self):
+        if not self._open():
+            return False
+        waited, deadline = False, time.monotonic() + self.flight.timeout
+        while True:
+            finished, waited = self._attempt(waited, deadline)
+            if finished:
+                return waited
+            time.sleep(LOCK_POLL_INTERVAL)
+    
+    async def __aenter__(self):
+        if not self._open():
+            return False
+        waited, deadline = False, time.monotonic() + self.flight.timeout
+        while True:
+            finished, waited = self._attempt(waited, deadline)
+            if finished:
+                return waited
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+    
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self.fd)
+                self.fd = None
+        return False
+    
+    async def __aexit__(self, *exc):
+        return self.__exit__(*exc)
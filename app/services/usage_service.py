@@ -0,0 +1,230 @@
+import atexit
+import contextvars
+import os
+import threading
+import traceback
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from flask import has_request_context, session
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import UsageRecord, UsageDailyAggregate
+
+ENABLED = os.getenv('USAGE_TRACKING_ENABLED', 'true').lower() == 'true'
+# Records are buffered in memory and written every FLUSH_INTERVAL seconds or once BATCH_SIZE are waiting
+FLUSH_INTERVAL = float(os.getenv('USAGE_FLUSH_INTERVAL', 2))
+BATCH_SIZE = int(os.getenv('USAGE_BATCH_SIZE', 500))
+# Records beyond this are dropped (and counted) rather than growing memory while the database is down
+QUEUE_MAX = int(os.getenv('USAGE_QUEUE_MAX', 20000))
+
+# Who a call is made for and why, for calls made outside a request (queues, CLI)
+_usage_context = contextvars.ContextVar('usage_context', default={})
+
+@contextmanager
+def usage_context(**fields):
+    """
+    Attribute upstream calls made inside the block, e.g.
+    usage_context(user_id=analysis.user_id, operation='recommendation')
+    """
+    token = _usage_context.set({**_usage_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _usage_context.reset(token)
+
+def _current_user_id():
+    # Flask-Login keeps the id in the session; reading it needs no database access
+    if not has_request_context():
+        return None
+    user_id = session.get('_user_id')
+    return int(user_id) if user_id and str(user_id).isdigit() else None
+
+class UsageRecorder:
+    """
+    Buffers usage records and writes them from a background thread.
+    Each flush inserts the records in one statement and adds their totals to
+    the daily aggregates, so recording never touches the database on the
+    request path.
+    """
+    
+    def __init__(self, app, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, max_queue=QUEUE_MAX):
+        """
+        Args:
+            app: Flask application used to push an app context in the writer thread
+            flush_interval (float): Seconds between writes
+            batch_size (int): Records written per statement; a full batch wakes the writer early
+            max_queue (int): Buffered records kept while writes are failing
+        """
+        self.app = app
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'flushes': 0, 'errors': 0}
+    
+    def record(self, service, model, operation=None, prompt_tokens=None, completion_tokens=None, credits=None,
+               latency=None, cached=False, error=None):
+        """
+        Queue one usage record; user and operation default to the current usage context or request
+        
+        Args:
+            service (str): groq or plantid
+            model (str): Model or API used
+            operation (str): What the call was for
+            prompt_tokens (int): Prompt tokens billed
+            completion_tokens (int): Completion tokens billed
+            credits (float): Plant.id credits charged
+            latency (float): Seconds spent on the upstream call
+            cached (bool): Served from a cache without an upstream call
+            error: Exception or message of a failed call
+        """
+        context = _usage_context.get()
+        row = {
+            'user_id': context['user_id'] if 'user_id' in context else _current_user_id(),
+            'service': service,
+            'model': model or 'unknown',
+            'operation': operation or context.get('operation') or 'chat',
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'credits': credits,
+            'latency_ms': int(latency * 1000) if latency is not None else None,
+            'cached': cached,
+            'status': 'error' if error is not None else 'ok',
+            'error': str(error)[:200] if error is not None else None,
+            'created_at': datetime.utcnow()
+        }
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._stats['dropped'] += 1
+                return
+            self._queue.append(row)
+            self._stats['recorded'] += 1
+            full = len(self._queue) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+    
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own writer
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='usage-writer', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+    
+    def flush(self):
+        """Write every buffered record; called by the writer thread and at exit"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    return
+                with self.app.app_context():
+                    try:
+                        self._write(batch)
+                        with self._lock:
+                            self._stats['written'] += len(batch)
+                            self._stats['flushes'] += 1
+                    except Exception as e:
+                        # Usage is best effort; a failed batch is dropped rather than retried forever
+                        db.session.rollback()
+                        print(f"Usage write error: {e}")
+                        traceback.print_exc()
+                        with self._lock:
+                            self._stats['errors'] += 1
+                            self._stats['dropped'] += len(batch)
+                        return
+                    finally:
+                        db.session.remove()
+    
+    def _write(self, batch):
+        db.session.execute(db.insert(UsageRecord), batch)
+        
+        totals = defaultdict(lambda: defaultdict(int))
+        for row in batch:
+            key = (row['created_at'].date(), row['user_id'] or 0, row['service'], row['model'])
+            total = totals[key]
+            total['requests'] += 1
+            total['errors'] += row['status'] == 'error'
+            total['cache_hits'] += bool(row['cached'])
+            total['prompt_tokens'] += row['prompt_tokens'] or 0
+            total['completion_tokens'] += row['completion_tokens'] or 0
+            total['credits'] += row['credits'] or 0
+            total['latency_ms_total'] += row['latency_ms'] or 0
+            total['latency_ms_max'] = max(total['latency_ms_max'], row['latency_ms'] or 0)
+        
+        for (day, user_id, service, model), total in totals.items():
+            self._add_to_aggregate(day, user_id, service, model, total)
+        db.session.commit()
+    
+    def _add_to_aggregate(self, day, user_id, service, model, total):
+        """Add batch totals to a daily aggregate row, creating it on first sight"""
+        def update():
+            values = {
+                getattr(UsageDailyAggregate, name): getattr(UsageDailyAggregate, name) + amount
+                for name, amount in total.items() if name != 'latency_ms_max'
+            }
+            values[UsageDailyAggregate.latency_ms_max] = db.case(
+                (UsageDailyAggregate.latency_ms_max < total['latency_ms_max'], total['latency_ms_max']),
+                else_=UsageDailyAggregate.latency_ms_max
+            )
+            return UsageDailyAggregate.query.filter_by(
+                day=day, user_id=user_id, service=service, model=model
+            ).update(values, synchronize_session=False)
+        
+        if not update():
+            try:
+                with db.session.begin_nested():
+                    db.session.add(UsageDailyAggregate(day=day, user_id=user_id, service=service, model=model,
+                                                       **total))
+            except IntegrityError:
+                # Another worker created the row first
+                update()
+    
+    def get_stats(self):
+        """
+        Get writer counters for this worker
+        
+        Returns:
+            dict: Records recorded, written and dropped, flushes, write errors and queue length
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+        stats['enabled'] = True
+        return stats
+
+_recorder = None
+
+def start_usage_recorder(app):
+    """Create the usage recorder for this app; until then record_usage() is a no-op"""
+    global _recorder
+    if ENABLED and _recorder is None:
+        _recorder = UsageRecorder(app)
+        atexit.register(_recorder.flush)
+    return _recorder
+
+def get_usage_recorder():
+    return _recorder
+
+def record_usage(service, model, **fields):
+    """Record one upstream call or cache hit (see UsageRecorder.record); never raises"""
+    if _recorder is None:
+        return
+    try:
+        _recorder.record(service, model, **fields)
+    except Exception as e:
+        print(f"Usage record error: {e}")
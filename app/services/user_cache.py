@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import event
+from app.models import User
+
+USER_CACHE_ENABLED = os.getenv('USER_CACHE_ENABLED', 'true').lower() == 'true'
+# Seconds a loaded user is reused; changes made by another worker show up after at most this long
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+
+class CachedUser(UserMixin):
+    """
+    Detached copy of the User fields requests read through current_user.
+    Code that needs to change a user loads the User row itself.
+    """
+    def __init__(self, id, username, email, created_at):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.created_at = created_at
+    
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email, user.created_at)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'created_at': self.created_at.isoformat()
+        }
+
+class UserCache:
+    """Per-worker LRU of CachedUser records by id, each kept for at most ttl seconds"""
+    
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+            return None
+    
+    def put(self, user):
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._stats['invalidations'] += 1
+    
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), ttl=self.ttl, enabled=USER_CACHE_ENABLED)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+user_cache = UserCache()
+
+def load_user(user_id):
+    """
+    Flask-Login user_loader: the cached record, or one SELECT on a miss
+    
+    Returns:
+        CachedUser: or None when the user no longer exists
+    """
+    if USER_CACHE_ENABLED:
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return cached
+    
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+    cached = CachedUser.from_user(user)
+    if USER_CACHE_ENABLED:
+        user_cache.put(cached)
+    return cached
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    # Profile changes and deletions in this worker; other workers catch up within the TTL
+    user_cache.invalidate(target.id)
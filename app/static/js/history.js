@@ -103,6 +103,50 @@ class PlanktonHistory {
                     <span class="history-item-time">${new Date(item.created_at).toLocaleString('id-ID')}</span>
                     <button class="history-item-delete" onclick="deleteChatItem(${item.id})">🗑️</button>
                 </div>
+                <div id="chatExcerpt-${item.id}">
+                    <div class="history-item-message">
+                        <div class="message-label">👤 Anda</div>
+                        <div class="message-content">
+                            ${this.escapeHtml(item.user_message_excerpt || '')}
+                        </div>
+                    </div>
+                    <div class="history-item-message">
+                        <div class="message-label">🤖 Asisten AI</div>
+                        <div class="message-content">
+                            ${this.escapeHtml(item.ai_response_excerpt || '')}
+                        </div>
+                    </div>
+                </div>
+                <div id="chatDetail-${item.id}" style="display: none;"></div>
+                <button class="page-btn" onclick="toggleChatDetail(${item.id}, this)">Lihat selengkapnya</button>
+                <div style="margin-top: 0.75rem; padding: 0.5rem; background: #f5f5f5; border: 1px solid #000; border-radius: 0.375rem; font-size: 0.8rem; color: #000;">
+                    📌 Topik: <strong>${item.plant_topic || 'Umum'}</strong>
+                </div>
+            </div>
+        `).join('');
+    }
+    
+    async toggleChatDetail(id, button) {
+        const excerpt = document.getElementById(`chatExcerpt-${id}`);
+        const container = document.getElementById(`chatDetail-${id}`);
+        
+        if (container.dataset.loaded) {
+            const hidden = container.style.display === 'none';
+            container.style.display = hidden ? '' : 'none';
+            excerpt.style.display = hidden ? 'none' : '';
+            button.textContent = hidden ? 'Tampilkan ringkas' : 'Lihat selengkapnya';
+            return;
+        }
+        
+        button.disabled = true;
+        try {
+            const response = await fetch(`/api/chat/history/${id}`);
+            if (!response.ok) {
+                throw new Error('Gagal memuat chat');
+            }
+            
+            const item = await response.json();
+            container.innerHTML = `
                 <div class="history-item-message">
                     <div class="message-label">👤 Anda</div>
                     <div class="message-content">
@@ -115,11 +159,16 @@ class PlanktonHistory {
                         ${this.parseMarkdown(item.ai_response)}
                     </div>
                 </div>
-                <div style="margin-top: 0.75rem; padding: 0.5rem; background: #f5f5f5; border: 1px solid #000; border-radius: 0.375rem; font-size: 0.8rem; color: #000;">
-                    📌 Topik: <strong>${item.plant_topic || 'Umum'}</strong>
-                </div>
-            </div>
-        `).join('');
+            `;
+            container.dataset.loaded = '1';
+            container.style.display = '';
+            excerpt.style.display = 'none';
+            button.textContent = 'Tampilkan ringkas';
+        } catch (error) {
+            alert('Error: ' + error.message);
+        } finally {
+            button.disabled = false;
+        }
     }
     
     displayAnalysisHistory(data) {
@@ -132,62 +181,47 @@ class PlanktonHistory {
         
         list.innerHTML = data.data.map(item => {
             let analysisContent = '';
+            const summary = item.summary || {};
             
-            // Parse analysis_result if it exists
-            if (item.analysis_result) {
-                const result = item.analysis_result;
-                
-                // Health status
-                if (result.health && result.health.is_healthy) {
-                    const status = result.health.is_healthy.status ? '✅ Sehat' : '⚠️ Ada masalah';
-                    analysisContent += `<div class="history-item-message">
-                        <div class="message-label">Status Kesehatan</div>
-                        <div class="message-content">${status}</div>
-                    </div>`;
-                }
-                
-                // Diseases
-                if (result.health && result.health.diseases && result.health.diseases.suggestions.length > 0) {
-                    let diseaseList = result.health.diseases.suggestions.map(disease => 
-                        `• ${disease.name} (${(disease.probability * 100).toFixed(1)}%)`
-                    ).join('<br>');
-                    analysisContent += `<div class="history-item-message">
-                        <div class="message-label">🦠 Penyakit Terdeteksi</div>
-                        <div class="message-content">${diseaseList}</div>
-                    </div>`;
-                }
-                
-                // Pests
-                if (result.health && result.health.pests && result.health.pests.suggestions.length > 0) {
-                    let pestList = result.health.pests.suggestions.map(pest => 
-                        `• ${pest.name} (${(pest.probability * 100).toFixed(1)}%)`
-                    ).join('<br>');
-                    analysisContent += `<div class="history-item-message">
-                        <div class="message-label">🐛 Hama Terdeteksi</div>
-                        <div class="message-content">${pestList}</div>
-                    </div>`;
-                }
-                
-                // Nutrient deficiency
-                if (result.health && result.health.nutrient_deficiency && result.health.nutrient_deficiency.suggestions.length > 0) {
-                    let defList = result.health.nutrient_deficiency.suggestions.map(def => 
-                        `• ${def.nutrient} (${(def.probability * 100).toFixed(1)}%)`
-                    ).join('<br>');
-                    analysisContent += `<div class="history-item-message">
-                        <div class="message-label">📊 Defisiensi Nutrisi</div>
-                        <div class="message-content">${defList}</div>
-                    </div>`;
-                }
+            // Health status
+            if (summary.is_healthy !== null && summary.is_healthy !== undefined) {
+                const status = summary.is_healthy ? '✅ Sehat' : '⚠️ Ada masalah';
+                analysisContent += `<div class="history-item-message">
+                    <div class="message-label">Status Kesehatan</div>
+                    <div class="message-content">${status}</div>
+                </div>`;
             }
             
-            // AI Recommendations
-            let recommendationsContent = '';
-            if (item.ai_recommendations) {
-                recommendationsContent = `<div class="history-item-message">
-                    <div class="message-label">💡 Rekomendasi Penanganan</div>
-                    <div class="message-content">
-                        ${this.parseMarkdown(item.ai_recommendations)}
-                    </div>
+            // Diseases
+            if (summary.diseases && summary.diseases.length > 0) {
+                let diseaseList = summary.diseases.map(disease => 
+                    `• ${this.escapeHtml(disease.name)} (${(disease.probability * 100).toFixed(1)}%)`
+                ).join('<br>');
+                analysisContent += `<div class="history-item-message">
+                    <div class="message-label">🦠 Penyakit Terdeteksi</div>
+                    <div class="message-content">${diseaseList}</div>
+                </div>`;
+            }
+            
+            // Pests
+            if (summary.pests && summary.pests.length > 0) {
+                let pestList = summary.pests.map(pest => 
+                    `• ${this.escapeHtml(pest.name)} (${(pest.probability * 100).toFixed(1)}%)`
+                ).join('<br>');
+                analysisContent += `<div class="history-item-message">
+                    <div class="message-label">🐛 Hama Terdeteksi</div>
+                    <div class="message-content">${pestList}</div>
+                </div>`;
+            }
+            
+            // Nutrient deficiency
+            if (summary.nutrient_deficiency && summary.nutrient_deficiency.length > 0) {
+                let defList = summary.nutrient_deficiency.map(def => 
+                    `• ${this.escapeHtml(def.name)} (${(def.probability * 100).toFixed(1)}%)`
+                ).join('<br>');
+                analysisContent += `<div class="history-item-message">
+                    <div class="message-label">📊 Defisiensi Nutrisi</div>
+                    <div class="message-content">${defList}</div>
                 </div>`;
             }
             
@@ -198,7 +232,7 @@ class PlanktonHistory {
                         <button class="history-item-delete" onclick="deleteAnalysisItem(${item.id})">🗑️</button>
                     </div>
                     <div style="display: flex; gap: 1rem; margin-bottom: 0.75rem; flex-wrap: wrap;">
-                        <img src="${item.image_url}" alt="Analysis" style="width: 120px; height: 120px; object-fit: cover; border-radius: 0.5rem; border: 2px solid #000;">
+                        <img src="${item.thumbnail_url || item.image_url}" alt="Analysis" loading="lazy" style="width: 120px; height: 120px; object-fit: cover; border-radius: 0.5rem; border: 2px solid #000;">
                         <div style="flex: 1; min-width: 200px;">
                             <div class="history-item-message">
                                 <div class="message-label">🌱 Tanaman Terdeteksi</div>
@@ -217,12 +251,77 @@ class PlanktonHistory {
                         </div>
                     </div>
                     ${analysisContent}
-                    ${recommendationsContent}
+                    <div id="analysisDetail-${item.id}"></div>
+                    <button class="page-btn" onclick="toggleAnalysisDetail(${item.id}, this)">Lihat detail & rekomendasi</button>
                 </div>
             `;
         }).join('');
     }
     
+    async toggleAnalysisDetail(id, button) {
+        const container = document.getElementById(`analysisDetail-${id}`);
+        
+        if (container.dataset.loaded) {
+            const hidden = container.style.display === 'none';
+            container.style.display = hidden ? '' : 'none';
+            button.textContent = hidden ? 'Sembunyikan detail' : 'Lihat detail & rekomendasi';
+            return;
+        }
+        
+        button.disabled = true;
+        try {
+            const response = await fetch(`/api/plant/history/${id}`);
+            if (!response.ok) {
+                throw new Error('Gagal memuat detail analisis');
+            }
+            
+            const item = await response.json();
+            container.innerHTML = this.renderAnalysisDetail(item);
+            container.dataset.loaded = '1';
+            button.textContent = 'Sembunyikan detail';
+        } catch (error) {
+            alert('Error: ' + error.message);
+        } finally {
+            button.disabled = false;
+        }
+    }
+    
+    renderAnalysisDetail(item) {
+        let html = '';
+        const health = (item.analysis_result && item.analysis_result.health) || {};
+        
+        // Disease descriptions and treatments
+        if (health.diseases && health.diseases.suggestions.length > 0) {
+            const details = health.diseases.suggestions
+                .filter(disease => disease.description)
+                .map(disease => `<strong>${this.escapeHtml(disease.name)}</strong>: ${this.escapeHtml(disease.description)}`)
+                .join('<br><br>');
+            if (details) {
+                html += `<div class="history-item-message">
+                    <div class="message-label">🦠 Detail Penyakit</div>
+                    <div class="message-content">${details}</div>
+                </div>`;
+            }
+        }
+        
+        // AI Recommendations
+        if (item.ai_recommendations) {
+            html += `<div class="history-item-message">
+                <div class="message-label">💡 Rekomendasi Penanganan</div>
+                <div class="message-content">
+                    ${this.parseMarkdown(item.ai_recommendations)}
+                </div>
+            </div>`;
+        } else if (['pending', 'generating'].includes(item.recommendations_status)) {
+            html += `<div class="history-item-message">
+                <div class="message-label">💡 Rekomendasi Penanganan</div>
+                <div class="message-content">Rekomendasi sedang dibuat, buka kembali sebentar lagi.</div>
+            </div>`;
+        }
+        
+        return html || '<p class="empty-state">Tidak ada detail tambahan</p>';
+    }
+    
     displayPagination(totalPages) {
         const pagination = document.getElementById('pagination');
         
@@ -336,8 +435,8 @@ class PlanktonHistory {
                 }
             });
             
-            if (response.status === 204 || response.status === 200) {
-                // Success - reload the current history
+            if (response.status === 204 || response.status === 200 || response.status === 202) {
+                // Success (202: files are removed in the background) - reload the current history
                 if (this.currentTab === 'chat-history') {
                     this.loadChatHistory();
                 } else {
@@ -501,3 +600,11 @@ function deleteChatItem(id) {
 function deleteAnalysisItem(id) {
     history.deleteAnalysisItem(id);
 }
+
+function toggleAnalysisDetail(id, button) {
+    history.toggleAnalysisDetail(id, button);
+}
+
+function toggleChatDetail(id, button) {
+    history.toggleChatDetail(id, button);
+}
@@ -9,6 +9,7 @@ class PlanktonChat {
         this.imageInput = document.getElementById('imageInput');
         this.analysisResult = document.getElementById('analysisResult');
         this.plantTopic = document.getElementById('plantTopic');
+        this.continueConversation = document.getElementById('continueConversation');
         
         this.initEventListeners();
     }
@@ -34,15 +35,11 @@ class PlanktonChat {
         this.uploadArea.addEventListener('drop', (e) => {
             e.preventDefault();
             this.uploadArea.style.backgroundColor = '';
-            if (e.dataTransfer.files.length > 0) {
-                this.analyzePlant(e.dataTransfer.files[0]);
-            }
+            this.handleFiles(e.dataTransfer.files);
         });
         
         this.imageInput.addEventListener('change', (e) => {
-            if (e.target.files.length > 0) {
-                this.analyzePlant(e.target.files[0]);
-            }
+            this.handleFiles(e.target.files);
         });
     }
     
@@ -60,6 +57,9 @@ class PlanktonChat {
         this.showLoading('Sedang berpikir...');
         this.sendBtn.disabled = true;
         
+        let botMessage = null;
+        let text = '';
+        
         try {
             const response = await fetch('/api/chat/send', {
                 method: 'POST',
@@ -68,7 +68,11 @@ class PlanktonChat {
                 },
                 body: JSON.stringify({
                     message: message,
-                    plant_topic: this.plantTopic.value
+                    plant_topic: this.plantTopic.value,
+                    stream: true,
+                    // Earlier turns only when the user continues a thread; plain
+                    // questions stay eligible for the shared response cache
+                    conversation: this.continueConversation.checked
                 })
             });
             
@@ -77,9 +81,42 @@ class PlanktonChat {
                 throw new Error(error.error || 'Gagal mengirim pesan');
             }
             
-            const data = await response.json();
+            // Server-Sent Events: render tokens as they arrive
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const raw of events) {
+                    const event = this.parseSseEvent(raw);
+                    if (!event) continue;
+                    
+                    if (event.type === 'token') {
+                        text += event.data.text;
+                        if (!botMessage) {
+                            this.hideLoading();
+                            botMessage = this.addMessage(text, 'bot');
+                        } else {
+                            this.scheduleRender(botMessage, text);
+                        }
+                    } else if (event.type === 'error') {
+                        throw new Error(event.data.error);
+                    }
+                }
+            }
+            
             this.hideLoading();
-            this.addMessage(data.ai_response, 'bot');
+            if (botMessage) {
+                this.updateMessage(botMessage, text);
+            } else {
+                this.addMessage('Maaf, tidak ada respons dari AI', 'bot');
+            }
             
         } catch (error) {
             this.hideLoading();
@@ -90,6 +127,36 @@ class PlanktonChat {
         }
     }
     
+    parseSseEvent(raw) {
+        let type = 'message';
+        let data = '';
+        raw.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                type = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        if (!data) return null;
+        return { type, data: JSON.parse(data) };
+    }
+    
+    scheduleRender(messageDiv, text) {
+        // Re-render markdown at most once per animation frame while streaming
+        this.pendingRender = { messageDiv, text };
+        if (this.renderScheduled) return;
+        this.renderScheduled = true;
+        requestAnimationFrame(() => {
+            this.renderScheduled = false;
+            this.updateMessage(this.pendingRender.messageDiv, this.pendingRender.text);
+        });
+    }
+    
+    updateMessage(messageDiv, text) {
+        messageDiv.querySelector('p').innerHTML = this.parseMarkdown(text);
+        this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+    }
+    
     showLoading(text = 'Sedang berpikir...') {
         document.getElementById('loadingText').textContent = text;
         this.loading.style.display = 'flex';
@@ -116,6 +183,8 @@ class PlanktonChat {
         
         // Scroll to bottom
         this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+        
+        return messageDiv;
     }
     
     parseMarkdown(text) {
@@ -231,6 +300,77 @@ class PlanktonChat {
         return html;
     }
     
+    handleFiles(files) {
+        if (files.length === 1) {
+            this.analyzePlant(files[0]);
+        } else if (files.length > 1) {
+            this.analyzeBatch(Array.from(files));
+        }
+    }
+    
+    async analyzeBatch(files) {
+        const images = files.filter(file => file.type.startsWith('image/'));
+        if (images.length === 0) {
+            alert('Harap pilih file gambar');
+            return;
+        }
+        
+        const formData = new FormData();
+        images.forEach(file => formData.append('images', file));
+        
+        this.showLoading(`🔍 Menganalisis ${images.length} tanaman...`);
+        
+        try {
+            const response = await fetch('/api/plant/analyze/batch?stream=1', {
+                method: 'POST',
+                body: formData
+            });
+            
+            if (!response.ok) {
+                const error = await response.json();
+                throw new Error(error.message || error.error || 'Gagal menganalisis tanaman');
+            }
+            
+            // NDJSON: one line per finished image, then a summary with the saved rows
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let done = 0;
+            
+            while (true) {
+                const { value, done: finished } = await reader.read();
+                if (finished) break;
+                buffer += decoder.decode(value, { stream: true });
+                
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const event = JSON.parse(line);
+                    if (event.event === 'item') {
+                        done++;
+                        this.showLoading(`🔍 Menganalisis tanaman... (${done}/${images.length})`);
+                    } else if (event.event === 'summary') {
+                        this.hideLoading();
+                        event.results.forEach(item => {
+                            if (item.status === 'ok') {
+                                this.displayAnalysisResult(item);
+                            } else {
+                                this.addMessage(`❌ ${item.filename}: ${item.error}`, 'bot');
+                            }
+                        });
+                    }
+                }
+            }
+            
+        } catch (error) {
+            this.addMessage(`❌ ${error.message}`, 'bot');
+        } finally {
+            this.hideLoading();
+            this.imageInput.value = '';
+        }
+    }
+    
     async analyzePlant(file) {
         if (!file.type.startsWith('image/')) {
             alert('Harap pilih file gambar');
@@ -365,9 +505,43 @@ class PlanktonChat {
         message += '\n\nKeterangan lebih lanjut tentang tanaman ini.';
         this.addMessage(message, 'bot');
         
-        // If there are health issues, get AI recommendations
-        if (data.health && (data.health.diseases?.suggestions?.length > 0 || data.health.pests?.suggestions?.length > 0)) {
+        // Recommendations are generated in the background after identification
+        if (data.recommendations_status === 'ready' && data.ai_recommendations) {
+            this.addMessage('💡 **Rekomendasi Penanganan**:\n\n' + data.ai_recommendations, 'bot');
+        } else if (['pending', 'generating'].includes(data.recommendations_status) && data.recommendations_url) {
+            this.waitForRecommendations(data);
+        } else if (data.health && (data.health.diseases?.suggestions?.length > 0 || data.health.pests?.suggestions?.length > 0)) {
+            // If there are health issues, get AI recommendations
+            this.getHealthAdvice(data.plant_name, data.health);
+        }
+    }
+    
+    async waitForRecommendations(data, interval = 1500, maxAttempts = 80) {
+        try {
+            for (let attempt = 0; attempt < maxAttempts; attempt++) {
+                await new Promise(resolve => setTimeout(resolve, interval));
+                
+                const response = await fetch(data.recommendations_url);
+                if (!response.ok) {
+                    console.error('Recommendations error:', response.status);
+                    return;
+                }
+                
+                const result = await response.json();
+                if (result.recommendations_status === 'ready' && result.ai_recommendations) {
+                    this.addMessage('💡 **Rekomendasi Penanganan**:\n\n' + result.ai_recommendations, 'bot');
+                    return;
+                }
+                if (!['pending', 'generating'].includes(result.recommendations_status)) {
+                    break;
+                }
+            }
+            
+            // Generation failed or took too long; ask for the short advice instead
             this.getHealthAdvice(data.plant_name, data.health);
+            
+        } catch (error) {
+            console.error('Error waiting for recommendations:', error);
         }
     }
     
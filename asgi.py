@@ -0,0 +1,5 @@
+from app import create_app
+from app.asgi import AsgiApp
+
+# ASGI entry point: uvicorn asgi:app --workers 4
+app = AsgiApp(create_app())
@@ -0,0 +1,154 @@
+"""
+Compare the sync WSGI app (gunicorn) with the ASGI app (uvicorn) on slow upstream calls.
+
+Both servers run one worker against a local Groq-compatible stub that answers
+after --latency-ms, and serve POST /api/chat/send with the response cache off:
+    python -m benchmarks.asgi_vs_wsgi --requests 400 --concurrency 200 --latency-ms 1000
+    python -m benchmarks.asgi_vs_wsgi --only asgi --threads 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+
+from benchmarks.plantid_replay import percentiles, format_ms
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def start_groq_stub(latency_ms):
+    """OpenAI-compatible chat completion endpoint answering after a fixed delay; tracks peak concurrency"""
+    lock = threading.Lock()
+    
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length))
+            with lock:
+                server.in_flight += 1
+                server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+            time.sleep(latency_ms / 1000)
+            with lock:
+                server.in_flight -= 1
+            body = json.dumps({
+                'id': 'bench', 'object': 'chat.completion', 'created': int(time.time()), 'model': request['model'],
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': 'Siram tanaman pagi hari.'}}],
+                'usage': {'prompt_tokens': 50, 'completion_tokens': 8, 'total_tokens': 58}
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.in_flight = 0
+    server.peak_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_app_server(mode, port, stub_port, workdir, threads):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'{mode}.db')}",
+        SECRET_KEY='benchmark',
+        GROQ_API_KEY='benchmark-key',
+        GROQ_BASE_URL=f'http://127.0.0.1:{stub_port}',
+        GROQ_CACHE_ENABLED='false',
+        SINGLE_FLIGHT_LOCK_DIR=os.path.join(workdir, 'single_flight'),
+        PLANTID_LIMITER_DB=os.path.join(workdir, 'limiter.db'),
+    )
+    if mode == 'wsgi':
+        command = ['gunicorn', 'run:app', '--workers', '1', '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', '--backlog', '2048', '--log-level', 'warning']
+    else:
+        command = ['uvicorn', 'asgi:app', '--workers', '1', '--host', '127.0.0.1', '--port', str(port),
+                   '--backlog', '2048', '--log-level', 'warning']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"{mode} server did not start")
+
+async def run_load(base_url, requests, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600) as client:
+        form = {'username': 'bench', 'email': 'bench@example.com', 'password': 'bench123', 'confirm_password': 'bench123'}
+        await client.post('/auth/register', data=form)
+        await client.post('/auth/login', data={'username': 'bench', 'password': 'bench123'})
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        samples, errors = [], 0
+        
+        async def one_call(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post('/api/chat/send', json={'message': f'Pertanyaan {i}', 'no_cache': True})
+                if response.status_code == 201:
+                    samples.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(one_call(i) for i in range(requests)))
+        return samples, errors, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=1000)
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads for the WSGI worker')
+    parser.add_argument('--only', choices=['wsgi', 'asgi'])
+    args = parser.parse_args()
+    
+    stub = start_groq_stub(args.latency_ms)
+    print(f"requests: {args.requests}, concurrency: {args.concurrency}, upstream latency: {args.latency_ms} ms, "
+          f"gunicorn threads: {args.threads}")
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ([args.only] if args.only else ['wsgi', 'asgi']):
+            port = free_port()
+            stub.peak_in_flight = 0
+            process = start_app_server(mode, port, stub.server_port, workdir, args.threads)
+            try:
+                samples, errors, elapsed = asyncio.run(run_load(f'http://127.0.0.1:{port}', args.requests, args.concurrency))
+            finally:
+                process.terminate()
+                process.wait()
+            print(f"{mode}: {len(samples) / elapsed:.1f} req/s, errors: {errors}, "
+                  f"peak upstream calls in flight: {stub.peak_in_flight}")
+            if samples:
+                print(f"  latency: {format_ms(percentiles(samples))}")
+    stub.shutdown()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Compare database profiles under concurrent writes from several worker processes.
+
+Each worker process builds the app like a gunicorn worker and runs --threads
+threads that repeat the chat write path (insert a ChatHistory row, commit,
+read the user's latest rows). Modes:
+    legacy    SQLite with the old defaults (rollback journal, synchronous=FULL, 5 s busy timeout)
+    wal       SQLite with the WAL profile from app/services/database.py
+    postgres  PostgreSQL at --postgres-url (use a scratch database; rows are left behind)
+    
+    python -m benchmarks.db_write_concurrency --workers 4 --threads 8 --writes 200
+    python -m benchmarks.db_write_concurrency --only wal postgres --postgres-url postgresql://localhost/plankton_bench
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.plantid_replay import percentiles, format_ms
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+LEGACY_SQLITE = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT_MS': '5000',
+    'SQLITE_MMAP_SIZE': '0',
+    'SQLITE_CACHE_SIZE_KB': '2000'
+}
+
+def run_worker(threads, writes, user_id):
+    """Body of one worker process; prints its samples as JSON"""
+    from app import create_app, db
+    from app.models import ChatHistory
+    
+    app = create_app()
+    samples, errors = [], []
+    lock = threading.Lock()
+    
+    def writer(thread_index):
+        with app.app_context():
+            for i in range(writes):
+                started = time.perf_counter()
+                try:
+                    db.session.add(ChatHistory(user_id=user_id, user_message=f'Pertanyaan {os.getpid()}-{thread_index}-{i}',
+                                               ai_response='Siram tanaman pagi hari. ' * 20, plant_topic='tanaman umum'))
+                    db.session.commit()
+                    ChatHistory.query.filter_by(user_id=user_id).order_by(
+                        ChatHistory.created_at.desc(), ChatHistory.id.desc()
+                    ).limit(20).all()
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        samples.append(elapsed)
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(str(e).splitlines()[0][:120])
+                finally:
+                    db.session.remove()
+    
+    pool = [threading.Thread(target=writer, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    print(json.dumps({'samples': samples, 'errors': errors}))
+
+def prepare(env):
+    """Create the schema and a benchmark user once, before the workers start"""
+    code = (
+        "import uuid\n"
+        "from app import create_app, db\n"
+        "from app.models import User\n"
+        "app = create_app()\n"
+        "with app.app_context():\n"
+        "    name = 'bench-' + uuid.uuid4().hex[:8]\n"
+        "    user = User(username=name, email=name + '@example.com')\n"
+        "    user.set_password('bench123')\n"
+        "    db.session.add(user)\n"
+        "    db.session.commit()\n"
+        "    print(user.id)\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT, check=True, capture_output=True, text=True)
+    return int(output.stdout.strip().splitlines()[-1])
+
+def run_mode(mode, args, workdir):
+    env = dict(
+        os.environ,
+        SECRET_KEY='benchmark',
+        USAGE_TRACKING_ENABLED='false',
+        SINGLE_FLIGHT_LOCK_DIR=os.path.join(workdir, 'single_flight'),
+        PLANTID_LIMITER_DB=os.path.join(workdir, 'limiter.db')
+    )
+    if mode == 'postgres':
+        env['DATABASE_URL'] = args.postgres_url
+    else:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, f'{mode}.db')}"
+        if mode == 'legacy':
+            env.update(LEGACY_SQLITE)
+    
+    user_id = prepare(env)
+    command = [sys.executable, '-m', 'benchmarks.db_write_concurrency', '--worker',
+               '--threads', str(args.threads), '--writes', str(args.writes), '--user-id', str(user_id)]
+    started = time.perf_counter()
+    processes = [subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+                 for _ in range(args.workers)]
+    samples, errors = [], []
+    for process in processes:
+        output, _ = process.communicate()
+        result = json.loads(output.strip().splitlines()[-1])
+        samples += result['samples']
+        errors += result['errors']
+    elapsed = time.perf_counter() - started
+    
+    print(f"{mode}: {len(samples)} writes in {elapsed:.2f} s ({len(samples) / elapsed:.0f}/s), {len(errors)} errors")
+    if samples:
+        print(f"  latency: {format_ms(percentiles(samples))}")
+    for message in sorted(set(errors))[:3]:
+        print(f"  error: {message} (x{errors.count(message)})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes, like gunicorn -w')
+    parser.add_argument('--threads', type=int, default=8, help='Writer threads per worker')
+    parser.add_argument('--writes', type=int, default=200, help='Writes per thread')
+    parser.add_argument('--only', nargs='+', choices=['legacy', 'wal', 'postgres'])
+    parser.add_argument('--postgres-url', default=os.getenv('BENCH_POSTGRES_URL'))
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--user-id', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        run_worker(args.threads, args.writes, args.user_id)
+        return
+    
+    modes = args.only or ['legacy', 'wal'] + (['postgres'] if args.postgres_url else [])
+    if 'postgres' in modes and not args.postgres_url:
+        raise SystemExit('postgres mode needs --postgres-url or BENCH_POSTGRES_URL')
+    print(f"workers: {args.workers}, threads per worker: {args.threads}, writes per thread: {args.writes}")
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in modes:
+            run_mode(mode, args, workdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare OFFSET paging with cursor (keyset) paging on a large chat history.
+
+Seeds a temporary SQLite database with --rows chat rows for one user (plus
+other users' rows), then times GET /api/chat/history at several depths in
+both modes through the Flask test client:
+    python -m benchmarks.history_pagination --rows 100000 --per-page 20
+    python -m benchmarks.history_pagination --depths 1 100 1000 4000 --repeat 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.plantid_replay import percentiles, format_ms
+
+def seed(db, ChatHistory, User, rows, other_users):
+    """Bulk-insert rows for user 1 and a tenth as many for each other user, interleaved in time"""
+    users = [User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(other_users + 1)]
+    for user in users:
+        user.set_password('bench123')
+    db.session.add_all(users)
+    db.session.commit()
+    
+    started = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for i in range(rows):
+        created_at = started + timedelta(seconds=i * 60)
+        batch.append({'user_id': users[0].id, 'user_message': f'Pertanyaan {i}', 'ai_response': 'Siram tanaman pagi hari. ' * 20,
+                      'plant_topic': 'tanaman umum', 'created_at': created_at, 'updated_at': created_at})
+        if i % 10 == 0:
+            for user in users[1:]:
+                batch.append({'user_id': user.id, 'user_message': f'Pertanyaan {i}', 'ai_response': 'Pupuk sebulan sekali.',
+                              'plant_topic': 'tanaman umum', 'created_at': created_at, 'updated_at': created_at})
+        if len(batch) >= 5000:
+            db.session.execute(db.insert(ChatHistory), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(ChatHistory), batch)
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    return users[0].id
+
+def time_get(client, url, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit(f"GET {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+    return percentiles(samples), response.get_json()
+
+def cursor_at(client, page, per_page):
+    """Walk next_cursor from the first page to reach the cursor of a page (not timed)"""
+    cursor = ''
+    for _ in range(page - 1):
+        cursor = client.get(f'/api/chat/history?cursor={cursor}&per_page={per_page}').get_json()['next_cursor']
+        if cursor is None:
+            break
+    return cursor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--other-users', type=int, default=5)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 50, 500, 2500, 4900],
+                        help='Page numbers to time')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'history.db')}",
+            SECRET_KEY='benchmark',
+            USAGE_TRACKING_ENABLED='false',
+            SINGLE_FLIGHT_LOCK_DIR=os.path.join(workdir, 'single_flight'),
+            PLANTID_LIMITER_DB=os.path.join(workdir, 'limiter.db')
+        )
+        from app import create_app, db
+        from app.models import ChatHistory, User
+        
+        app = create_app()
+        with app.app_context():
+            started = time.perf_counter()
+            user_id = seed(db, ChatHistory, User, args.rows, args.other_users)
+            print(f"seeded {args.rows} rows (+{args.other_users} other users) in {time.perf_counter() - started:.1f} s")
+            plan = db.session.execute(db.text(
+                'EXPLAIN QUERY PLAN SELECT id FROM chat_history WHERE user_id = :user_id '
+                'AND (created_at, id) < (:created_at, 0) ORDER BY created_at DESC, id DESC LIMIT 21'
+            ), {'user_id': user_id, 'created_at': datetime.utcnow()}).fetchall()
+            print('cursor query plan:', '; '.join(row[-1] for row in plan))
+        
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        
+        pages = -(-args.rows // args.per_page)
+        for page in args.depths:
+            if page > pages:
+                print(f"page {page}: skipped, only {pages} pages")
+                continue
+            offset, offset_body = time_get(client, f'/api/chat/history?page={page}&per_page={args.per_page}', args.repeat)
+            cursor = cursor_at(client, page, args.per_page)
+            keyset, keyset_body = time_get(client, f'/api/chat/history?cursor={cursor}&per_page={args.per_page}',
+                                           args.repeat)
+            same = [row['id'] for row in offset_body['data']] == [row['id'] for row in keyset_body['data']]
+            print(f"page {page} (offset {(page - 1) * args.per_page}){'' if same else ' [ROWS DIFFER]'}")
+            print(f"  offset: {format_ms(offset)}")
+            print(f"  cursor: {format_ms(keyset)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Record and replay Plant.id v3 responses to benchmark PlantIdService offline.
+
+Record real responses (needs PLANTID_API_KEY and network):
+    python -m benchmarks.plantid_replay record photo1.jpg photo2.jpg
+
+Replay them through a local stub server and benchmark the full
+identify_plant pipeline (encode, request, parse) plus parsing alone:
+    python -m benchmarks.plantid_replay bench --requests 500 --concurrency 8
+    python -m benchmarks.plantid_replay bench --image photo1.jpg --latency-ms 50
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.plantid_service import PlantIdService
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'plantid')
+
+def load_fixtures(directory=FIXTURE_DIR):
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'rb') as fixture_file:
+            fixtures.append(fixture_file.read())
+    if not fixtures:
+        raise SystemExit(f"No fixtures in {directory}, record some first")
+    return fixtures
+
+def start_stub_server(fixtures, latency_ms=0):
+    """Serve recorded responses round-robin on a random local port"""
+    counter = {'next': 0}
+    lock = threading.Lock()
+    
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length)
+            if not self.headers.get('Api-Key') or not body.startswith(b'{"images": ['):
+                self.send_response(400)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            
+            with lock:
+                fixture = fixtures[counter['next'] % len(fixtures)]
+                counter['next'] += 1
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(fixture)))
+            self.end_headers()
+            self.wfile.write(fixture)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def sample_image(path=None):
+    """Image bytes used for every request: a file, or a generated 1500px JPEG"""
+    if path:
+        with open(path, 'rb') as image_file:
+            return image_file.read()
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.effect_noise((1500, 1125), 40).convert('RGB').save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    
+    def pick(p):
+        return ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+    
+    return {
+        'mean': statistics.fmean(ordered),
+        'p50': pick(50),
+        'p90': pick(90),
+        'p99': pick(99),
+        'max': ordered[-1]
+    }
+
+def format_ms(stats):
+    return ', '.join(f"{key} {value * 1000:.2f} ms" for key, value in stats.items())
+
+def bench(args):
+    fixtures = load_fixtures(args.fixtures)
+    server = start_stub_server(fixtures, args.latency_ms)
+    url = f"http://127.0.0.1:{server.server_port}/api/v3/identification"
+    service = PlantIdService('benchmark-key', url=url, rate_limits=False, pool_maxsize=max(args.concurrency, 1))
+    image = sample_image(args.image)
+    
+    # Parsing only: the extraction helpers over every fixture
+    decoded = [json.loads(fixture) for fixture in fixtures]
+    parse_samples = []
+    for i in range(args.parse_iterations):
+        started = time.perf_counter()
+        service.parse_result(decoded[i % len(decoded)])
+        parse_samples.append(time.perf_counter() - started)
+    
+    # Full pipeline: encode + request + parse
+    def one_call(_):
+        started = time.perf_counter()
+        service.identify_plant(io.BytesIO(image))
+        return time.perf_counter() - started
+    
+    # The service logs every upload; keep that out of the report unless asked for
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        for _ in range(min(args.warmup, args.requests)):
+            one_call(None)
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            samples = list(executor.map(one_call, range(args.requests)))
+        elapsed = time.perf_counter() - started
+    server.shutdown()
+    
+    pool = service.get_pool_stats()
+    print(f"fixtures: {len(fixtures)}, image: {len(image)} bytes, concurrency: {args.concurrency}, "
+          f"stub latency: {args.latency_ms} ms")
+    print(f"parse_result x{args.parse_iterations}: {format_ms(percentiles(parse_samples))}")
+    print(f"identify_plant x{args.requests}: {args.requests / elapsed:.1f} req/s, {format_ms(percentiles(samples))}")
+    print(f"connections opened: {pool['connections_opened']}, reused: {pool['connections_reused']}, "
+          f"peak buffer: {service.get_stream_stats()['peak_buffer_bytes']} bytes")
+
+def record(args):
+    api_key = os.getenv('PLANTID_API_KEY')
+    if not api_key:
+        raise SystemExit("Set PLANTID_API_KEY to record fixtures")
+    
+    service = PlantIdService(api_key)
+    os.makedirs(args.fixtures, exist_ok=True)
+    for image_path in args.images:
+        result = service.request_identification(image_path)
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        out_path = os.path.join(args.fixtures, f"{name}.json")
+        with open(out_path, 'w') as fixture_file:
+            json.dump(result, fixture_file, indent=2, ensure_ascii=False)
+        print(f"Recorded {out_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    record_parser = subparsers.add_parser('record', help='Call the live API and save responses as fixtures')
+    record_parser.add_argument('images', nargs='+')
+    record_parser.add_argument('--fixtures', default=FIXTURE_DIR)
+    record_parser.set_defaults(func=record)
+    
+    bench_parser = subparsers.add_parser('bench', help='Replay fixtures through a local stub server')
+    bench_parser.add_argument('--fixtures', default=FIXTURE_DIR)
+    bench_parser.add_argument('--image', help='Image sent with every request (default: generated JPEG)')
+    bench_parser.add_argument('--requests', type=int, default=200)
+    bench_parser.add_argument('--concurrency', type=int, default=4)
+    bench_parser.add_argument('--warmup', type=int, default=5)
+    bench_parser.add_argument('--latency-ms', type=float, default=0)
+    bench_parser.add_argument('--parse-iterations', type=int, default=10000)
+    bench_parser.add_argument('--verbose', action='store_true', help='Show service log lines')
+    bench_parser.set_defaults(func=bench)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
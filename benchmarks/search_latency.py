@@ -0,0 +1,111 @@
+"""
+Measure /api/search latency on a large synthetic history.
+
+Seeds a temporary SQLite database with --rows chat rows for one user (plus
+other users' rows) built from a small farming vocabulary, so common words
+match many rows and rare ones few, then times GET /api/search per query:
+    python -m benchmarks.search_latency --rows 100000
+    python -m benchmarks.search_latency --queries "daun tomat" "wereng" --repeat 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.plantid_replay import percentiles, format_ms
+
+PLANTS = ['tomat', 'cabai', 'padi', 'jagung', 'kentang', 'bawang', 'terong', 'mentimun', 'kangkung', 'bayam']
+WORDS = ['daun', 'akar', 'batang', 'buah', 'bunga', 'kuning', 'layu', 'busuk', 'bercak', 'keriting', 'pupuk',
+         'siram', 'hama', 'jamur', 'virus', 'tanah', 'organik', 'kompos', 'semprot', 'panen', 'bibit', 'benih']
+RARE = ['wereng', 'trips', 'antraknosa', 'fusarium', 'nematoda']
+DEFAULT_QUERIES = ['tomat', 'daun kuning', 'tomat daun keriting', 'wereng', 'antraknosa padi', 'kompo', 'xyzzy']
+
+def sentence(rng, words):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    if rng.random() < 0.01:
+        text += ' ' + rng.choice(RARE)
+    return text
+
+def seed(db, ChatHistory, User, rows, other_users):
+    """Bulk-insert random chats; the FTS triggers index them as they are written"""
+    rng = random.Random(42)
+    users = [User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(other_users + 1)]
+    for user in users:
+        user.set_password('bench123')
+    db.session.add_all(users)
+    db.session.commit()
+    
+    started = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for i in range(rows):
+        created_at = started + timedelta(seconds=i * 60)
+        plant = rng.choice(PLANTS)
+        user_message = f'{plant} {sentence(rng, 8)}?'
+        ai_response = '. '.join(sentence(rng, 20) for _ in range(8))
+        # Owner of every tenth row is another user
+        user = users[0] if i % 10 or not other_users else users[1 + (i // 10) % other_users]
+        batch.append({
+            'user_id': user.id, 'user_message': user_message, 'ai_response': ai_response, 'plant_topic': plant,
+            'user_message_excerpt': ChatHistory.build_excerpt(user_message),
+            'ai_response_excerpt': ChatHistory.build_excerpt(ai_response),
+            'created_at': created_at, 'updated_at': created_at
+        })
+        if len(batch) >= 5000:
+            db.session.execute(db.insert(ChatHistory), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(ChatHistory), batch)
+    db.session.commit()
+    return users[0].id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--other-users', type=int, default=5)
+    parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'search.db')}",
+            SECRET_KEY='benchmark',
+            USAGE_TRACKING_ENABLED='false',
+            SINGLE_FLIGHT_LOCK_DIR=os.path.join(workdir, 'single_flight'),
+            PLANTID_LIMITER_DB=os.path.join(workdir, 'limiter.db')
+        )
+        from app import create_app, db
+        from app.models import ChatHistory, User
+        
+        app = create_app()
+        with app.app_context():
+            started = time.perf_counter()
+            user_id = seed(db, ChatHistory, User, args.rows, args.other_users)
+            print(f"seeded and indexed {args.rows} rows in {time.perf_counter() - started:.1f} s")
+        
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        
+        for query in args.queries:
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get('/api/search', query_string={'q': query, 'type': 'chat', 'per_page': args.per_page})
+                samples.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise SystemExit(f"search {query!r} returned {response.status_code}: {response.get_data(as_text=True)}")
+            body = response.get_json()
+            print(f"{query!r}: {len(body['data'])} results{' (more)' if body['has_more'] else ''}, "
+                  f"server {body['took_ms']} ms")
+            print(f"  {format_ms(percentiles(samples))}")
+
+if __name__ == '__main__':
+    main()
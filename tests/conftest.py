@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+# Settings are read when the app modules are imported, so the test
+# environment is set up before anything from app is imported
+_workdir = tempfile.mkdtemp(prefix='plankton-tests-')
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    SECRET_KEY='test',
+    UPLOAD_FOLDER=os.path.join(_workdir, 'uploads'),
+    USAGE_TRACKING_ENABLED='false',
+    SINGLE_FLIGHT_LOCK_DIR=os.path.join(_workdir, 'single_flight'),
+    PLANTID_LIMITER_DB=os.path.join(_workdir, 'limiter.db'),
+    PLANTID_API_KEY='',
+    GROQ_API_KEY='test'
+)
+
+from app import create_app, db  # noqa: E402
+from app.models import User  # noqa: E402
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+@pytest.fixture
+def app_context(app):
+    """App context on an empty database; every row is removed after the test"""
+    with app.app_context():
+        yield app
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+
+@pytest.fixture
+def user(app_context):
+    user = User(username='petani', email='petani@example.com')
+    user.set_password('rahasia123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def client(app, user):
+    """Test client logged in as `user`"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+def wait_for(condition, timeout=5):
+    """Poll condition() until it is true; background workers commit in their own sessions"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db.session.rollback()
+        db.session.expire_all()
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
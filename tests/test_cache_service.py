@@ -0,0 +1,81 @@
+import io
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import CacheEntry
+from app.services.cache_service import DbCache, hash_stream
+
+def entry(cache, key):
+    db.session.expire_all()
+    return CacheEntry.query.filter_by(namespace=cache.namespace, cache_key=key).first()
+
+def age(cache, key, **delta):
+    stored = entry(cache, key)
+    stored.created_at -= timedelta(**delta)
+    stored.last_accessed_at -= timedelta(**delta)
+    db.session.commit()
+
+def test_set_and_get(app_context):
+    cache = DbCache('test', ttl=60, max_entries=10)
+    assert cache.get('a') is None
+    cache.set('a', {'nama': 'Tomat'})
+    assert cache.get('a') == {'nama': 'Tomat'}
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+def test_expired_entries_are_misses_and_removed(app_context):
+    cache = DbCache('test', ttl=60, max_entries=10)
+    cache.set('a', 1)
+    age(cache, 'a', seconds=120)
+    
+    assert cache.get('a') is None
+    assert entry(cache, 'a') is None
+
+def test_least_recently_used_entry_is_evicted(app_context):
+    cache = DbCache('test', ttl=3600, max_entries=2, touch_interval=0)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    age(cache, 'a', seconds=20)
+    age(cache, 'b', seconds=10)
+    assert cache.get('a') == 1  # Now more recent than b
+    
+    cache.set('c', 3)
+    
+    assert entry(cache, 'b') is None
+    assert entry(cache, 'a') is not None
+    assert cache.get_stats()['evictions'] == 1
+
+def test_namespaces_are_separate(app_context):
+    plantid = DbCache('plantid', ttl=60, max_entries=1)
+    groq = DbCache('groq', ttl=60, max_entries=1)
+    plantid.set('a', 'plantid')
+    groq.set('a', 'groq')
+    
+    assert plantid.get('a') == 'plantid'
+    assert groq.get('a') == 'groq'
+
+def test_hits_are_written_once_per_touch_interval(app_context):
+    cache = DbCache('test', ttl=3600, max_entries=10, touch_interval=60)
+    cache.set('a', 1)
+    for _ in range(3):
+        cache.get('a')
+    assert entry(cache, 'a').hit_count == 0
+    
+    stored = entry(cache, 'a')
+    stored.last_accessed_at = datetime.utcnow() - timedelta(seconds=120)
+    db.session.commit()
+    cache.get('a')
+    
+    assert entry(cache, 'a').hit_count == 4
+    assert cache.get_stats()['touches'] == 1
+
+def test_make_key_ignores_dict_order():
+    assert DbCache.make_key({'a': 1, 'b': 2}) == DbCache.make_key({'b': 2, 'a': 1})
+    assert DbCache.make_key('x', 1) != DbCache.make_key('x', 2)
+
+def test_hash_stream_restores_the_position():
+    stream = io.BytesIO(b'gambar daun' * 10000)
+    stream.seek(5)
+    first = hash_stream(stream, chunk_size=1000)
+    assert stream.tell() == 5
+    assert first == hash_stream(stream)
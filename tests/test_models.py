@@ -0,0 +1,67 @@
+import pytest
+
+from app import db
+from app.models import ChatHistory, PlantAnalysis, upgrade_schema
+
+RESULT = {
+    'name': 'Solanum lycopersicum',
+    'health': {
+        'is_healthy': {'status': False, 'probability': 0.2},
+        'diseases': {'suggestions': [{'name': 'late blight', 'probability': 0.6}]}
+    }
+}
+
+def drop_columns(table, *columns):
+    with db.engine.begin() as conn:
+        for column in columns:
+            conn.execute(db.text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+
+@pytest.fixture
+def old_schema(user):
+    """Rows stored before the derived columns existed, with those columns dropped"""
+    chat = ChatHistory(user_id=user.id, user_message='**Daun** menguning', ai_response='# Jawaban\n\n- pupuk',
+                       plant_topic='tomat')
+    analysis = PlantAnalysis(user_id=user.id, image_filename='a.jpg', plant_name='Tomat',
+                             analysis_result=RESULT, ai_recommendations='Saran')
+    plain = PlantAnalysis(user_id=user.id, image_filename='b.jpg', plant_name='Cabai', analysis_result={})
+    db.session.add_all([chat, analysis, plain])
+    db.session.commit()
+    ids = chat.id, analysis.id, plain.id
+    db.session.remove()
+    
+    with db.engine.begin() as conn:
+        conn.execute(db.text('DROP INDEX ix_plant_analysis_recommendations_status'))
+    drop_columns('chat_history', 'user_message_excerpt', 'ai_response_excerpt')
+    drop_columns('plant_analysis', 'summary', 'recommendations_status')
+    return ids
+
+def test_upgrade_schema_adds_and_backfills_columns(old_schema):
+    chat_id, analysis_id, plain_id = old_schema
+    
+    upgrade_schema()
+    db.session.expire_all()
+    
+    chat = db.session.get(ChatHistory, chat_id)
+    assert chat.user_message_excerpt == 'Daun menguning'
+    assert chat.ai_response_excerpt == 'Jawaban - pupuk'
+    analysis = db.session.get(PlantAnalysis, analysis_id)
+    assert analysis.summary['is_healthy'] is False
+    assert analysis.summary['diseases'] == [{'name': 'late blight', 'probability': 0.6}]
+    assert analysis.recommendations_status == 'ready'
+    assert db.session.get(PlantAnalysis, plain_id).recommendations_status == 'none'
+    assert 'ix_plant_analysis_recommendations_status' in {
+        index['name'] for index in db.inspect(db.engine).get_indexes('plant_analysis')
+    }
+
+def test_upgrade_schema_is_idempotent(app_context):
+    upgrade_schema()
+    upgrade_schema()
+
+def test_excerpt_follows_the_full_text(user):
+    chat = ChatHistory(user_id=user.id, user_message='Halo', ai_response='kata ' * 100)
+    assert chat.user_message_excerpt == 'Halo'
+    assert len(chat.ai_response_excerpt) <= ChatHistory.EXCERPT_CHARS + 1
+    assert chat.ai_response_excerpt.endswith('…')
+    
+    chat.user_message = '`kode` _miring_'
+    assert chat.user_message_excerpt == 'kode miring'
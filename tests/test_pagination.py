@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models import ChatHistory
+from app.services.pagination import keyset_page, decode_cursor, count_user_rows, history_counts
+
+def add_chats(user, count, created_at=None):
+    chats = [ChatHistory(user_id=user.id, user_message=f'pertanyaan {index}', ai_response='jawaban',
+                         plant_topic='padi', created_at=created_at or datetime(2026, 1, 1 + index))
+             for index in range(count)]
+    db.session.add_all(chats)
+    db.session.commit()
+    return chats
+
+def pages(user, per_page):
+    query = ChatHistory.query.filter_by(user_id=user.id)
+    cursor, result = None, []
+    while True:
+        rows, cursor = keyset_page(query, ChatHistory, cursor, per_page)
+        result.append([row.id for row in rows])
+        if cursor is None:
+            return result
+
+def test_keyset_pages_walk_newest_first(user):
+    chats = add_chats(user, 5)
+    newest_first = [chat.id for chat in reversed(chats)]
+    
+    assert pages(user, 2) == [newest_first[0:2], newest_first[2:4], newest_first[4:]]
+
+def test_keyset_pages_break_created_at_ties_by_id(user):
+    chats = add_chats(user, 5, created_at=datetime(2026, 3, 1, 8, 0))
+    
+    result = pages(user, 2)
+    
+    assert [row_id for page in result for row_id in page] == sorted((chat.id for chat in chats), reverse=True)
+
+def test_last_full_page_has_no_cursor(user):
+    add_chats(user, 4)
+    assert [len(page) for page in pages(user, 2)] == [2, 2]
+
+def test_invalid_cursor_is_rejected(user):
+    with pytest.raises(ValueError):
+        keyset_page(ChatHistory.query.filter_by(user_id=user.id), ChatHistory, 'bukan-cursor', 10)
+    with pytest.raises(ValueError):
+        decode_cursor('')
+
+def test_row_count_is_cached_and_invalidated_on_insert(user):
+    history_counts.invalidate(('chat_history', user.id))
+    add_chats(user, 2)
+    assert count_user_rows(ChatHistory, user.id) == 2
+    
+    add_chats(user, 1)
+    assert count_user_rows(ChatHistory, user.id) == 3
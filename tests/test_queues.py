@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import AnalysisJob, DeletionJob, PlantAnalysis
+from app.services.deletion_queue import DeletionQueue
+from app.services.job_queue import JobQueue
+from app.services.recommendation_queue import RecommendationQueue
+from tests.conftest import wait_for
+
+def add_analysis(user, **fields):
+    analysis = PlantAnalysis(user_id=user.id, image_filename=fields.pop('image_filename', 'daun.jpg'),
+                             plant_name='Tomat', analysis_result={}, **fields)
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis
+
+def test_job_claim_is_taken_once(app, user):
+    job = AnalysisJob(user_id=user.id, image_filename='daun.jpg')
+    db.session.add(job)
+    db.session.commit()
+    queue = JobQueue(app, handler=lambda job: None)
+    
+    assert queue._claim(job.id)
+    assert not queue._claim(job.id)
+    db.session.expire_all()
+    assert job.status == 'running'
+    assert job.attempts == 1
+
+def test_job_recover_requeues_stale_running_jobs(app, user):
+    analysis = add_analysis(user)
+    stale = AnalysisJob(user_id=user.id, image_filename='a.jpg', status='running',
+                        started_at=datetime.utcnow() - timedelta(hours=1))
+    fresh = AnalysisJob(user_id=user.id, image_filename='b.jpg', status='running', started_at=datetime.utcnow())
+    db.session.add_all([stale, fresh])
+    db.session.commit()
+    stale_id, fresh_id = stale.id, fresh.id
+    
+    queue = JobQueue(app, handler=lambda job: analysis.id, stale_after=300)
+    queue.recover()
+    
+    assert wait_for(lambda: db.session.get(AnalysisJob, stale_id).status == 'done')
+    assert db.session.get(AnalysisJob, stale_id).analysis_id == analysis.id
+    assert db.session.get(AnalysisJob, fresh_id).status == 'running'
+
+def test_job_failure_is_recorded(app, user):
+    def handler(job):
+        raise RuntimeError('Plant.id tidak menjawab')
+    
+    queue = JobQueue(app, handler=handler)
+    job_id = queue.enqueue(user.id, 'daun.jpg').id
+    
+    assert wait_for(lambda: db.session.get(AnalysisJob, job_id).status == 'failed')
+    assert db.session.get(AnalysisJob, job_id).error == 'Plant.id tidak menjawab'
+
+def test_recommendation_claim_skips_deleted_analyses(app, user):
+    queue = RecommendationQueue(app, generate=lambda result: 'Saran')
+    pending = add_analysis(user, recommendations_status='pending')
+    deleted = add_analysis(user, recommendations_status='pending', deleted_at=datetime.utcnow())
+    
+    assert queue._claim(pending.id)
+    assert not queue._claim(pending.id)
+    assert not queue._claim(deleted.id)
+
+def test_recommendation_recover_fills_pending_rows(app, user):
+    queue = RecommendationQueue(app, generate=lambda result: 'Saran penanganan')
+    stale = add_analysis(user, recommendations_status='generating')
+    stale.created_at = datetime.utcnow() - timedelta(hours=1)
+    pending = add_analysis(user, recommendations_status='pending')
+    deleted = add_analysis(user, recommendations_status='pending', deleted_at=datetime.utcnow())
+    db.session.commit()
+    ids = stale.id, pending.id, deleted.id
+    
+    queue.recover()
+    
+    assert wait_for(lambda: all(
+        db.session.get(PlantAnalysis, analysis_id).recommendations_status == 'ready' for analysis_id in ids[:2]
+    ))
+    assert db.session.get(PlantAnalysis, ids[0]).ai_recommendations == 'Saran penanganan'
+    assert db.session.get(PlantAnalysis, ids[2]).recommendations_status == 'pending'
+
+def test_deletion_removes_files_then_rows_in_chunks(app, user):
+    removed = []
+    queue = DeletionQueue(app, lambda image, thumb: removed.append(image) or (1, 0), chunk_size=2)
+    for index in range(5):
+        add_analysis(user, image_filename=f'daun{index}.jpg')
+    
+    job_id = queue.enqueue(user.id).id
+    
+    assert wait_for(lambda: db.session.get(DeletionJob, job_id).status == 'done')
+    job = db.session.get(DeletionJob, job_id)
+    assert (job.total, job.deleted, job.files_removed) == (5, 5, 5)
+    assert sorted(removed) == [f'daun{index}.jpg' for index in range(5)]
+    assert PlantAnalysis.query.count() == 0
+
+def test_deletion_keeps_rows_whose_files_failed(app, user):
+    failing = {'daun1.jpg', 'daun3.jpg'}
+    queue = DeletionQueue(app, lambda image, thumb: (0, 1) if image in failing else (1, 0), chunk_size=2)
+    for index in range(5):
+        add_analysis(user, image_filename=f'daun{index}.jpg')
+    
+    job_id = queue.enqueue(user.id).id
+    
+    assert wait_for(lambda: db.session.get(DeletionJob, job_id).status == 'failed')
+    kept = PlantAnalysis.query.filter_by(deletion_job_id=job_id).all()
+    assert sorted(analysis.image_filename for analysis in kept) == sorted(failing)
+    assert all(analysis.deleted_at is not None for analysis in kept)
+    
+    # recover() retries failed jobs that still have rows
+    failing.clear()
+    queue.recover()
+    assert wait_for(lambda: db.session.get(DeletionJob, job_id).status == 'done')
+    assert PlantAnalysis.query.count() == 0
+
+def test_deletion_recover_resumes_stale_jobs(app, user):
+    queue = DeletionQueue(app, lambda image, thumb: (1, 0), stale_after=300)
+    analysis = add_analysis(user)
+    job = DeletionJob(user_id=user.id, status='running', total=1,
+                      updated_at=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(job)
+    db.session.flush()
+    analysis.deleted_at = datetime.utcnow()
+    analysis.deletion_job_id = job.id
+    db.session.commit()
+    job_id = job.id
+    
+    queue.recover()
+    
+    assert wait_for(lambda: db.session.get(DeletionJob, job_id).status == 'done')
+    assert db.session.get(DeletionJob, job_id).attempts == 1
+
+def test_deletion_enqueue_without_rows_returns_none(app, user):
+    queue = DeletionQueue(app, lambda image, thumb: (0, 0))
+    assert queue.enqueue(user.id) is None
+    assert DeletionJob.query.count() == 0
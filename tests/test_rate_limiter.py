@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from app.services.rate_limiter import SqliteStateStore, TokenBucket, CircuitBreaker, acquire_all
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteStateStore(str(tmp_path / 'limiter.db'))
+
+def test_acquire_all_spends_nothing_when_one_bucket_is_empty(store):
+    minute = TokenBucket(store, 'minute', rate=0, capacity=5)
+    day = TokenBucket(store, 'day', rate=0, capacity=1)
+    
+    assert acquire_all([minute, day]) is None
+    assert acquire_all([minute, day]) is day
+    
+    assert minute.get_state()['tokens'] == 4
+    assert minute.get_state()['rejected'] == 0
+    assert day.get_state()['rejected'] == 1
+
+def test_bucket_refills_up_to_capacity(store):
+    bucket = TokenBucket(store, 'refill', rate=1000, capacity=2)
+    assert bucket.acquire(2)
+    time.sleep(0.01)
+    assert bucket.get_state()['tokens'] == 2
+
+def test_breaker_opens_probes_and_closes(store):
+    breaker = CircuitBreaker(store, 'test', failure_threshold=2, cooldown=0.1)
+    breaker.record_failure('timeout')
+    assert breaker.allow_request() is True
+    breaker.record_failure('timeout')
+    
+    assert breaker.get_state()['state'] == 'open'
+    assert breaker.allow_request() is False
+    assert breaker.retry_after() > 0
+    
+    time.sleep(0.15)
+    probe = breaker.allow_request()
+    assert probe and probe is not True
+    assert breaker.get_state()['state'] == 'half_open'
+    assert breaker.allow_request() is False  # Only one probe at a time
+    assert breaker.retry_after() > 0
+    
+    breaker.record_success()
+    assert breaker.get_state()['state'] == 'closed'
+    assert breaker.allow_request() is True
+
+def test_failed_probe_opens_the_breaker_again(store):
+    breaker = CircuitBreaker(store, 'test', failure_threshold=1, cooldown=0.1)
+    breaker.record_failure('500')
+    time.sleep(0.15)
+    assert breaker.allow_request()
+    breaker.record_failure('500')
+    assert breaker.get_state()['state'] == 'open'
+    assert breaker.allow_request() is False
+
+def test_released_probe_lets_the_next_call_probe(store):
+    breaker = CircuitBreaker(store, 'test', failure_threshold=1, cooldown=0.1)
+    breaker.record_failure('500')
+    time.sleep(0.15)
+    probe = breaker.allow_request()
+    
+    breaker.release_probe(probe)
+    assert breaker.get_state()['state'] == 'open'
+    assert breaker.allow_request()
+    
+    # A stale probe value does not release the probe now in flight
+    breaker.release_probe(probe)
+    assert breaker.get_state()['state'] == 'half_open'
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models import ChatHistory, PlantAnalysis, User
+from app.services.search_service import (
+    search, search_backend, query_terms, highlight, clamp_page, MAX_PAGE, HIGHLIGHT_START, HIGHLIGHT_END
+)
+
+@pytest.fixture(autouse=True)
+def require_fts5(app_context):
+    if search_backend() != 'fts5':
+        pytest.skip('SQLite built without FTS5')
+
+def add_chat(user, message, response='Gunakan fungisida', topic='tomat'):
+    chat = ChatHistory(user_id=user.id, user_message=message, ai_response=response, plant_topic=topic)
+    db.session.add(chat)
+    db.session.commit()
+    return chat
+
+def ids(results):
+    return [result['id'] for result in results]
+
+def test_triggers_keep_the_index_in_sync(user):
+    chat = add_chat(user, 'Daun tomat menguning')
+    assert ids(search(user.id, 'menguning', kind='chat')[0]) == [chat.id]
+    
+    chat.user_message = 'Batang tomat membusuk'
+    db.session.commit()
+    assert search(user.id, 'menguning', kind='chat')[0] == []
+    assert ids(search(user.id, 'membusuk', kind='chat')[0]) == [chat.id]
+    
+    db.session.delete(chat)
+    db.session.commit()
+    assert search(user.id, 'membusuk', kind='chat')[0] == []
+
+def test_results_are_limited_to_the_user(user):
+    other = User(username='tetangga', email='tetangga@example.com', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    add_chat(other, 'Hama wereng di sawah')
+    mine = add_chat(user, 'Hama wereng menyerang padi')
+    
+    assert ids(search(user.id, 'wereng', kind='chat')[0]) == [mine.id]
+
+def test_deleted_analyses_are_not_found(user):
+    kept = PlantAnalysis(user_id=user.id, image_filename='a.jpg', plant_name='Cabai rawit')
+    deleted = PlantAnalysis(user_id=user.id, image_filename='b.jpg', plant_name='Cabai merah',
+                            deleted_at=datetime.utcnow())
+    db.session.add_all([kept, deleted])
+    db.session.commit()
+    
+    assert ids(search(user.id, 'cabai', kind='analysis')[0]) == [kept.id]
+
+def test_last_term_matches_as_prefix(user):
+    chat = add_chat(user, 'Pemupukan jagung')
+    assert ids(search(user.id, 'pemupu', kind='chat')[0]) == [chat.id]
+    # Terms shorter than three characters only match whole words
+    assert search(user.id, 'pe', kind='chat')[0] == []
+
+@pytest.mark.parametrize('text', ['"tomat', 'tomat OR', 'NEAR(tomat', 'tomat*', '-tomat', 'a:b ^c', '(((', '" AND "'])
+def test_query_syntax_is_escaped(user, text):
+    add_chat(user, 'Daun tomat layu')
+    results, _ = search(user.id, text)
+    assert all(result['type'] in ('chat', 'analysis') for result in results)
+
+def test_query_terms_and_highlight():
+    assert query_terms('Tomat "layu" OR daun*') == ['tomat', 'layu', 'or', 'daun']
+    assert query_terms('!!!') == []
+    assert highlight('<b>tomat</b>') == '&lt;b&gt;<mark>tomat</mark>&lt;/b&gt;'
+
+def test_pages_are_clamped():
+    assert clamp_page(0, 0) == (1, 1)
+    assert clamp_page(MAX_PAGE + 10, 1000)[0] == MAX_PAGE
+
+def test_merged_scores_are_relative_to_each_source(user):
+    add_chat(user, 'Pupuk kandang untuk kentang')
+    db.session.add(PlantAnalysis(user_id=user.id, image_filename='c.jpg', plant_name='Kentang'))
+    db.session.commit()
+    
+    results, has_more = search(user.id, 'kentang')
+    
+    assert sorted(result['type'] for result in results) == ['analysis', 'chat']
+    assert [result['score'] for result in results] == [1.0, 1.0]
+    assert not has_more
+
+def test_unknown_kind_is_rejected(user):
+    with pytest.raises(ValueError):
+        search(user.id, 'tomat', kind='users')
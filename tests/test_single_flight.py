@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+@pytest.fixture
+def flight(tmp_path):
+    return SingleFlight('test', lock_dir=str(tmp_path))
+
+def test_concurrent_callers_share_one_call(flight):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'hasil'
+    
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('k', fn)))
+    leader.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(flight.do('k', fn))) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    time.sleep(0.2)  # Let the waiters find the call in flight
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+    
+    assert len(calls) == 1
+    assert sorted(results) == [('hasil', False)] + [('hasil', True)] * 3
+
+def test_leader_error_is_raised_in_waiters(flight):
+    started = threading.Event()
+    release = threading.Event()
+    
+    def fn():
+        started.set()
+        release.wait(5)
+        raise ValueError('gagal')
+    
+    errors = []
+    
+    def call():
+        try:
+            flight.do('k', fn)
+        except ValueError as e:
+            errors.append(str(e))
+    
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    
+    assert errors == ['gagal', 'gagal']
+
+def test_cancelled_leader_hands_the_call_to_a_waiter(flight):
+    async def scenario():
+        started = asyncio.Event()
+        calls = []
+        
+        async def slow():
+            calls.append('leader')
+            started.set()
+            await asyncio.sleep(10)
+            return 'tidak pernah'
+        
+        async def fast():
+            calls.append('waiter')
+            return 'jawaban'
+        
+        leader = asyncio.create_task(flight.ado('k', slow))
+        await started.wait()
+        waiter = asyncio.create_task(flight.ado('k', fast))
+        await asyncio.sleep(0.1)
+        leader.cancel()
+        
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(waiter, 5), calls
+    
+    result, calls = asyncio.run(scenario())
+    
+    assert result == ('jawaban', False)
+    assert calls == ['leader', 'waiter']
+    assert flight.get_stats()['retried'] == 1
+    assert flight.get_stats()['in_flight'] == 0
+
+def test_recheck_serves_the_cached_result_after_a_lock_wait(tmp_path):
+    other_worker = SingleFlight('shared', lock_dir=str(tmp_path))
+    flight = SingleFlight('shared', lock_dir=str(tmp_path))
+    holding = threading.Event()
+    release = threading.Event()
+    
+    def hold():
+        holding.set()
+        release.wait(5)
+        return 'dari worker lain'
+    
+    thread = threading.Thread(target=lambda: other_worker.do('k', hold))
+    thread.start()
+    holding.wait(5)
+    threading.Timer(0.2, release.set).start()
+    
+    result = flight.do('k', lambda: pytest.fail('upstream called twice'), recheck=lambda: 'dari cache')
+    thread.join(5)
+    
+    assert result == ('dari cache', True)
+    assert flight.get_stats()['rechecked'] == 1